@@ -1,6 +1,7 @@
 from django.test import TestCase, Client
 from django.urls import reverse
 from http import HTTPStatus
+from core.testing import max_queries
 
 
 class AboutURLTests(TestCase):
@@ -33,3 +34,12 @@ class StaticViewsTests(TestCase):
             with self.subTest(address=address):
                 response = self.guest_client.get(address)
                 self.assertEqual(response.status_code, HTTPStatus.OK)
+
+
+class AboutQueryBudgetTests(TestCase):
+    @max_queries(0)
+    def test_static_pages_need_no_queries(self):
+        """Статичные страницы не обращаются к базе."""
+        for name in ('about:author', 'about:tech'):
+            with self.subTest(name=name):
+                self.client.get(reverse(name))
@@ -0,0 +1,269 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from . import metrics
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    ' key TEXT PRIMARY KEY,'
+    ' value BLOB NOT NULL,'
+    ' expires REAL,'
+    ' accessed REAL NOT NULL,'
+    ' size INTEGER NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS cache_accessed_idx ON cache (accessed)',
+    'CREATE INDEX IF NOT EXISTS cache_expires_idx ON cache (expires)',
+    # Число и размер записей ведут триггеры: _cull не считает их по
+    # всей таблице на каждую запись.
+    'CREATE TABLE IF NOT EXISTS cache_totals ('
+    ' id INTEGER PRIMARY KEY CHECK (id = 1),'
+    ' entries INTEGER NOT NULL,'
+    ' bytes INTEGER NOT NULL)',
+    'INSERT OR IGNORE INTO cache_totals'
+    ' SELECT 1, COUNT(*), COALESCE(SUM(size), 0) FROM cache',
+    'CREATE TRIGGER IF NOT EXISTS cache_totals_insert AFTER INSERT ON cache'
+    ' BEGIN UPDATE cache_totals'
+    '  SET entries = entries + 1, bytes = bytes + new.size; END',
+    'CREATE TRIGGER IF NOT EXISTS cache_totals_delete AFTER DELETE ON cache'
+    ' BEGIN UPDATE cache_totals'
+    '  SET entries = entries - 1, bytes = bytes - old.size; END',
+    'CREATE TRIGGER IF NOT EXISTS cache_totals_update'
+    ' AFTER UPDATE OF size ON cache'
+    ' BEGIN UPDATE cache_totals'
+    '  SET bytes = bytes + new.size - old.size; END',
+)
+
+
+class SQLiteCache(BaseCache):
+    """Кэш в файле SQLite, общий для всех процессов на одном хосте.
+
+    Записи вытесняются по LRU, когда число записей превышает
+    MAX_ENTRIES или их суммарный размер превышает MAX_BYTES.
+    Файл открывается в режиме WAL и читается через mmap.
+
+    Чтение обычно ничего не пишет: время доступа для LRU обновляется,
+    только если оно старше ACCESS_INTERVAL секунд. Истёкшие записи
+    удаляются не чаще раза в PURGE_INTERVAL секунд.
+    """
+
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = os.path.abspath(location)
+        options = params.get('OPTIONS', {})
+        self._max_bytes = int(options.get('MAX_BYTES', 0))
+        self._mmap_size = int(options.get('MMAP_SIZE', 64 * 1024 * 1024))
+        self._busy_timeout = float(options.get('BUSY_TIMEOUT', 5))
+        self._access_interval = float(options.get('ACCESS_INTERVAL', 60))
+        self._purge_interval = float(options.get('PURGE_INTERVAL', 60))
+        self._next_purge = 0
+        self._local = threading.local()
+
+    @property
+    def _conn(self):
+        # Соединение своё у каждого потока и процесса (после fork
+        # унаследованное соединение использовать нельзя).
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(
+                self._path, timeout=self._busy_timeout,
+                isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(f'PRAGMA mmap_size={self._mmap_size}')
+            # INSERT OR REPLACE удаляет старую строку; без этого триггер
+            # удаления на ней не срабатывает.
+            conn.execute('PRAGMA recursive_triggers=ON')
+            with self._transaction(conn):
+                for statement in SCHEMA:
+                    conn.execute(statement)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _expiry(self, timeout):
+        # Абсолютное время истечения или None для вечных записей.
+        return self.get_backend_timeout(timeout)
+
+    def _dumps(self, value):
+        return pickle.dumps(value, self.pickle_protocol)
+
+    def _prepare(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def get(self, key, default=None, version=None):
+        result = self.get_many([key], version=version)
+        return result.get(key, default)
+
+    def get_many(self, keys, version=None):
+        key_map = {self._prepare(key, version): key for key in keys}
+        if not key_map:
+            return {}
+        now = time.time()
+        placeholders = ','.join('?' * len(key_map))
+        conn = self._conn
+        rows = conn.execute(
+            f'SELECT key, value, accessed FROM cache'
+            f' WHERE key IN ({placeholders})'
+            ' AND (expires IS NULL OR expires > ?)',
+            (*key_map, now),
+        ).fetchall()
+        metrics.record_cache(len(rows), len(key_map) - len(rows))
+        # Запись берёт блокировку на весь файл: обновляем время доступа
+        # только у давно не читавшихся записей.
+        stale = [key for key, _, accessed in rows
+                 if accessed < now - self._access_interval]
+        if stale:
+            conn.execute(
+                f'UPDATE cache SET accessed = ? WHERE key IN '
+                f'({",".join("?" * len(stale))})',
+                (now, *stale),
+            )
+        return {key_map[key]: pickle.loads(value)
+                for key, value, _ in rows}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout=timeout, version=version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self._expiry(timeout)
+        now = time.time()
+        rows = []
+        for key, value in data.items():
+            blob = self._dumps(value)
+            rows.append((self._prepare(key, version), blob, expires, now,
+                         len(blob)))
+        if not rows:
+            return []
+        conn = self._conn
+        with self._transaction(conn):
+            conn.executemany(
+                'INSERT OR REPLACE INTO cache'
+                ' (key, value, expires, accessed, size)'
+                ' VALUES (?, ?, ?, ?, ?)', rows)
+            self._cull(conn, now)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._prepare(key, version)
+        blob = self._dumps(value)
+        now = time.time()
+        conn = self._conn
+        with self._transaction(conn):
+            conn.execute(
+                'DELETE FROM cache WHERE key = ? AND expires <= ?',
+                (key, now))
+            cursor = conn.execute(
+                'INSERT OR IGNORE INTO cache'
+                ' (key, value, expires, accessed, size)'
+                ' VALUES (?, ?, ?, ?, ?)',
+                (key, blob, self._expiry(timeout), now, len(blob)))
+            if cursor.rowcount:
+                self._cull(conn, now)
+        return bool(cursor.rowcount)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._prepare(key, version)
+        cursor = self._conn.execute(
+            'UPDATE cache SET expires = ? WHERE key = ?'
+            ' AND (expires IS NULL OR expires > ?)',
+            (self._expiry(timeout), key, time.time()))
+        return bool(cursor.rowcount)
+
+    def incr(self, key, delta=1, version=None):
+        key = self._prepare(key, version)
+        conn = self._conn
+        with self._transaction(conn):
+            row = conn.execute(
+                'SELECT value FROM cache WHERE key = ?'
+                ' AND (expires IS NULL OR expires > ?)',
+                (key, time.time())).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            blob = self._dumps(value)
+            conn.execute(
+                'UPDATE cache SET value = ?, size = ? WHERE key = ?',
+                (blob, len(blob), key))
+        return value
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version=version)
+
+    def delete_many(self, keys, version=None):
+        keys = [self._prepare(key, version) for key in keys]
+        if keys:
+            placeholders = ','.join('?' * len(keys))
+            self._conn.execute(
+                f'DELETE FROM cache WHERE key IN ({placeholders})', keys)
+
+    def has_key(self, key, version=None):
+        key = self._prepare(key, version)
+        row = self._conn.execute(
+            'SELECT 1 FROM cache WHERE key = ?'
+            ' AND (expires IS NULL OR expires > ?)',
+            (key, time.time())).fetchone()
+        return row is not None
+
+    def clear(self):
+        self._conn.execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # Соединение живёт всё время работы потока: открывать файл
+        # заново на каждый запрос дороже, чем держать его открытым.
+        pass
+
+    def _transaction(self, conn):
+        return _Immediate(conn)
+
+    def _totals(self, conn):
+        return conn.execute(
+            'SELECT entries, bytes FROM cache_totals').fetchone()
+
+    def _cull(self, conn, now):
+        count, size = self._totals(conn)
+        over = count > self._max_entries or (
+            self._max_bytes and size > self._max_bytes)
+        # Перед вытеснением живых записей удаляются истёкшие.
+        if over or now >= self._next_purge:
+            self._next_purge = now + self._purge_interval
+            conn.execute('DELETE FROM cache WHERE expires <= ?', (now,))
+            count, size = self._totals(conn)
+        if count > self._max_entries:
+            if self._cull_frequency == 0:
+                drop = count
+            else:
+                drop = max(count // self._cull_frequency,
+                           count - self._max_entries)
+            conn.execute(
+                'DELETE FROM cache WHERE key IN ('
+                ' SELECT key FROM cache ORDER BY accessed LIMIT ?)', (drop,))
+        if self._max_bytes and size > self._max_bytes:
+            conn.execute(
+                'DELETE FROM cache WHERE key IN ('
+                ' SELECT key FROM ('
+                '  SELECT key, SUM(size) OVER (ORDER BY accessed DESC)'
+                '   AS total FROM cache)'
+                ' WHERE total > ?)', (self._max_bytes,))
+
+
+class _Immediate:
+    """BEGIN IMMEDIATE ... COMMIT: запись атомарна между процессами."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute('BEGIN IMMEDIATE')
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute('COMMIT' if exc_type is None else 'ROLLBACK')
+        return False
@@ -0,0 +1,65 @@
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from core.cache import SQLiteCache
+
+
+def make_backend(name, location):
+    params = {'TIMEOUT': 300, 'OPTIONS': {'MAX_ENTRIES': 100000}}
+    if name == 'locmem':
+        return LocMemCache('bench', params)
+    return SQLiteCache(location, params)
+
+
+def run_worker(args):
+    name, location, operations, keys, payload_size, seed = args
+    backend = make_backend(name, location)
+    rng = random.Random(seed)
+    payload = os.urandom(payload_size)
+    hits = 0
+    started = time.perf_counter()
+    for _ in range(operations):
+        # Популярные ключи запрашиваются чаще, как страницы ленты.
+        key = f'page:{int(rng.paretovariate(0.8)) % keys}'
+        if backend.get(key) is None:
+            backend.set(key, payload)
+        else:
+            hits += 1
+    return hits, time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает SQLiteCache и LocMemCache под конкурентной '
+            'нагрузкой из нескольких процессов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=4)
+        parser.add_argument('--operations', type=int, default=5000)
+        parser.add_argument('--keys', type=int, default=500)
+        parser.add_argument('--payload', type=int, default=20 * 1024)
+
+    def handle(self, *args, **options):
+        context = multiprocessing.get_context('fork')
+        with tempfile.TemporaryDirectory() as directory:
+            location = os.path.join(directory, 'bench.sqlite3')
+            for name in ('locmem', 'sqlite'):
+                jobs = [
+                    (name, location, options['operations'], options['keys'],
+                     options['payload'], seed)
+                    for seed in range(options['processes'])
+                ]
+                started = time.perf_counter()
+                with context.Pool(options['processes']) as pool:
+                    results = pool.map(run_worker, jobs)
+                elapsed = time.perf_counter() - started
+                total = options['operations'] * options['processes']
+                hits = sum(hits for hits, _ in results)
+                self.stdout.write(
+                    f'{name:>7}: {total / elapsed:10.0f} оп/с, '
+                    f'попаданий {hits / total:6.1%}')
@@ -0,0 +1,104 @@
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+
+from django.conf import settings as my_set
+from django.core.management.base import BaseCommand
+
+from core.db import apply_pragmas
+
+# Профиль до настройки: журнал DELETE, synchronous=FULL, таймаут
+# sqlite3 по умолчанию и новое соединение на каждый запрос.
+PROFILES = {
+    'default': ({'journal_mode': 'DELETE'}, False),
+    'tuned': (my_set.SQLITE_PRAGMAS, True),
+}
+
+SCHEMA = (
+    'CREATE TABLE post (id INTEGER PRIMARY KEY, text TEXT, pub_date REAL)',
+    'CREATE INDEX post_pub_date ON post (pub_date)',
+)
+
+
+def connect(path, pragmas):
+    conn = sqlite3.connect(path)
+    apply_pragmas(conn, pragmas)
+    return conn
+
+
+def read(conn):
+    conn.execute('SELECT id, text FROM post ORDER BY pub_date DESC'
+                 ' LIMIT 10').fetchall()
+
+
+def write(conn):
+    conn.execute('INSERT INTO post (text, pub_date) VALUES (?, ?)',
+                 ('Новый пост ' * 20, time.time()))
+    conn.commit()
+
+
+def run_worker(args):
+    role, path, profile, seconds = args
+    pragmas, persistent = PROFILES[profile]
+    action = read if role == 'reader' else write
+    done = locked = 0
+    conn = connect(path, pragmas) if persistent else None
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        current = conn or connect(path, pragmas)
+        try:
+            action(current)
+            done += 1
+        except sqlite3.OperationalError:
+            locked += 1
+        finally:
+            if conn is None:
+                current.close()
+    return role, done, locked
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пропускную способность SQLite при одновременном '
+            'чтении и записи до и после настроек SQLITE_PRAGMAS '
+            'и CONN_MAX_AGE.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument('--rows', type=int, default=10000)
+
+    def prepare(self, path, profile, rows):
+        conn = connect(path, PROFILES[profile][0])
+        for statement in SCHEMA:
+            conn.execute(statement)
+        conn.executemany(
+            'INSERT INTO post (text, pub_date) VALUES (?, ?)',
+            (('Пост ' * 20, number) for number in range(rows)))
+        conn.commit()
+        conn.close()
+
+    def handle(self, *args, **options):
+        roles = (['reader'] * options['readers']
+                 + ['writer'] * options['writers'])
+        context = multiprocessing.get_context('fork')
+        with tempfile.TemporaryDirectory() as directory:
+            for profile in PROFILES:
+                path = os.path.join(directory, f'{profile}.sqlite3')
+                self.prepare(path, profile, options['rows'])
+                jobs = [(role, path, profile, options['seconds'])
+                        for role in roles]
+                with context.Pool(len(jobs)) as pool:
+                    results = pool.map(run_worker, jobs)
+                totals = {'reader': [0, 0], 'writer': [0, 0]}
+                for role, done, locked in results:
+                    totals[role][0] += done
+                    totals[role][1] += locked
+                seconds = options['seconds']
+                self.stdout.write(
+                    f'{profile:>8}: '
+                    f'чтений {totals["reader"][0] / seconds:8.0f}/с, '
+                    f'записей {totals["writer"][0] / seconds:7.0f}/с, '
+                    f'ошибок блокировки {sum(t[1] for t in totals.values())}')
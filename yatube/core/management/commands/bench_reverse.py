@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.template import Context, Template
+from django.urls import reverse
+
+from core.templatetags.cached_urls import cached_reverse
+
+# Адреса типичной страницы ленты: шапка, карточки постов, переключатель.
+PAGE_URLS = [
+    ('posts:index', ()), ('posts:follow_index', ()), ('posts:search', ()),
+    ('about:author', ()), ('about:tech', ()), ('posts:post_create', ()),
+    ('users:password_change', ()), ('users:logout', ()),
+    ('posts:index', ()), ('posts:follow_index', ()),
+] + [
+    url for number in range(10) for url in (
+        ('posts:profile', (f'author{number % 3}',)),
+        ('posts:post_detail', (number,)),
+    )
+]
+
+
+class Command(BaseCommand):
+    help = ('Микробенчмарк {% url %}: reverse() Django и cached_reverse '
+            'на адресах одной страницы ленты.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=2000)
+
+    def measure(self, render, repeat):
+        render()
+        started = time.perf_counter()
+        for _ in range(repeat):
+            render()
+        return (time.perf_counter() - started) / repeat * 1e6
+
+    def handle(self, *args, **options):
+        source = ''.join(
+            '{% url "' + name + '"' + ''.join(
+                f' "{arg}"' for arg in args) + ' %}'
+            for name, args in PAGE_URLS)
+        context = Context()
+        builtin = Template(source)
+        cached = Template('{% load cached_urls %}' + source)
+        results = [
+            ('reverse()', lambda: [
+                reverse(name, args=args) for name, args in PAGE_URLS]),
+            ('cached_reverse()', lambda: [
+                cached_reverse(name, args) for name, args in PAGE_URLS]),
+            ('{% url %}', lambda: builtin.render(context)),
+            ('cached {% url %}', lambda: cached.render(context)),
+        ]
+        self.stdout.write(f'{len(PAGE_URLS)} адресов на страницу')
+        for name, render in results:
+            micros = self.measure(render, options['repeat'])
+            self.stdout.write(f'{name:>18}: {micros:8.1f} мкс на страницу')
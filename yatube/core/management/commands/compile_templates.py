@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.warmup import compile_templates
+
+
+class Command(BaseCommand):
+    help = ('Компилирует все шаблоны проекта: находит синтаксические '
+            'ошибки и показывает время компиляции.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--app-dirs', action='store_true',
+            help='Ещё и шаблоны из каталогов templates приложений.')
+        parser.add_argument(
+            '--top', type=int, default=10,
+            help='Сколько самых медленных шаблонов показать, 0 — все.')
+
+    def handle(self, *args, **options):
+        results = compile_templates(options['app_dirs'])
+        errors = [(name, error) for name, _, error in results if error]
+        for name, error in errors:
+            self.stderr.write(f'{name}: {error}')
+        slowest = sorted(results, key=lambda result: -result[1])
+        if options['top']:
+            slowest = slowest[:options['top']]
+        for name, seconds, _ in slowest:
+            self.stdout.write(f'{seconds * 1000:8.2f} мс  {name}')
+        total = sum(seconds for _, seconds, _ in results)
+        self.stdout.write(
+            f'Шаблонов: {len(results)}, всего {total * 1000:.1f} мс')
+        if errors:
+            raise CommandError(f'Шаблонов с ошибками: {len(errors)}')
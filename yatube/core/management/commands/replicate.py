@@ -0,0 +1,33 @@
+import time
+
+from django.conf import settings as my_set
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from core.replication import copy_database
+
+
+class Command(BaseCommand):
+    help = ('Локальная замена репликации: копирует базу default в файлы '
+            'реплик из DATABASE_REPLICAS, один раз или каждые --interval '
+            'секунд.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0)
+        parser.add_argument('replicas', nargs='*')
+
+    def handle(self, *args, **options):
+        replicas = options['replicas'] or my_set.DATABASE_REPLICAS
+        if not replicas:
+            raise CommandError('DATABASE_REPLICAS пуст, реплик нет.')
+        source = my_set.DATABASES[DEFAULT_DB_ALIAS]['NAME']
+        while True:
+            started = time.perf_counter()
+            for alias in replicas:
+                copy_database(source, my_set.DATABASES[alias]['NAME'])
+            self.stdout.write(
+                f'Реплики {", ".join(replicas)} обновлены за '
+                f'{(time.perf_counter() - started) * 1000:.0f} мс')
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,143 @@
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+
+# Верхние границы корзин гистограммы времени ответа, мс.
+BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """Счётчики одного запроса: SQL, шаблоны и кэш."""
+
+    __slots__ = ('started', 'queries', 'sql', 'template', 'template_depth',
+                 'cache_hits', 'cache_misses')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql = 0.0
+        self.template = 0.0
+        self.template_depth = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql += time.perf_counter() - started
+            self.queries += 1
+
+    def total(self):
+        return time.perf_counter() - self.started
+
+
+def start():
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def stop(token):
+    _current.reset(token)
+
+
+def current():
+    return _current.get()
+
+
+def record_cache(hits, misses):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.cache_hits += hits
+        metrics.cache_misses += misses
+
+
+class ViewStats:
+    __slots__ = ('count', 'buckets', 'total', 'sql', 'queries', 'template',
+                 'cache_hits', 'cache_misses')
+
+    def __init__(self):
+        self.count = 0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.total = self.sql = self.template = 0.0
+        self.queries = self.cache_hits = self.cache_misses = 0
+
+    def add(self, metrics, total):
+        self.count += 1
+        self.buckets[bisect.bisect_left(BUCKETS, total * 1000)] += 1
+        self.total += total
+        self.sql += metrics.sql
+        self.template += metrics.template
+        self.queries += metrics.queries
+        self.cache_hits += metrics.cache_hits
+        self.cache_misses += metrics.cache_misses
+
+    def percentile(self, share):
+        # Оценка сверху: граница корзины, в которую попал перцентиль.
+        rank = share * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return bound
+        return None
+
+    def as_dict(self):
+        count = self.count or 1
+        return {
+            'count': self.count,
+            'p50_ms': self.percentile(0.5),
+            'p95_ms': self.percentile(0.95),
+            'p99_ms': self.percentile(0.99),
+            'mean_ms': round(self.total / count * 1000, 2),
+            'mean_sql_ms': round(self.sql / count * 1000, 2),
+            'mean_queries': round(self.queries / count, 2),
+            'mean_template_ms': round(self.template / count * 1000, 2),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'buckets_ms': dict(zip([*BUCKETS, 'inf'], self.buckets)),
+        }
+
+
+_stats = {}
+_lock = threading.Lock()
+
+
+def record(view, metrics, total):
+    with _lock:
+        stats = _stats.get(view)
+        if stats is None:
+            stats = _stats[view] = ViewStats()
+        stats.add(metrics, total)
+
+
+_sources = {}
+
+
+def register(name, read, reset=None):
+    """Добавляет в /stats/requests/ счётчики другого приложения.
+
+    read() возвращает словарь для JSON, reset() обнуляет счётчики.
+    """
+    _sources[name] = (read, reset)
+
+
+def sources():
+    return {name: read() for name, (read, _) in _sources.items()}
+
+
+def snapshot():
+    with _lock:
+        return {view: stats.as_dict() for view, stats in _stats.items()}
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+    for _, reset_source in _sources.values():
+        if reset_source is not None:
+            reset_source()
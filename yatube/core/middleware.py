@@ -0,0 +1,104 @@
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings as my_set
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils.functional import empty
+
+from . import metrics, routers
+
+logger = logging.getLogger('core.requests')
+
+
+class RequestMetricsMiddleware:
+    """Считает SQL-запросы, время SQL и шаблонов, попадания в кэш.
+
+    Итог уходит в строку лога core.requests и в гистограммы по
+    представлениям (core.metrics.snapshot()), а в заголовок Server-Timing —
+    только для сотрудников, при DEBUG или SERVER_TIMING_PUBLIC.
+    """
+
+    def __init__(self, get_response):
+        if not my_set.REQUEST_METRICS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def shows_timing(self, request):
+        if my_set.DEBUG or my_set.SERVER_TIMING_PUBLIC:
+            return True
+        # Пользователя, которого представление не читало, не загружаем:
+        # это лишние запросы сессии и пользователя ради заголовка.
+        user = getattr(request, 'user', None)
+        if user is None or getattr(user, '_wrapped', None) is empty:
+            return False
+        return user.is_staff
+
+    def __call__(self, request):
+        current, token = metrics.start()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(current.execute_wrapper))
+                response = self.get_response(request)
+        finally:
+            metrics.stop(token)
+        total = current.total()
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        metrics.record(view, current, total)
+        if self.shows_timing(request):
+            response['Server-Timing'] = (
+                f'sql;dur={current.sql * 1000:.2f};'
+                f'desc="{current.queries} q", '
+                f'tpl;dur={current.template * 1000:.2f}, '
+                f'cache;desc="{current.cache_hits} hit '
+                f'{current.cache_misses} miss", '
+                f'total;dur={total * 1000:.2f}')
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(
+                'view=%s status=%s total_ms=%.2f sql_ms=%.2f queries=%d '
+                'template_ms=%.2f cache_hits=%d cache_misses=%d',
+                view, response.status_code, total * 1000,
+                current.sql * 1000, current.queries,
+                current.template * 1000, current.cache_hits,
+                current.cache_misses)
+        return response
+
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PIN_COOKIE = 'primary_until'
+
+
+class ReplicaPinMiddleware:
+    """Разрешает читать с реплики безопасным запросам.
+
+    Запрос, который что-то записал, ставит cookie: следующие
+    REPLICA_PIN_SECONDS секунд этот браузер читает из default и видит
+    свой пост или комментарий, даже если реплика отстаёт.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def pinned(self, request):
+        try:
+            return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+        except ValueError:
+            return False
+
+    def __call__(self, request):
+        state, token = routers.start_request(
+            request.method in SAFE_METHODS and not self.pinned(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            routers.end_request(token)
+        if state.wrote or request.method not in SAFE_METHODS:
+            seconds = my_set.REPLICA_PIN_SECONDS
+            response.set_cookie(
+                PIN_COOKIE, f'{time.time() + seconds:.0f}',
+                max_age=seconds, httponly=True, samesite='Lax')
+        return response
@@ -0,0 +1,16 @@
+import sqlite3
+
+
+def copy_database(source, target):
+    """Копирует файл SQLite source в target через backup API.
+
+    Заменяет настоящую репликацию при локальной проверке реплик:
+    читатели target видят либо старую, либо новую копию целиком.
+    """
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(target, timeout=20)
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
@@ -0,0 +1,79 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings as my_set
+from django.db import DEFAULT_DB_ALIAS
+
+
+class _RequestState:
+    __slots__ = ('use_replica', 'wrote')
+
+    def __init__(self, use_replica):
+        self.use_replica = use_replica
+        self.wrote = False
+
+
+_state = ContextVar('replica_state', default=None)
+
+
+def start_request(use_replica):
+    """Открывает состояние запроса; вне запроса всё читается из default."""
+    state = _RequestState(use_replica)
+    return state, _state.set(state)
+
+
+def end_request(token):
+    _state.reset(token)
+
+
+@contextmanager
+def primary():
+    """Внутри блока запрос читает из default.
+
+    Так строится всё, что кладётся в общий кэш: страница, собранная
+    с отстающей реплики, попала бы под ключ нового поколения и
+    отдавалась бы до следующей записи.
+    """
+    state = _state.get()
+    if state is None or not state.use_replica:
+        yield
+        return
+    state.use_replica = False
+    try:
+        yield
+    finally:
+        # После записи запрос и так читает из default до конца.
+        state.use_replica = not state.wrote
+
+
+class ReplicaRouter:
+    """Читает из DATABASE_REPLICAS, пишет в default.
+
+    Реплика используется только внутри запроса, который
+    ReplicaPinMiddleware разрешил читать с реплики. После первой записи
+    запрос до конца читает из default, чтобы видеть свои изменения.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None:
+            return None
+        if not state.use_replica or not my_set.DATABASE_REPLICAS:
+            return DEFAULT_DB_ALIAS
+        return random.choice(my_set.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.use_replica = False
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # В репликах те же данные, что в default.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схему в реплики приносит репликация вместе с данными.
+        return db not in my_set.DATABASE_REPLICAS
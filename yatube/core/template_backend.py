@@ -0,0 +1,34 @@
+import time
+
+from django.template.backends import django
+
+from . import metrics
+
+
+class Template(django.Template):
+    def render(self, context=None, request=None):
+        current = metrics.current()
+        if current is None:
+            return super().render(context, request)
+        # Вложенный render_to_string уже учтён во внешнем шаблоне.
+        current.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            current.template_depth -= 1
+            if not current.template_depth:
+                current.template += time.perf_counter() - started
+
+
+class DjangoTemplates(django.DjangoTemplates):
+    """Бэкенд Django, который замеряет время отрисовки для core.metrics."""
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except django.TemplateDoesNotExist as exc:
+            django.reraise(exc, self)
@@ -0,0 +1,58 @@
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings as my_set
+from django.db import connections
+from django.test.utils import CaptureQueriesContext, override_settings
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@contextmanager
+def query_budget(limit, using='default', label='block'):
+    """Падает, если в блоке выполнено больше limit SQL-запросов.
+
+    В сообщение попадает каждый запрос блока, чтобы было видно лишний.
+    """
+    with CaptureQueriesContext(connections[using]) as context:
+        yield context
+    if len(context) > limit:
+        queries = '\n'.join(
+            f'{number}. {query["sql"]}'
+            for number, query in enumerate(context.captured_queries, 1))
+        raise QueryBudgetExceeded(
+            f'{label}: {len(context)} SQL-запросов при бюджете {limit}:\n'
+            f'{queries}')
+
+
+def max_queries(limit, using='default'):
+    """Декоратор теста: весь тест укладывается в limit SQL-запросов."""
+    def decorator(test):
+        @wraps(test)
+        def wrapper(*args, **kwargs):
+            with query_budget(limit, using, test.__qualname__):
+                return test(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def isolated_cache():
+    """Кэш по умолчанию в блоке — отдельный файл во временном каталоге.
+
+    Для нагрузочных тестов, которые чистят кэш: кэш сервера они
+    не трогают.
+    """
+    directory = tempfile.mkdtemp(prefix='yatube-bench-cache-')
+    default = dict(my_set.CACHES['default'],
+                   LOCATION=os.path.join(directory, 'cache.sqlite3'))
+    try:
+        with override_settings(CACHES={**my_set.CACHES, 'default': default}):
+            yield
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
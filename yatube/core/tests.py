@@ -1,9 +1,438 @@
-from django.test import TestCase
-from http import HTTPStatus
-
-
-class ViewTestClass(TestCase):
-    def test_error_page(self):
-        response = self.client.get('/nonexist-page/')
-        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
-        self.assertTemplateUsed(response, 'core/404.html')
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from io import StringIO
+
+from django.conf import settings as my_set
+from django.contrib.auth.models import User
+from django.core.cache import cache as default_cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.template import Context, Template, engines
+from django.db import router
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import NoReverseMatch, reverse, set_script_prefix
+from http import HTTPStatus
+from . import metrics, routers
+from .cache import SQLiteCache
+from .db import apply_pragmas
+from .replication import copy_database
+from .templatetags.cached_urls import cached_reverse
+from .middleware import (
+    PIN_COOKIE, ReplicaPinMiddleware, RequestMetricsMiddleware)
+from .testing import QueryBudgetExceeded, max_queries, query_budget
+from .warmup import warm_up
+
+
+class ViewTestClass(TestCase):
+    def test_error_page(self):
+        response = self.client.get('/nonexist-page/')
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+        self.assertTemplateUsed(response, 'core/404.html')
+
+
+def set_in_child(location):
+    SQLiteCache(location, {}).set('shared', 'из другого процесса')
+
+
+class SQLiteCacheTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.location = os.path.join(self.directory, 'cache.sqlite3')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def make_cache(self, **options):
+        return SQLiteCache(self.location, {'OPTIONS': options})
+
+    def test_tests_do_not_use_server_cache(self):
+        """Тесты пишут в свой файл кэша, а не в кэш сервера."""
+        server_cache = os.path.join(my_set.BASE_DIR, 'cache.sqlite3')
+        self.assertNotEqual(default_cache._path, server_cache)
+        self.assertTrue(
+            default_cache._path.startswith(tempfile.gettempdir()))
+
+    def test_get_set_many(self):
+        cache = self.make_cache()
+        cache.set_many({'a': 1, 'b': [2, 3]})
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get_many(['a', 'b', 'c']),
+                         {'a': 1, 'b': [2, 3]})
+        self.assertFalse(cache.add('a', 5))
+        self.assertTrue(cache.add('c', 5))
+        self.assertEqual(cache.incr('c'), 6)
+        cache.delete_many(['a', 'c'])
+        self.assertEqual(cache.get_many(['a', 'b', 'c']), {'b': [2, 3]})
+
+    def test_expired_entries_are_missing(self):
+        cache = self.make_cache()
+        cache.set('key', 'value', timeout=0.05)
+        time.sleep(0.1)
+        self.assertIsNone(cache.get('key'))
+        self.assertTrue(cache.add('key', 'new'))
+
+    def test_lru_eviction_by_entries(self):
+        cache = self.make_cache(MAX_ENTRIES=3, CULL_FREQUENCY=3,
+                                ACCESS_INTERVAL=0)
+        for key in ('a', 'b', 'c'):
+            cache.set(key, key)
+            time.sleep(0.01)
+        cache.get('a')
+        cache.set('d', 'd')
+        self.assertEqual(cache.get_many(['a', 'b', 'c', 'd']),
+                         {'a': 'a', 'c': 'c', 'd': 'd'})
+
+    def test_lru_eviction_by_size(self):
+        cache = self.make_cache(MAX_BYTES=2500)
+        for key in ('a', 'b', 'c'):
+            cache.set(key, b'x' * 1000)
+            time.sleep(0.01)
+        self.assertEqual(set(cache.get_many(['a', 'b', 'c'])), {'b', 'c'})
+
+    def test_hit_does_not_write(self):
+        """Чтение свежей записи не берёт блокировку записи."""
+        cache = self.make_cache()
+        cache.set('key', 'value')
+        conn = cache._conn
+        changes = conn.total_changes
+        self.assertEqual(cache.get('key'), 'value')
+        self.assertEqual(conn.total_changes, changes)
+
+    def test_totals_follow_writes(self):
+        """Число и размер записей ведутся без подсчёта по таблице."""
+        cache = self.make_cache(PURGE_INTERVAL=0)
+        cache.set_many({'a': b'x' * 100, 'b': b'y' * 100})
+        cache.set('a', b'z' * 10)
+        cache.add('n', 1)
+        cache.incr('n')
+        cache.set('old', 1, timeout=0.05)
+        time.sleep(0.1)
+        cache.delete('b')
+        cache.set('c', 1)
+        conn = cache._conn
+        self.assertEqual(
+            cache._totals(conn),
+            conn.execute('SELECT COUNT(*), SUM(size) FROM cache').fetchone())
+        self.assertEqual(cache._totals(conn)[0], 3)
+
+    def test_shared_between_processes(self):
+        context = multiprocessing.get_context('fork')
+        process = context.Process(target=set_in_child,
+                                  args=(self.location,))
+        process.start()
+        process.join()
+        self.assertEqual(self.make_cache().get('shared'),
+                         'из другого процесса')
+
+
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        metrics.reset()
+
+    def test_server_timing_header(self):
+        """Server-Timing сообщает число запросов и время шаблонов."""
+        staff = User.objects.create_user(username='staff', is_staff=True)
+        self.client.force_login(staff)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/about/author/')
+        timing = response['Server-Timing']
+        self.assertIn(f'desc="{len(queries)} q"', timing)
+        self.assertNotIn('tpl;dur=0.00', timing)
+        self.assertIn('total;dur=', timing)
+
+    def test_server_timing_hidden_from_public(self):
+        """Гостям и обычным пользователям Server-Timing не отдаётся."""
+        user = User.objects.create_user(username='reader')
+        response = self.client.get('/about/author/')
+        self.assertFalse(response.has_header('Server-Timing'))
+        self.client.force_login(user)
+        response = self.client.get('/about/author/')
+        self.assertFalse(response.has_header('Server-Timing'))
+        with override_settings(SERVER_TIMING_PUBLIC=True):
+            self.client.logout()
+            response = self.client.get('/about/author/')
+        self.assertTrue(response.has_header('Server-Timing'))
+
+    def test_log_line(self):
+        with self.assertLogs('core.requests', 'INFO') as logs:
+            self.client.get('/about/tech/')
+        self.assertIn('view=about:tech status=200', logs.output[0])
+
+    def test_cache_hits_and_misses(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        cache = SQLiteCache(os.path.join(directory, 'cache.sqlite3'), {})
+        cache.set('a', 1)
+        current, token = metrics.start()
+        try:
+            cache.get_many(['a', 'b'])
+            cache.get('a')
+        finally:
+            metrics.stop(token)
+        self.assertEqual((current.cache_hits, current.cache_misses), (2, 1))
+
+    def test_stats_endpoint_is_staff_only(self):
+        self.client.get('/about/author/')
+        self.client.get('/about/author/')
+        response = self.client.get('/stats/requests/')
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        staff = User.objects.create_user(username='staff', is_staff=True)
+        self.client.force_login(staff)
+        stats = self.client.get('/stats/requests/').json()
+        views = stats['views']
+        self.assertEqual(views['about:author']['count'], 2)
+        self.assertEqual(sum(views['about:author']['buckets_ms'].values()),
+                         2)
+        self.assertEqual(
+            set(stats['page_cache']), {'hits', 'misses', 'stale'})
+
+    def test_overhead(self):
+        """Middleware добавляет к запросу меньше миллисекунды."""
+        request = RequestFactory().get('/')
+        middleware = RequestMetricsMiddleware(lambda request: HttpResponse())
+        rounds = 1000
+        started = time.perf_counter()
+        for _ in range(rounds):
+            middleware(request)
+        self.assertLess((time.perf_counter() - started) / rounds, 0.001)
+
+
+class QueryBudgetTests(TestCase):
+    def test_budget_exceeded_lists_queries(self):
+        """Превышение бюджета показывает SQL каждого запроса."""
+        with self.assertRaises(QueryBudgetExceeded) as error:
+            with query_budget(1, label='users'):
+                list(User.objects.all())
+                list(User.objects.filter(username='лишний'))
+        message = str(error.exception)
+        self.assertIn('users: 2 SQL-запросов при бюджете 1', message)
+        self.assertIn('2. SELECT', message)
+        self.assertIn('лишний', message)
+
+    def test_decorator(self):
+        @max_queries(1)
+        def one_query():
+            return User.objects.count()
+
+        @max_queries(0)
+        def too_many():
+            return User.objects.count()
+
+        self.assertEqual(one_query(), 0)
+        with self.assertRaises(QueryBudgetExceeded):
+            too_many()
+
+
+class SQLiteProfileTests(TestCase):
+    def test_connection_gets_pragmas(self):
+        """Соединение Django настроено сигналом connection_created."""
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0],
+                             my_set.SQLITE_PRAGMAS['busy_timeout'])
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+    def test_file_database_switches_to_wal(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        conn = sqlite3.connect(os.path.join(directory, 'db.sqlite3'))
+        apply_pragmas(conn, my_set.SQLITE_PRAGMAS)
+        self.assertEqual(
+            conn.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+        conn.close()
+
+    def test_bench_db(self):
+        out = StringIO()
+        call_command('bench_db', readers=1, writers=1, seconds=0.2,
+                     rows=10, stdout=out)
+        self.assertIn('default', out.getvalue())
+        self.assertIn('tuned', out.getvalue())
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRouterTests(TestCase):
+    def read_alias(self, request):
+        """Прогоняет запрос через middleware; view пишет, если просят."""
+        def view(request):
+            if request.GET.get('write'):
+                router.db_for_write(User)
+            response = HttpResponse()
+            response.alias = router.db_for_read(User)
+            return response
+
+        return ReplicaPinMiddleware(view)(request)
+
+    def test_outside_request_reads_primary(self):
+        """Команды и фоновые потоки читают из default."""
+        self.assertEqual(router.db_for_read(User), 'default')
+
+    def test_safe_request_reads_replica(self):
+        response = self.read_alias(RequestFactory().get('/'))
+        self.assertEqual(response.alias, 'replica')
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_write_pins_request_and_browser(self):
+        """После записи запрос и следующие запросы читают из default."""
+        factory = RequestFactory()
+        response = self.read_alias(factory.get('/', {'write': 1}))
+        self.assertEqual(response.alias, 'default')
+        cookie = response.cookies[PIN_COOKIE]
+        request = factory.get('/')
+        request.COOKIES[PIN_COOKIE] = cookie.value
+        self.assertEqual(self.read_alias(request).alias, 'default')
+        request.COOKIES[PIN_COOKIE] = 'просрочено'
+        self.assertEqual(self.read_alias(request).alias, 'replica')
+
+    def test_unsafe_method_reads_primary(self):
+        response = self.read_alias(RequestFactory().post('/'))
+        self.assertEqual(response.alias, 'default')
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas(self):
+        state, token = routers.start_request(True)
+        try:
+            self.assertEqual(router.db_for_read(User), 'default')
+        finally:
+            routers.end_request(token)
+        self.assertTrue(router.allow_migrate('replica', 'posts'))
+
+    def test_replicas_are_not_migrated(self):
+        self.assertFalse(router.allow_migrate('replica', 'posts'))
+        self.assertTrue(router.allow_migrate('default', 'posts'))
+
+
+class ReplicationTests(TestCase):
+    def test_copy_database(self):
+        """Реплика после копирования видит записи основной базы."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        primary = os.path.join(directory, 'primary.sqlite3')
+        replica = os.path.join(directory, 'replica.sqlite3')
+        conn = sqlite3.connect(primary)
+        conn.execute('CREATE TABLE post (text TEXT)')
+        conn.execute("INSERT INTO post VALUES ('первый')")
+        conn.commit()
+        copy_database(primary, replica)
+        conn.execute("INSERT INTO post VALUES ('второй')")
+        conn.commit()
+        reader = sqlite3.connect(replica)
+        self.assertEqual(reader.execute(
+            'SELECT COUNT(*) FROM post').fetchone()[0], 1)
+        copy_database(primary, replica)
+        self.assertEqual(reader.execute(
+            'SELECT COUNT(*) FROM post').fetchone()[0], 2)
+        reader.close()
+        conn.close()
+
+
+def templates_setting(directory, cached):
+    loaders = ['django.template.loaders.filesystem.Loader']
+    if cached:
+        loaders = [('django.template.loaders.cached.Loader', loaders)]
+    return [{
+        'BACKEND': 'core.template_backend.DjangoTemplates',
+        'DIRS': [directory],
+        'OPTIONS': {'loaders': loaders},
+    }]
+
+
+class TemplateWarmUpTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        os.makedirs(os.path.join(self.directory, 'posts'))
+        sources = {
+            'base.html': '{% block content %}{% endblock %}',
+            'posts/page.html': "{% extends 'base.html' %}",
+        }
+        for name, source in sources.items():
+            with open(os.path.join(self.directory, name), 'w') as file:
+                file.write(source)
+
+    def test_compile_templates(self):
+        """Команда компилирует все шаблоны проекта без ошибок."""
+        out = StringIO()
+        call_command('compile_templates', top=0, stdout=out)
+        self.assertIn('posts/includes/post_list.html', out.getvalue())
+
+    def test_syntax_error_is_reported(self):
+        with open(os.path.join(self.directory, 'broken.html'), 'w') as file:
+            file.write('{% if %}')
+        err = StringIO()
+        with override_settings(
+                TEMPLATES=templates_setting(self.directory, cached=False)):
+            with self.assertRaises(CommandError):
+                call_command('compile_templates', stdout=StringIO(),
+                             stderr=err)
+        self.assertIn('broken.html', err.getvalue())
+
+    def test_warm_up_fills_cached_loader(self):
+        """После прогрева шаблоны берутся из памяти, без чтения файлов."""
+        with override_settings(
+                TEMPLATES=templates_setting(self.directory, cached=True),
+                TEMPLATES_CACHED=True):
+            warm_up()
+            shutil.rmtree(self.directory)
+            engine = list(engines.all())[0]
+            self.assertEqual(
+                engine.get_template('posts/page.html').render(), '')
+
+
+class CachedURLTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    def setUp(self):
+        cached_reverse.cache_clear()
+
+    def test_same_urls_as_reverse(self):
+        """cached_reverse строит те же адреса, что reverse."""
+        for name, args, kwargs in (
+                ('posts:index', None, None),
+                ('posts:post_detail', [5], None),
+                ('posts:profile', None, {'username': 'auth'})):
+            with self.subTest(name=name):
+                self.assertEqual(cached_reverse(name, args, kwargs),
+                                 reverse(name, args=args, kwargs=kwargs))
+
+    def test_repeated_url_is_cached(self):
+        """Пользователь и его username дают одну запись кэша."""
+        cached_reverse('posts:profile', [self.user])
+        cached_reverse('posts:profile', ['auth'])
+        info = cached_reverse.cache_info()
+        self.assertEqual((info.hits, info.misses), (1, 1))
+
+    def test_no_reverse_match_is_not_cached(self):
+        with self.assertRaises(NoReverseMatch):
+            cached_reverse('posts:missing')
+        self.assertEqual(cached_reverse.cache_info().currsize, 0)
+
+    def test_script_prefix_is_part_of_key(self):
+        """Адрес под другим префиксом не берётся из кэша."""
+        cached_reverse('posts:index')
+        set_script_prefix('/yatube/')
+        try:
+            self.assertEqual(cached_reverse('posts:index'), '/yatube/')
+        finally:
+            set_script_prefix('/')
+
+    def test_url_tag(self):
+        """Тег заменяет {% url %} Django, включая форму с as."""
+        template = Template(
+            '{% load cached_urls %}'
+            '{% url "posts:post_detail" post_id %}'
+            '{% url "posts:missing" as missing %}[{{ missing }}]'
+            '{% url "posts:profile" user.username as link %}{{ link }}')
+        self.assertEqual(
+            template.render(Context({'post_id': 7, 'user': self.user})),
+            '/posts/7/[]/profile/auth/')
@@ -0,0 +1,66 @@
+import os
+import time
+
+from django.conf import settings as my_set
+from django.template import TemplateSyntaxError, engines
+from django.template.utils import get_app_template_dirs
+from django.urls import URLResolver, get_resolver
+
+
+def template_names(engine, app_dirs=False):
+    """Имена шаблонов из DIRS движка, с app_dirs ещё и из приложений."""
+    dirs = list(engine.engine.dirs)
+    if app_dirs:
+        dirs += get_app_template_dirs('templates')
+    names = set()
+    for directory in dirs:
+        for root, _, files in os.walk(directory):
+            for file_name in files:
+                path = os.path.join(root, file_name)
+                names.add(os.path.relpath(path, directory).replace(
+                    os.sep, '/'))
+    return sorted(names)
+
+
+def compile_templates(app_dirs=False):
+    """Компилирует шаблоны всех движков Django.
+
+    С кэширующим загрузчиком скомпилированные шаблоны остаются в памяти
+    процесса, и первый запрос их уже не разбирает. Возвращает список
+    (имя, секунды, ошибка или None).
+    """
+    results = []
+    for engine in engines.all():
+        if not hasattr(engine, 'engine'):
+            continue
+        for name in template_names(engine, app_dirs):
+            started = time.perf_counter()
+            error = None
+            try:
+                engine.get_template(name)
+            except (TemplateSyntaxError, UnicodeDecodeError) as exc:
+                error = exc
+            results.append((name, time.perf_counter() - started, error))
+    return results
+
+
+def populate_urls(resolver):
+    """Импортирует URLconf с представлениями и готовит таблицы reverse."""
+    resolver.reverse_dict
+    for pattern in resolver.url_patterns:
+        if isinstance(pattern, URLResolver):
+            populate_urls(pattern)
+
+
+def warm_up():
+    """Делает при старте воркера то, что иначе досталось бы первому
+    запросу: импорт представлений и контекст-процессоров, разбор
+    маршрутов и, с кэширующим загрузчиком, компиляцию шаблонов."""
+    # Запрос берёт резолвер по имени URLconf: в Django 2.2 это другая
+    # запись кэша get_resolver, чем get_resolver() без аргумента.
+    populate_urls(get_resolver(my_set.ROOT_URLCONF))
+    for engine in engines.all():
+        if hasattr(engine, 'engine'):
+            engine.engine.template_context_processors
+    if my_set.TEMPLATES_CACHED:
+        compile_templates()
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Comment, Follow, Group, Post
+from . import search
+from .models import Comment, Follow, Group, ImageJob, Post
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -15,6 +16,12 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return search.filter_posts(
+            queryset, search_term, with_comments=False), False
+
 
 class GroupAdmin(admin.ModelAdmin):
     list_display = ('title', 'slug', 'description')
@@ -35,6 +42,11 @@ class CommentAdmin(admin.ModelAdmin):
     list_filter = ('created',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return search.filter_comments(queryset, search_term), False
+
 
 class FollowAdmin(admin.ModelAdmin):
     list_display = (
@@ -46,7 +58,21 @@ class FollowAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
 
 
+class ImageJobAdmin(admin.ModelAdmin):
+    list_display = (
+        'pk',
+        'post',
+        'image',
+        'created',
+        'attempts',
+        'locked_until',
+        'error',
+    )
+    empty_value_display = '-пусто-'
+
+
 admin.site.register(Post, PostAdmin)
 admin.site.register(Comment, CommentAdmin)
 admin.site.register(Group, GroupAdmin)
 admin.site.register(Follow, FollowAdmin)
+admin.site.register(ImageJob, ImageJobAdmin)
@@ -3,3 +3,9 @@ from django.apps import AppConfig
 
 class PostsConfig(AppConfig):
     name = 'posts'
+
+    def ready(self):
+        from core import metrics
+        from . import signals  # noqa: F401
+        from .cache import cache_stats, reset_cache_stats
+        metrics.register('page_cache', cache_stats, reset_cache_stats)
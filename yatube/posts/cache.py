@@ -0,0 +1,165 @@
+import hashlib
+import threading
+import time
+import uuid
+from collections import Counter
+from functools import wraps
+
+from django.conf import settings as my_set
+from django.core.cache import cache
+
+from core import routers
+
+GENERATION_KEY = 'posts:generation'
+
+STATS_KEY = 'posts:page_cache_stats.{}'
+STATS_NAMES = ('hits', 'misses', 'stale')
+
+# Счётчики процесса, ещё не перенесённые в общий кэш.
+_pending = Counter()
+_stats_lock = threading.Lock()
+_next_flush = 0
+
+
+def _count(name):
+    with _stats_lock:
+        _pending[name] += 1
+        due = time.monotonic() >= _next_flush
+    if due:
+        flush_cache_stats()
+
+
+def flush_cache_stats():
+    """Переносит счётчики процесса в общий кэш.
+
+    Складываются раз в PAGE_CACHE_STATS_FLUSH секунд, а не на каждый
+    запрос: попадание в кэш страниц остаётся без записи.
+    """
+    global _next_flush
+    with _stats_lock:
+        pending = dict(_pending)
+        _pending.clear()
+        _next_flush = time.monotonic() + my_set.PAGE_CACHE_STATS_FLUSH
+    for name, value in pending.items():
+        key = STATS_KEY.format(name)
+        cache.add(key, 0, None)
+        try:
+            cache.incr(key, value)
+        except ValueError:
+            # Ключ вытеснен между add и incr.
+            cache.set(key, value, None)
+
+
+def cache_stats():
+    """Счётчики версионного кэша страниц всех процессов.
+
+    stale — ответы устаревшей копией, пока страницу пересчитывает
+    другой запрос. Другие процессы досылают свои счётчики не позже
+    чем через PAGE_CACHE_STATS_FLUSH секунд.
+    """
+    flush_cache_stats()
+    keys = {name: STATS_KEY.format(name) for name in STATS_NAMES}
+    values = cache.get_many(keys.values())
+    return {name: values.get(key, 0) for name, key in keys.items()}
+
+
+def reset_cache_stats():
+    with _stats_lock:
+        _pending.clear()
+    cache.delete_many([STATS_KEY.format(name) for name in STATS_NAMES])
+
+
+def get_generation():
+    # Стартовое значение от времени: если ключ вытеснен из кэша,
+    # новое поколение не совпадёт со старыми страницами.
+    cache.add(GENERATION_KEY, int(time.time() * 1000), None)
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        return bump_generation()
+    return generation
+
+
+def bump_generation():
+    """Делает недействительными все закэшированные страницы."""
+    try:
+        return cache.incr(GENERATION_KEY)
+    except ValueError:
+        generation = int(time.time() * 1000)
+        cache.set(GENERATION_KEY, generation, None)
+        return generation
+
+
+def page_cache_options(key_prefix):
+    options = {'TIMEOUT': 300, 'STALE': 0, 'WAIT': 2.0, 'LOCK_TIMEOUT': 10}
+    options.update(my_set.PAGE_CACHE.get(key_prefix, {}))
+    return options
+
+
+def _page_key(request, key_prefix):
+    url = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+    return '{}.{}.{}.{}'.format(
+        key_prefix, get_generation(), request.user.pk or 0, url)
+
+
+def _store(key, response, options):
+    # Запись живёт дольше TIMEOUT на STALE секунд: в это время
+    # устаревшая страница отдаётся, пока один запрос строит новую.
+    fresh_until = time.time() + options['TIMEOUT']
+    cache.set(key, (fresh_until, response),
+              options['TIMEOUT'] + options['STALE'])
+
+
+def _wait_for(key, options):
+    deadline = time.time() + options['WAIT']
+    while time.time() < deadline:
+        time.sleep(0.05)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+    return None
+
+
+def cache_page_versioned(key_prefix):
+    """Аналог cache_page с версионным ключом и защитой от stampede.
+
+    Страницы кэшируются отдельно для каждого пользователя (гости делят
+    общую копию) и сбрасываются сразу после bump_generation().
+    Пересчитывает страницу только один запрос: остальные получают
+    устаревшую копию или ждут до WAIT секунд. Параметры берутся из
+    settings.PAGE_CACHE[key_prefix].
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view_func(request, *args, **kwargs)
+            options = page_cache_options(key_prefix)
+            key = _page_key(request, key_prefix)
+            entry = cache.get(key)
+            if entry is not None and entry[0] > time.time():
+                _count('hits')
+                return entry[1]
+            lock_key = key + '.lock'
+            # Блокировку снимает только тот, кто её взял: запрос, не
+            # дождавшийся пересчёта, иначе открыл бы её для остальных.
+            token = uuid.uuid4().hex
+            acquired = cache.add(lock_key, token, options['LOCK_TIMEOUT'])
+            if not acquired:
+                if entry is None:
+                    entry = _wait_for(key, options)
+                if entry is not None:
+                    _count('stale')
+                    return entry[1]
+            _count('misses')
+            try:
+                with routers.primary():
+                    response = view_func(request, *args, **kwargs)
+                if (response.status_code == 200 and not response.streaming
+                        and not response.cookies):
+                    _store(key, response, options)
+            finally:
+                if acquired and cache.get(lock_key) == token:
+                    cache.delete(lock_key)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,50 @@
+import hashlib
+from functools import lru_cache
+
+from django.conf import settings as my_set
+from django.core.cache import cache
+from django.db.models import F
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+from . import thumbnails
+from .models import Post
+
+TEMPLATE = 'posts/includes/post_list.html'
+
+
+@lru_cache(maxsize=None)
+def _template_revision():
+    # Правка шаблона после выкладки не должна отдавать старые карточки.
+    source = get_template(TEMPLATE).template.source
+    return hashlib.md5(source.encode()).hexdigest()[:8]
+
+
+def card_key(post):
+    return f'post_card.{_template_revision()}.{post.pk}.{post.version}'
+
+
+def bump(**filters):
+    """Новая версия у постов по фильтру: их карточки отрисуются заново."""
+    return Post.objects.filter(**filters).update(version=F('version') + 1)
+
+
+def prefetch(posts):
+    """Кладёт в post.card готовую карточку для каждого поста страницы.
+
+    Карточки страницы читаются из кэша одним get_many; недостающие
+    рисуются и сохраняются одним set_many. Карточка не зависит от
+    пользователя и меняется только с версией поста, поэтому общая.
+    """
+    keys = {card_key(post): post for post in posts}
+    found = cache.get_many(list(keys))
+    missing = [post for key, post in keys.items() if key not in found]
+    if missing:
+        thumbnails.prefetch(missing)
+        template = get_template(TEMPLATE)
+        rendered = {card_key(post): template.render({'post': post})
+                    for post in missing}
+        cache.set_many(rendered, my_set.POST_CARD_TIMEOUT)
+        found.update(rendered)
+    for key, post in keys.items():
+        post.card = mark_safe(found[key])
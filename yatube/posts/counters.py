@@ -0,0 +1,94 @@
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import AuthorStats, Comment, Follow, Post, User
+
+
+def _shift(model, pk, field, delta):
+    rows = model.objects.filter(pk=pk)
+    if delta < 0:
+        rows = rows.filter(**{f'{field}__gt': 0})
+    return rows.update(**{field: F(field) + delta})
+
+
+def change_user(user_id, field, delta):
+    """Сдвигает счётчик пользователя на delta одним UPDATE."""
+    updated = _shift(AuthorStats, user_id, field, delta)
+    if not updated and delta > 0:
+        # Строки ещё нет (пользователь создан в обход сигналов).
+        recount_user(user_id)
+
+
+def stats_for(user):
+    """Счётчики пользователя; недостающая строка создаётся пересчётом."""
+    try:
+        return user.stats
+    except AuthorStats.DoesNotExist:
+        recount_user(user.pk)
+        return AuthorStats.objects.get(pk=user.pk)
+
+
+def change_post(post_id, delta):
+    _shift(Post, post_id, 'comments_count', delta)
+
+
+def _count(model, field, outer='pk'):
+    rows = model.objects.filter(**{field: OuterRef(outer)}).order_by(
+    ).values(field).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(rows, output_field=IntegerField()), 0)
+
+
+def _actual_user_counts():
+    return {
+        'posts_count': _count(Post, 'author', 'user'),
+        'followers_count': _count(Follow, 'author', 'user'),
+        'following_count': _count(Follow, 'user', 'user'),
+    }
+
+
+def recount_user(user_id):
+    if User.objects.filter(pk=user_id).exists():
+        AuthorStats.objects.get_or_create(user_id=user_id)
+        AuthorStats.objects.filter(pk=user_id).update(**_actual_user_counts())
+
+
+def recount_users(user_ids):
+    """Пересчитывает счётчики пользователей user_ids одним UPDATE."""
+    user_ids = set(user_ids)
+    present = AuthorStats.objects.filter(
+        pk__in=user_ids).values_list('pk', flat=True)
+    AuthorStats.objects.bulk_create(
+        [AuthorStats(user_id=pk) for pk in user_ids - set(present)],
+        ignore_conflicts=True)
+    AuthorStats.objects.filter(pk__in=user_ids).update(
+        **_actual_user_counts())
+
+
+def recount_posts(post_ids):
+    """Пересчитывает число комментариев постов post_ids."""
+    Post.objects.filter(pk__in=set(post_ids)).update(
+        comments_count=_count(Comment, 'post'))
+
+
+def reconcile():
+    """Пересчитывает все счётчики. Возвращает число исправленных строк."""
+    missing = User.objects.filter(stats__isnull=True)
+    created = len(AuthorStats.objects.bulk_create(
+        [AuthorStats(user=user) for user in missing.only('pk')]))
+    actual = _actual_user_counts()
+    drifted_stats = AuthorStats.objects.annotate(
+        **{f'actual_{name}': value for name, value in actual.items()}
+    ).exclude(
+        posts_count=F('actual_posts_count'),
+        followers_count=F('actual_followers_count'),
+        following_count=F('actual_following_count'),
+    ).values_list('pk', flat=True)
+    fixed = AuthorStats.objects.filter(
+        pk__in=list(drifted_stats)).update(**actual)
+    comments = _count(Comment, 'post')
+    drifted_posts = Post.objects.annotate(
+        actual=comments).exclude(comments_count=F('actual')).values_list(
+        'pk', flat=True)
+    fixed += Post.objects.filter(
+        pk__in=list(drifted_posts)).update(comments_count=comments)
+    return created + fixed
@@ -0,0 +1,105 @@
+from django.conf import settings as my_set
+from django.core.cache import cache
+from django.db.models import Sum
+
+from core import routers
+
+from . import counters, feed
+from .models import AuthorStats, Post
+
+KEY = 'post_count.{}'
+
+
+def _key(scope):
+    return KEY.format(scope)
+
+
+def estimate(queryset):
+    """Оценка числа постов queryset по последним POST_COUNT_SAMPLE id.
+
+    Доля подходящих постов среди последних id переносится на весь
+    диапазон id, поэтому стоимость не зависит от размера таблицы.
+    """
+    # Крайние id отдельными запросами: MIN и MAX вместе SQLite считает
+    # полным проходом, а по одному берёт из индекса.
+    ids = Post.objects.values_list('pk', flat=True)
+    high = ids.order_by('-pk').first()
+    if high is None:
+        return 0
+    low = ids.order_by('pk').first()
+    cutoff = max(low, high - my_set.POST_COUNT_SAMPLE + 1)
+    sample = queryset.filter(pk__gte=cutoff).order_by().count()
+    return round(sample * (high - low + 1) / (high - cutoff + 1))
+
+
+def bounded_count(queryset):
+    """Точное число до POST_COUNT_EXACT_LIMIT, дальше — оценка."""
+    limit = my_set.POST_COUNT_EXACT_LIMIT
+    count = queryset.order_by()[:limit + 1].count()
+    if count > limit:
+        count = max(limit + 1, estimate(queryset))
+    return count
+
+
+def _cached(scope, queryset, actual=None):
+    key = _key(scope)
+    if actual is not None:
+        # Пагинатор нашёл настоящее число: оценка или кэш разошлись.
+        cache.set(key, actual, my_set.POST_COUNT_TIMEOUT)
+        return actual
+    count = cache.get(key)
+    if count is None:
+        with routers.primary():
+            count = bounded_count(queryset)
+        cache.set(key, count, my_set.POST_COUNT_TIMEOUT)
+    return count
+
+
+# actual — настоящее число, найденное пагинатором: оно заменяет
+# закэшированное.
+
+
+def total(actual=None):
+    return _cached('all', Post.objects.all(), actual)
+
+
+def for_group(group, actual=None):
+    return _cached(
+        f'group.{group.pk}', Post.objects.filter(group=group), actual)
+
+
+def for_author(author, actual=None):
+    return _cached(
+        f'author.{author.pk}', Post.objects.filter(author=author), actual)
+
+
+def for_follower(user, actual=None):
+    if not feed.is_materialized():
+        stats = AuthorStats.objects.filter(user__following__user=user)
+        if actual is not None:
+            # Сумма счётчиков авторов разошлась с постами: пересчитываем.
+            for pk in stats.values_list('pk', flat=True):
+                counters.recount_user(pk)
+            return actual
+        return stats.aggregate(total=Sum('posts_count'))['total'] or 0
+    return _cached(f'follower.{user.pk}', feed.follow_posts(user), actual)
+
+
+def _shift(scope, delta):
+    # Нет в кэше — посчитается при следующем запросе.
+    try:
+        cache.incr(_key(scope), delta)
+    except ValueError:
+        pass
+
+
+def post_added(post, delta=1):
+    """Сдвигает закэшированные числа после создания или удаления поста."""
+    _shift('all', delta)
+    _shift(f'author.{post.author_id}', delta)
+    if post.group_id is not None:
+        _shift(f'group.{post.group_id}', delta)
+
+
+def forget(*scopes):
+    cache.delete_many([_key(scope) for scope in scopes])
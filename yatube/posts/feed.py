@@ -0,0 +1,217 @@
+from django.conf import settings as my_set
+from collections import defaultdict
+
+from django.db.models import Count, OuterRef, Q, Subquery
+
+from . import counters
+from .models import AuthorStats, FeedItem, Follow, Post, User
+from .utils import (
+    CURSOR_PREV, FEED_DEFERRED_FIELDS, CursorPaginator, decode_cursor,
+    feed_posts)
+
+
+def is_materialized():
+    return my_set.FOLLOW_FEED_MATERIALIZED
+
+
+def is_celebrity(author):
+    """У автора слишком много подписчиков для fan-out-on-write.
+
+    Счётчик читается из базы: экземпляр автора у поста мог быть
+    загружен задолго до сохранения.
+    """
+    followers = _followers_count(author.pk)
+    if followers is None:
+        followers = counters.stats_for(author).followers_count
+    return followers > my_set.FOLLOW_FEED_FANOUT_LIMIT
+
+
+def _followers_count(author_id):
+    return AuthorStats.objects.filter(user_id=author_id).values_list(
+        'followers_count', flat=True).first()
+
+
+def celebrity_ids(user):
+    """Авторы пользователя, ленты которых собираются при чтении."""
+    return list(AuthorStats.objects.filter(
+        user__following__user=user,
+        followers_count__gt=my_set.FOLLOW_FEED_FANOUT_LIMIT,
+    ).values_list('user_id', flat=True))
+
+
+def fan_out_post(post):
+    """Добавляет новый пост в ленты подписчиков автора.
+
+    Вызывается сигналом post_save при создании поста.
+    """
+    if not is_materialized() or is_celebrity(post.author):
+        return
+    follower_ids = Follow.objects.filter(
+        author=post.author).values_list('user_id', flat=True)
+    FeedItem.objects.bulk_create(
+        [FeedItem(user_id=user_id, post=post, pub_date=post.pub_date)
+         for user_id in follower_ids.iterator()],
+        batch_size=my_set.FOLLOW_FEED_BATCH_SIZE,
+    )
+
+
+def refill_former_celebrity(author_id):
+    """Возвращает посты автора в ленты, когда он перестал быть
+    знаменитостью.
+
+    Пока подписчиков было больше FOLLOW_FEED_FANOUT_LIMIT, его посты
+    собирались при чтении и в FeedItem не попадали. Как только их
+    стало ровно FOLLOW_FEED_FANOUT_LIMIT, чтение их больше не добавляет:
+    последние посты раздаются оставшимся подписчикам.
+    """
+    if not is_materialized():
+        return
+    if _followers_count(author_id) != my_set.FOLLOW_FEED_FANOUT_LIMIT:
+        return
+    posts = list(Post.objects.filter(author_id=author_id).values_list(
+        'pk', 'pub_date')[:my_set.FOLLOW_FEED_BACKFILL])
+    follower_ids = Follow.objects.filter(
+        author_id=author_id).values_list('user_id', flat=True)
+    for user_id in follower_ids.iterator():
+        FeedItem.objects.bulk_create(
+            [FeedItem(user_id=user_id, post_id=pk, pub_date=pub_date)
+             for pk, pub_date in posts],
+            batch_size=my_set.FOLLOW_FEED_BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+
+
+def fan_out_posts(post_ids):
+    """Раздаёт подписчикам посты, загруженные в обход сигналов."""
+    if not is_materialized():
+        return
+    posts = list(Post.objects.filter(pk__in=set(post_ids)).exclude(
+        author__stats__followers_count__gt=my_set.FOLLOW_FEED_FANOUT_LIMIT,
+    ).values_list('pk', 'author_id', 'pub_date'))
+    _add_items(posts, _followers({author for _, author, _ in posts}))
+
+
+def backfill_pairs(pairs):
+    """Заполняет ленты по подпискам (user_id, author_id), загруженным
+    в обход сигналов: последние посты авторов читаются одним запросом."""
+    if not is_materialized() or not pairs:
+        return
+    latest = Post.objects.filter(
+        author_id=OuterRef('author_id'),
+    ).values('pk')[:my_set.FOLLOW_FEED_BACKFILL]
+    posts = Post.objects.filter(
+        author_id__in={author for _, author in pairs},
+        pk__in=Subquery(latest),
+    ).exclude(
+        author__stats__followers_count__gt=my_set.FOLLOW_FEED_FANOUT_LIMIT,
+    ).values_list('pk', 'author_id', 'pub_date')
+    followers = defaultdict(list)
+    for user_id, author_id in pairs:
+        followers[author_id].append(user_id)
+    _add_items(posts, followers)
+
+
+def _followers(author_ids):
+    followers = defaultdict(list)
+    rows = Follow.objects.filter(
+        author_id__in=author_ids).values_list('author_id', 'user_id')
+    for author_id, user_id in rows:
+        followers[author_id].append(user_id)
+    return followers
+
+
+def _add_items(posts, followers):
+    FeedItem.objects.bulk_create(
+        [FeedItem(user_id=user_id, post_id=pk, pub_date=pub_date)
+         for pk, author_id, pub_date in posts
+         for user_id in followers[author_id]],
+        batch_size=my_set.FOLLOW_FEED_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user, author):
+    """Заполняет ленту последними постами автора после подписки."""
+    if not is_materialized() or is_celebrity(author):
+        return
+    posts = Post.objects.filter(author=author).values_list(
+        'pk', 'pub_date')[:my_set.FOLLOW_FEED_BACKFILL]
+    FeedItem.objects.bulk_create(
+        [FeedItem(user=user, post_id=pk, pub_date=pub_date)
+         for pk, pub_date in posts],
+        batch_size=my_set.FOLLOW_FEED_BATCH_SIZE,
+    )
+
+
+def trim(user, author):
+    """Убирает посты автора из ленты после отписки."""
+    if not is_materialized():
+        return
+    FeedItem.objects.filter(user=user, post__author=author).delete()
+
+
+def follow_posts(user):
+    """Посты ленты подписок пользователя одним queryset.
+
+    Для страниц материализованной ленты есть timeline_page: этот
+    queryset сортирует всю ленту и годится только для подсчёта.
+    """
+    if not is_materialized():
+        return Post.objects.filter(author__following__user=user)
+    timeline = FeedItem.objects.filter(user=user).values('post_id')
+    return Post.objects.filter(
+        Q(pk__in=timeline) | Q(author_id__in=celebrity_ids(user)))
+
+
+def timeline_items(user):
+    """Записи ленты пользователя с тем, что читают шаблоны ленты."""
+    return FeedItem.objects.filter(user=user).select_related(
+        'post__author', 'post__group').defer(
+        *(f'post__{field}' for field in FEED_DEFERRED_FIELDS))
+
+
+def timeline_page(user, token):
+    """Страница материализованной ленты по курсору (pub_date, id поста).
+
+    Записи FeedItem читаются по индексу (user, -pub_date, -post) от
+    курсора и не дальше страницы; посты каждого автора-знаменитости —
+    так же по индексу постов автора. Выборки сливаются по дате.
+    """
+    cursor = decode_cursor(token)
+    items = CursorPaginator(
+        timeline_items(user), my_set.POSTS_AMOUNT, key_field='post_id')
+    rows = [item.post for item in items.fetch(cursor)]
+    # Посты автора, ставшего знаменитостью, могут быть и в FeedItem.
+    seen = {post.pk for post in rows}
+    for author_id in celebrity_ids(user):
+        rows += [post for post in CursorPaginator(
+            feed_posts().filter(author_id=author_id),
+            my_set.POSTS_AMOUNT).fetch(cursor) if post.pk not in seen]
+    # Строки каждой выборки идут от курсора; слияние сохраняет порядок.
+    paginator = CursorPaginator(feed_posts(), my_set.POSTS_AMOUNT)
+    backwards = cursor is not None and cursor[0] == CURSOR_PREV
+    rows.sort(key=paginator.sort_key, reverse=not backwards)
+    return paginator.page_from_rows(rows[:my_set.POSTS_AMOUNT + 1], cursor)
+
+
+def rebuild_timelines():
+    """Пересобирает все ленты с нуля. Возвращает число записей."""
+    FeedItem.objects.all().delete()
+    celebrities = set(User.objects.annotate(
+        followers=Count('following'),
+    ).filter(
+        followers__gt=my_set.FOLLOW_FEED_FANOUT_LIMIT
+    ).values_list('pk', flat=True))
+    created = 0
+    follows = Follow.objects.exclude(
+        author_id__in=celebrities).values_list('user_id', 'author_id')
+    for user_id, author_id in follows.iterator():
+        posts = Post.objects.filter(author_id=author_id).values_list(
+            'pk', 'pub_date')[:my_set.FOLLOW_FEED_BACKFILL]
+        items = FeedItem.objects.bulk_create(
+            [FeedItem(user_id=user_id, post_id=pk, pub_date=pub_date)
+             for pk, pub_date in posts],
+            batch_size=my_set.FOLLOW_FEED_BATCH_SIZE,
+        )
+        created += len(items)
+    return created
@@ -0,0 +1,151 @@
+import io
+import logging
+from datetime import timedelta
+
+from django.conf import settings as my_set
+from django.db.models import F, Q
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from . import thumbnails, uploads
+from .cache import bump_generation
+from .models import ImageJob, Post
+
+logger = logging.getLogger('posts.images')
+
+# Ошибки разбора картинки. Файл к этому моменту уже в памяти, поэтому
+# OSError здесь — обрезанный файл, а не сбой хранилища.
+DECODE_ERRORS = (Image.UnidentifiedImageError, Image.DecompressionBombError,
+                 SyntaxError, ValueError, OSError)
+
+
+class InvalidImage(Exception):
+    """Файл не картинка, обрезан или слишком велик: повтор не поможет."""
+
+
+def enqueue(post):
+    """Ставит картинку поста в очередь; пост уже помечен IMAGE_PENDING.
+
+    При IMAGE_QUEUE_ASYNC = False картинка обрабатывается сразу.
+    """
+    job = ImageJob.objects.create(post=post, image=post.image.name)
+    if not my_set.IMAGE_QUEUE_ASYNC:
+        run(job)
+    return job
+
+
+def claim():
+    """Берёт старейшую свободную задачу и занимает её на IMAGE_JOB_LEASE.
+
+    Задача упавшего воркера освобождается, когда истечёт срок.
+    Несколько воркеров не возьмут одну задачу: занимает тот, чей
+    UPDATE изменил строку.
+    """
+    now = timezone.now()
+    free = Q(locked_until__isnull=True) | Q(locked_until__lt=now)
+    locked_until = now + timedelta(seconds=my_set.IMAGE_JOB_LEASE)
+    for job in ImageJob.objects.filter(free)[:10]:
+        claimed = ImageJob.objects.filter(free, pk=job.pk).update(
+            locked_until=locked_until, attempts=F('attempts') + 1)
+        if claimed:
+            job.locked_until = locked_until
+            job.attempts += 1
+            return job
+    return None
+
+
+def reencode(image):
+    """Декодирует картинку целиком и сохраняет заново.
+
+    EXIF и прочие метаданные отбрасываются (поворот из EXIF применяется
+    к пикселям), большая сторона уменьшается до IMAGE_MAX_SIZE.
+    Прозрачные картинки пишутся в PNG, остальные в JPEG. Файл называется
+    по содержимому, как и загрузки. Возвращает имя файла в хранилище.
+
+    Неразборчивый файл — InvalidImage; ошибки чтения и записи хранилища
+    проходят как есть, и задача повторяется.
+    """
+    with image.storage.open(image.name, 'rb') as source:
+        data = source.read()
+    buffer = io.BytesIO()
+    try:
+        picture = Image.open(io.BytesIO(data))
+        picture.load()
+        picture = ImageOps.exif_transpose(picture)
+        picture.thumbnail((my_set.IMAGE_MAX_SIZE, my_set.IMAGE_MAX_SIZE))
+        if picture.mode in ('RGBA', 'LA') or 'transparency' in picture.info:
+            extension = '.png'
+            picture.convert('RGBA').save(buffer, 'PNG', optimize=True)
+        else:
+            extension = '.jpg'
+            picture.convert('RGB').save(
+                buffer, 'JPEG', quality=my_set.IMAGE_JPEG_QUALITY,
+                optimize=True, progressive=True)
+    except DECODE_ERRORS as error:
+        raise InvalidImage(error) from error
+    return uploads.store(image.storage, buffer.getvalue(), extension)
+
+
+def discard(storage, name):
+    """Удаляет файл, если на него не ссылаются посты и задачи очереди.
+
+    Одинаковые загрузки хранятся одним файлом, поэтому файл поста
+    может принадлежать и другим постам.
+    """
+    if not (Post.objects.filter(image=name).exists()
+            or ImageJob.objects.filter(image=name).exists()):
+        storage.delete(name)
+
+
+def _finish(post_id, old_name, **fields):
+    # Условие по имени файла: пока шла обработка, автор мог заменить
+    # картинку, и тогда результат этой задачи уже не нужен.
+    return Post.objects.filter(pk=post_id, image=old_name).update(
+        version=F('version') + 1, **fields)
+
+
+def run(job):
+    """Обрабатывает картинку задачи и строит миниатюры.
+
+    Возвращает True, если задача закрыта (успешно, навсегда неудачно
+    или устарела), и False, если её стоит повторить.
+    """
+    post = Post.objects.filter(pk=job.post_id).only('image').first()
+    storage = Post._meta.get_field('image').storage
+    if post is None or post.image.name != job.image:
+        # Картинку заменили или пост удалён: старый файл больше не нужен,
+        # если его не делят другие посты.
+        job.delete()
+        discard(storage, job.image)
+        return True
+    try:
+        name = reencode(post.image)
+    except InvalidImage as error:
+        logger.warning('post=%s image=%s rejected: %s',
+                       job.post_id, job.image, error)
+        _finish(job.post_id, job.image, image='',
+                image_status=Post.IMAGE_FAILED)
+        job.delete()
+        discard(storage, job.image)
+        bump_generation()
+        return True
+    except Exception as error:
+        logger.exception('post=%s image=%s failed', job.post_id, job.image)
+        # Без воркера (IMAGE_QUEUE_ASYNC = False) повторять некому.
+        if (my_set.IMAGE_QUEUE_ASYNC
+                and job.attempts < my_set.IMAGE_JOB_ATTEMPTS):
+            # Повтор, когда истечёт срок занятости задачи.
+            ImageJob.objects.filter(pk=job.pk).update(error=repr(error))
+            return False
+        _finish(job.post_id, job.image, image_status=Post.IMAGE_FAILED)
+        job.delete()
+        bump_generation()
+        return True
+    if _finish(job.post_id, job.image, image=name):
+        thumbnails.generate(job.post_id)
+        _finish(job.post_id, name, image_status=Post.IMAGE_READY)
+    job.delete()
+    for stale in {job.image, name}:
+        discard(storage, stale)
+    bump_generation()
+    return True
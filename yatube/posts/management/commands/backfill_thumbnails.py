@@ -0,0 +1,37 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings as my_set
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Строит миниатюры для постов, у которых их ещё нет.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Перестроить миниатюры у всех постов с картинками.')
+        parser.add_argument(
+            '--workers', type=int, default=my_set.THUMBNAIL_WORKERS)
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='')
+        if not options['all']:
+            posts = posts.filter(image_card='')
+        post_ids = list(posts.values_list('pk', flat=True))
+        if options['workers'] > 1:
+            pool = ThreadPoolExecutor(max_workers=options['workers'])
+            results = pool.map(thumbnails.generate_in_worker, post_ids)
+        else:
+            pool = None
+            results = map(thumbnails.generate, post_ids)
+        for done, _ in enumerate(results, 1):
+            if done % 100 == 0:
+                self.stdout.write(f'{done}/{len(post_ids)}')
+        if pool is not None:
+            pool.shutdown()
+        self.stdout.write(self.style.SUCCESS(
+            f'Миниатюры построены для {len(post_ids)} постов'))
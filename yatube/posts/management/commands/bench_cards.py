@@ -0,0 +1,55 @@
+import time
+
+from django.conf import settings as my_set
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.template.loader import get_template
+
+from posts import cards, thumbnails
+from posts.utils import feed_posts
+
+
+class Command(BaseCommand):
+    help = ('Время отрисовки постов страницы ленты: каждая карточка '
+            'шаблоном и карточки из кэша одним get_many.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--pages', type=int, default=20)
+
+    def pages(self, count):
+        # Разные страницы ленты, чтобы не мерить одни и те же ключи.
+        posts = list(feed_posts()[:my_set.POSTS_AMOUNT * count])
+        return [posts[offset:offset + my_set.POSTS_AMOUNT]
+                for offset in range(0, len(posts), my_set.POSTS_AMOUNT)]
+
+    def render_templates(self, page):
+        template = get_template(cards.TEMPLATE)
+        thumbnails.prefetch(page)
+        return ''.join(template.render({'post': post}) for post in page)
+
+    def render_cards(self, page):
+        cards.prefetch(page)
+        return ''.join(post.card for post in page)
+
+    def measure(self, render, pages, repeat):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            for page in pages:
+                render(page)
+        return (time.perf_counter() - started) / repeat / len(pages) * 1000
+
+    def handle(self, *args, **options):
+        pages = self.pages(options['pages'])
+        repeat = options['repeat']
+        self.render_templates(pages[0])
+        results = [('шаблоном', self.measure(
+            self.render_templates, pages, repeat))]
+        for page in pages:
+            cache.delete_many([cards.card_key(post) for post in page])
+        results.append(('холодный кэш', self.measure(
+            self.render_cards, pages, 1)))
+        results.append(('из кэша', self.measure(
+            self.render_cards, pages, repeat)))
+        for name, latency in results:
+            self.stdout.write(f'{name:>14}: {latency:.2f} мс на страницу')
@@ -0,0 +1,78 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from posts import counts, search
+from posts.models import Post, User
+from posts.synthetic import WORDS, make_word, zipf_weights
+from posts.utils import feed_posts
+
+WORDS_PER_POST = 30
+BATCH_SIZE = 10000
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает поиск icontains и FTS5 на синтетическом корпусе. '
+            'Добавляет посты в текущую базу: запускать на отдельной копии.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1000000)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def fill(self, total):
+        author, _ = User.objects.get_or_create(username='bench_search')
+        missing = total - Post.objects.filter(author=author).count()
+        if missing <= 0:
+            return
+        words = [make_word(rank) for rank in range(WORDS)]
+        weights = zipf_weights(WORDS)
+        rng = random.Random(0)
+        started = time.perf_counter()
+        for offset in range(0, missing, BATCH_SIZE):
+            batch = [
+                Post(author=author, text=' '.join(rng.choices(
+                    words, cum_weights=weights, k=WORDS_PER_POST)))
+                for _ in range(min(BATCH_SIZE, missing - offset))
+            ]
+            with transaction.atomic():
+                Post.objects.bulk_create(batch)
+        self.stdout.write(f'Создано постов: {missing} за '
+                          f'{time.perf_counter() - started:.1f} с')
+        started = time.perf_counter()
+        search.rebuild()
+        self.stdout.write(f'Индекс построен за '
+                          f'{time.perf_counter() - started:.1f} с')
+
+    def measure(self, run, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = run()
+            timings.append(time.perf_counter() - started)
+        return min(timings) * 1000, result
+
+    def handle(self, *args, **options):
+        if not search.is_supported():
+            raise CommandError('Полнотекстовый индекс есть только в SQLite.')
+        self.fill(options['posts'])
+        total = Post.objects.count()
+        self.stdout.write(f'Постов в базе: {total}')
+        for rank in (0, 10, 100, 1000, 10000):
+            word = make_word(rank)
+            variants = (
+                ('icontains', feed_posts().filter(text__icontains=word)),
+                ('fts5', search.filter_posts(feed_posts(), word)),
+            )
+            for name, post_list in variants:
+                page_ms, _ = self.measure(
+                    lambda: list(post_list.order_by('-pub_date', '-pk')[:11]),
+                    options['repeat'])
+                # Страницы считают посты так же: точно до предела, дальше
+                # оценкой. Полный count() частого слова перебирает все посты.
+                count_ms, found = self.measure(
+                    lambda: counts.bounded_count(post_list), options['repeat'])
+                self.stdout.write(
+                    f'{word:>8} {name:>9}: найдено {found:8}, '
+                    f'страница {page_ms:8.1f} мс, count {count_ms:8.1f} мс')
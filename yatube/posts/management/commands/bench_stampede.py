@@ -0,0 +1,58 @@
+import threading
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.views.decorators.cache import cache_page
+
+from core.testing import isolated_cache
+from posts import views
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный тест истечения кэша index: сколько SQL-запросов '
+            'выполняют одновременные запросы с cache_page и с '
+            'cache_page_versioned. Кэш — временный файл, не кэш сервера.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=20)
+
+    def run(self, view, clients):
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        barrier = threading.Barrier(clients)
+        counts = []
+
+        def worker():
+            barrier.wait()
+            with CaptureQueriesContext(connection) as queries:
+                view(request)
+            counts.append(len(queries))
+            connection.close()
+
+        # Очистка кэша имитирует одновременное истечение записи.
+        cache.clear()
+        threads = [threading.Thread(target=worker) for _ in range(clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return sum(counts)
+
+    def handle(self, *args, **options):
+        clients = options['clients']
+        # cache_page берёт кэш при оборачивании: оборачиваем внутри
+        # isolated_cache.
+        variants = (
+            ('cache_page', lambda: cache_page(60, key_prefix='bench')(
+                views.index.__wrapped__)),
+            ('cache_page_versioned', lambda: views.index),
+        )
+        for name, make_view in variants:
+            with isolated_cache():
+                queries = self.run(make_view(), clients)
+            self.stdout.write(
+                f'{name:>20}: {queries} SQL-запросов на {clients} клиентов')
@@ -0,0 +1,45 @@
+import time
+
+from django.conf import settings as my_set
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.template.loader import get_template
+from django.test.utils import CaptureQueriesContext
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Время отрисовки страницы ленты с картинками: по запросу '
+            'к хранилищу sorl на пост и с prefetch на всю страницу.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def render_page(self, prefetch):
+        template = get_template('posts/includes/post_list.html')
+        posts = list(Post.objects.select_related('author').exclude(
+            image='')[:my_set.POSTS_AMOUNT])
+        for post in posts:
+            # Без сохранённых адресов, как до появления image_card.
+            post.image_card = ''
+        if prefetch:
+            thumbnails.prefetch(posts)
+        return ''.join(template.render({'post': post}) for post in posts)
+
+    def measure(self, prefetch, repeat):
+        self.render_page(prefetch)
+        started = time.perf_counter()
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(repeat):
+                self.render_page(prefetch)
+        elapsed = (time.perf_counter() - started) / repeat
+        return elapsed * 1000, len(queries) / repeat
+
+    def handle(self, *args, **options):
+        for name, prefetch in (('по одному', False), ('prefetch', True)):
+            latency, queries = self.measure(prefetch, options['repeat'])
+            self.stdout.write(
+                f'{name:>10}: {latency:.2f} мс на страницу, '
+                f'{queries:.1f} SQL-запросов')
@@ -0,0 +1,97 @@
+import statistics
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.testing import isolated_cache
+from posts import urls
+from posts.models import AuthorStats, Group, Post
+
+
+def sample_arguments():
+    """Значения параметров адресов: самые нагруженные автор, группа, пост."""
+    author = AuthorStats.objects.select_related('user').order_by(
+        '-followers_count').first()
+    group = Group.objects.annotate(total=Count('posts')).order_by(
+        '-total').first()
+    post = Post.objects.order_by('-comments_count', '-pk').first()
+    reader = AuthorStats.objects.select_related('user').order_by(
+        '-following_count').first()
+    if None in (author, group, post, reader):
+        raise CommandError('В базе нет данных: запустите generate_data.')
+    arguments = {
+        'username': author.user.username,
+        'slug': group.slug,
+        'post_id': post.pk,
+    }
+    # Поиск ищет первое слово самого обсуждаемого поста.
+    params = {'search': {'q': post.text.split()[0]}}
+    return arguments, params, reader.user
+
+
+def percentiles(samples):
+    cuts = statistics.quantiles(samples, n=100, method='inclusive')
+    return cuts[49], cuts[94], cuts[98]
+
+
+class Command(BaseCommand):
+    help = ('Обходит все адреса posts.urls тестовым клиентом и выводит '
+            'p50/p95/p99 времени ответа и число SQL-запросов на запрос. '
+            'Запросы follow/unfollow меняют подписки вошедшего '
+            'пользователя.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50)
+        parser.add_argument('--anonymous', action='store_true',
+                            help='Не входить на сайт.')
+        parser.add_argument('--cold', action='store_true',
+                            help='Очищать кэш перед каждым запросом '
+                                 '(временный, не кэш сервера).')
+
+    def measure(self, client, url, params, count, cold):
+        timings, queries, status = [], [], None
+        client.get(url, params)
+        for _ in range(count):
+            if cold:
+                cache.clear()
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                response = client.get(url, params)
+                timings.append((time.perf_counter() - started) * 1000)
+            queries.append(len(context))
+            status = response.status_code
+            reset_queries()
+        return status, timings, queries
+
+    def handle(self, *args, **options):
+        if options['cold']:
+            with isolated_cache():
+                return self.report(options)
+        return self.report(options)
+
+    def report(self, options):
+        arguments, params, reader = sample_arguments()
+        client = Client()
+        if not options['anonymous']:
+            client.force_login(reader)
+        self.stdout.write(
+            f'{"адрес":<18}{"код":>5}{"p50, мс":>9}{"p95, мс":>9}'
+            f'{"p99, мс":>9}{"SQL ср.":>9}{"SQL макс.":>10}')
+        for pattern in urls.urlpatterns:
+            kwargs = {name: arguments[name]
+                      for name in pattern.pattern.converters}
+            url = reverse(f'posts:{pattern.name}', kwargs=kwargs)
+            status, timings, queries = self.measure(
+                client, url, params.get(pattern.name),
+                max(options['requests'], 2), options['cold'])
+            p50, p95, p99 = percentiles(timings)
+            self.stdout.write(
+                f'{pattern.name:<18}{status:>5}{p50:>9.1f}{p95:>9.1f}'
+                f'{p99:>9.1f}{statistics.mean(queries):>9.1f}'
+                f'{max(queries):>10}')
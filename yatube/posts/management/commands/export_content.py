@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = ('Выгружает посты, комментарии или подписки в JSONL или CSV '
+            'потоком, не загружая таблицу в память.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(transfer.FIELDS))
+        parser.add_argument('output', nargs='?', default='-',
+                            help='Файл выгрузки; по умолчанию stdout.')
+        parser.add_argument('--format', choices=transfer.FORMATS)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        kind, output = options['kind'], options['output']
+        fmt = options['format'] or transfer.guess_format(output)
+        records = transfer.export_records(kind, options['batch_size'])
+        started = time.perf_counter()
+        if output == '-':
+            transfer.write_records(
+                records, self.stdout, fmt, transfer.FIELDS[kind])
+            return
+        with open(output, 'w', encoding='utf-8', newline='') as stream:
+            written = transfer.write_records(
+                records, stream, fmt, transfer.FIELDS[kind])
+        elapsed = time.perf_counter() - started
+        self.stderr.write(
+            f'Выгружено записей: {written} за {elapsed:.1f} с '
+            f'({written / max(elapsed, 1e-9):.0f} зап/с)')
@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+from posts.synthetic import Generator
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу синтетическими пользователями, группами, '
+            'постами, комментариями и подписками со степенным '
+            'распределением популярности. Запускать на отдельной базе.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--groups', type=int, default=200)
+        parser.add_argument('--posts', type=int, default=100000)
+        parser.add_argument('--comments', type=int, default=50000)
+        parser.add_argument('--follows', type=int, default=100000)
+        parser.add_argument('--images', type=int, default=20,
+                            help='Сколько разных картинок создать.')
+        parser.add_argument('--image-share', type=float, default=0.1,
+                            help='Доля постов с картинкой.')
+        parser.add_argument('--prefix', default='synth')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def step(self, name, action, *args, **kwargs):
+        started = time.perf_counter()
+        result = action(*args, **kwargs)
+        self.stdout.write(
+            f'{name}: {time.perf_counter() - started:.1f} с')
+        return result
+
+    def handle(self, *args, **options):
+        generator = Generator(options['prefix'], options['seed'],
+                              options['batch_size'])
+        users = self.step('Пользователи', generator.users, options['users'])
+        groups = self.step('Группы', generator.groups, options['groups'])
+        images = self.step('Картинки', generator.images, options['images'])
+        self.step('Посты', generator.posts, options['posts'], users, groups,
+                  images, options['image_share'])
+        self.step('Комментарии', generator.comments, options['comments'],
+                  users)
+        self.step('Подписки', generator.follows, options['follows'], users)
+        self.step('Счётчики, поиск и ленты', transfer.finish_import)
+        self.stdout.write(self.style.SUCCESS('Данные созданы'))
@@ -0,0 +1,75 @@
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = ('Загружает посты, комментарии или подписки из JSONL или CSV '
+            'пачками через bulk_create. После сбоя повторный запуск '
+            'продолжает с последней сохранённой пачки.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(transfer.FIELDS))
+        parser.add_argument('input')
+        parser.add_argument('--format', choices=transfer.FORMATS)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--create-users', action='store_true',
+            help='Создавать отсутствующих пользователей без пароля.')
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Начать с начала файла, не читая сохранённый прогресс.')
+
+    def read_checkpoint(self, path, kind):
+        try:
+            with open(path) as stream:
+                checkpoint = json.load(stream)
+        except FileNotFoundError:
+            return 0
+        if checkpoint.get('kind') != kind:
+            raise CommandError(
+                f'{path} сохранён для {checkpoint.get("kind")}; '
+                'запустите с --restart.')
+        return checkpoint['done']
+
+    def write_checkpoint(self, path, kind, done):
+        # Запись через временный файл: прогресс не теряется при сбое.
+        with open(path + '.tmp', 'w') as stream:
+            json.dump({'kind': kind, 'done': done}, stream)
+        os.replace(path + '.tmp', path)
+
+    def handle(self, *args, **options):
+        kind, path = options['kind'], options['input']
+        fmt = options['format'] or transfer.guess_format(path)
+        checkpoint = path + '.progress'
+        skip = 0 if options['restart'] else self.read_checkpoint(
+            checkpoint, kind)
+        if skip:
+            self.stdout.write(f'Продолжение с записи {skip}')
+        started = time.perf_counter()
+
+        def on_batch(done, stats):
+            self.write_checkpoint(checkpoint, kind, done)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'{done} записей, пропущено {stats["skipped"]}, '
+                f'{(done - skip) / max(elapsed, 1e-9):.0f} зап/с')
+
+        with open(path, encoding='utf-8', newline='') as stream:
+            done, stats = transfer.import_records(
+                kind, transfer.read_records(stream, fmt),
+                batch_size=options['batch_size'], skip=skip,
+                create_users=options['create_users'], on_batch=on_batch)
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        if stats['remapped']:
+            self.stderr.write(
+                f'id занят другой записью, загружено с новым id: '
+                f'{stats["remapped"]}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено: {stats["loaded"]}, уже были: {stats["existing"]}, '
+            f'пропущено: {stats["skipped"]} (нет автора, группы или поста)'))
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from posts import images
+
+
+class Command(BaseCommand):
+    help = ('Воркер очереди картинок: проверяет, перекодирует загрузки '
+            'и строит миниатюры.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Разобрать очередь и выйти.')
+        parser.add_argument(
+            '--interval', type=float, default=2.0,
+            help='Пауза между опросами пустой очереди, секунд.')
+
+    def handle(self, *args, **options):
+        done = 0
+        while True:
+            job = images.claim()
+            if job is None:
+                if options['once']:
+                    break
+                # Долгоживущий процесс: не держать оборванное соединение.
+                close_old_connections()
+                time.sleep(options['interval'])
+                continue
+            if images.run(job):
+                done += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано картинок: {done}'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import feed
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает материализованные ленты подписок с нуля.'
+
+    def handle(self, *args, **options):
+        if not feed.is_materialized():
+            raise CommandError(
+                'FOLLOW_FEED_MATERIALIZED выключен в настройках.')
+        created = feed.rebuild_timelines()
+        self.stdout.write(self.style.SUCCESS(
+            f'Лента пересобрана, записей: {created}'))
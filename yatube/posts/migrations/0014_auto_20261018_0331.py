@@ -0,0 +1,23 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_auto_20261018_0326'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='image_card',
+            field=models.CharField(blank=True, editable=False, max_length=255, verbose_name='Миниатюра для ленты'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_detail',
+            field=models.CharField(blank=True, editable=False, max_length=255, verbose_name='Миниатюра для страницы поста'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+from django.db import migrations
+
+TOKENIZE = "tokenize='unicode61 remove_diacritics 2'"
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        f'CREATE VIRTUAL TABLE posts_post_fts USING fts5(text, {TOKENIZE})')
+    schema_editor.execute(
+        'CREATE VIRTUAL TABLE posts_comment_fts USING fts5('
+        f'text, post_id UNINDEXED, {TOKENIZE})')
+    schema_editor.execute(
+        'INSERT INTO posts_post_fts (rowid, text)'
+        ' SELECT id, text FROM posts_post')
+    schema_editor.execute(
+        'INSERT INTO posts_comment_fts (rowid, text, post_id)'
+        ' SELECT id, text, post_id FROM posts_comment')
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS posts_post_fts')
+    schema_editor.execute('DROP TABLE IF EXISTS posts_comment_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_auto_20261018_0337'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 2.2.16 on 2026-10-18 04:20
+
+from django.db import migrations, models
+import posts.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_image_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='version',
+            field=models.BigIntegerField(default=posts.models.initial_version, editable=False, verbose_name='Версия карточки'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+from django.db import migrations
+
+TOKENIZE = "tokenize='unicode61 remove_diacritics 2'"
+
+
+def recreate_search_index(options):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        schema_editor.execute('DROP TABLE IF EXISTS posts_post_fts')
+        schema_editor.execute('DROP TABLE IF EXISTS posts_comment_fts')
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE posts_post_fts USING fts5(text, {options})')
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE posts_comment_fts USING fts5('
+            f'text, post_id UNINDEXED, {options})')
+        schema_editor.execute(
+            'INSERT INTO posts_post_fts (rowid, text)'
+            ' SELECT id, text FROM posts_post')
+        schema_editor.execute(
+            'INSERT INTO posts_comment_fts (rowid, text, post_id)'
+            ' SELECT id, text, post_id FROM posts_comment')
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0020_feed_item_order'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            recreate_search_index(f"prefix='2 3', {TOKENIZE}"),
+            recreate_search_index(TOKENIZE),
+        ),
+    ]
@@ -1,3 +1,5 @@
+import time
+
 from django.contrib.auth import get_user_model
 from django.db import models
 from django.db.models import UniqueConstraint
@@ -7,6 +9,12 @@ from core.models import CreatedModel
 User = get_user_model()
 
 
+def initial_version():
+    # От времени, а не с единицы: id удалённого поста может достаться
+    # новому, и его карточка не совпадёт со старой в кэше.
+    return int(time.time() * 1000)
+
+
 class Group(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
@@ -18,6 +26,15 @@ class Group(models.Model):
 
 
 class Post(models.Model):
+    IMAGE_READY = 'ready'
+    IMAGE_PENDING = 'pending'
+    IMAGE_FAILED = 'failed'
+    IMAGE_STATUSES = (
+        (IMAGE_READY, 'Готова'),
+        (IMAGE_PENDING, 'Обрабатывается'),
+        (IMAGE_FAILED, 'Не удалось обработать'),
+    )
+
     text = models.TextField(
         'Текст поста',
         help_text='Введите текст поста'
@@ -47,12 +64,51 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    image_status = models.CharField(
+        'Обработка картинки',
+        max_length=10,
+        choices=IMAGE_STATUSES,
+        default=IMAGE_READY,
+        editable=False
+    )
+    image_card = models.CharField(
+        'Миниатюра для ленты',
+        max_length=255,
+        blank=True,
+        editable=False
+    )
+    image_detail = models.CharField(
+        'Миниатюра для страницы поста',
+        max_length=255,
+        blank=True,
+        editable=False
+    )
+    comments_count = models.PositiveIntegerField(
+        'Число комментариев',
+        default=0,
+        editable=False
+    )
+    version = models.BigIntegerField(
+        'Версия карточки',
+        default=initial_version,
+        editable=False
+    )
 
     def __str__(self):
         return self.text[:15]
 
     class Meta:
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(
+                name='post_group_pub_date_idx',
+                fields=['group', '-pub_date', '-id'],
+            ),
+            models.Index(
+                name='post_author_pub_date_idx',
+                fields=['author', '-pub_date', '-id'],
+            ),
+        ]
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
 
@@ -81,10 +137,42 @@ class Comment(CreatedModel):
 
     class Meta:
         ordering = ('-created',)
+        indexes = [
+            models.Index(
+                name='comment_post_created_idx',
+                fields=['post', '-created', '-id'],
+            ),
+        ]
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
 
 
+class ImageJob(CreatedModel):
+    """Задача очереди обработки загруженной картинки поста."""
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='image_jobs',
+        verbose_name='Пост'
+    )
+    image = models.CharField('Файл', max_length=255)
+    attempts = models.PositiveSmallIntegerField('Попытки', default=0)
+    locked_until = models.DateTimeField(
+        'Занята воркером до',
+        null=True,
+        blank=True
+    )
+    error = models.TextField('Последняя ошибка', blank=True)
+
+    def __str__(self):
+        return self.image
+
+    class Meta:
+        ordering = ('created', 'id')
+        verbose_name = 'Обработка картинки'
+        verbose_name_plural = 'Очередь обработки картинок'
+
+
 class Follow(models.Model):
     user = models.ForeignKey(
         User,
@@ -100,9 +188,65 @@ class Follow(models.Model):
     )
 
     class Meta:
-        UniqueConstraint(
-            name='unique_order',
-            fields=['user', 'author'],
-        )
+        constraints = [
+            UniqueConstraint(
+                name='unique_follow',
+                fields=['user', 'author'],
+            ),
+        ]
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
+
+
+class AuthorStats(models.Model):
+    """Денормализованные счётчики пользователя."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь'
+    )
+    posts_count = models.PositiveIntegerField('Число постов', default=0)
+    followers_count = models.PositiveIntegerField(
+        'Число подписчиков', default=0)
+    following_count = models.PositiveIntegerField(
+        'Число подписок', default=0)
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+
+class FeedItem(models.Model):
+    """Запись материализованной ленты подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Подписчик'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Пост'
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        ordering = ('-pub_date',)
+        constraints = [
+            UniqueConstraint(
+                name='unique_feed_item',
+                fields=['user', 'post'],
+            ),
+        ]
+        indexes = [
+            models.Index(
+                name='feed_user_pub_date_idx',
+                fields=['user', '-pub_date', '-post'],
+            ),
+        ]
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
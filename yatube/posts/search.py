@@ -0,0 +1,195 @@
+import re
+
+from django.conf import settings as my_set
+from django.db import connection, transaction
+from django.db.models import Q
+
+from .models import Comment, Post
+
+POST_TABLE = 'posts_post_fts'
+COMMENT_TABLE = 'posts_comment_fts'
+
+# Префиксы из 2 и 3 букв хранятся в индексе: без этого "аб"* каждый раз
+# сливает списки всех слов на «аб», и проверка одного поста стоит сотни мс.
+OPTIONS = "prefix='2 3', tokenize='unicode61 remove_diacritics 2'"
+
+SCHEMA = (
+    f'CREATE VIRTUAL TABLE IF NOT EXISTS {POST_TABLE} USING fts5('
+    f' text, {OPTIONS})',
+    f'CREATE VIRTUAL TABLE IF NOT EXISTS {COMMENT_TABLE} USING fts5('
+    f' text, post_id UNINDEXED, {OPTIONS})',
+)
+
+WORD_RE = re.compile(r'\w+')
+
+
+def is_supported(using=connection):
+    return using.vendor == 'sqlite'
+
+
+def create_tables(using=connection):
+    with using.cursor() as cursor:
+        for statement in SCHEMA:
+            cursor.execute(statement)
+
+
+def match_expression(query):
+    """Строка поиска -> выражение MATCH: все слова, последнее как префикс.
+
+    Слова берутся в кавычки, поэтому операторы FTS5 из ввода
+    пользователя не разбираются. Одна буква префиксом не считается:
+    под неё подходит почти весь словарь.
+    """
+    words = WORD_RE.findall(query.lower())
+    if not words:
+        return ''
+    terms = [f'"{word}"' for word in words]
+    if len(words[-1]) > 1:
+        terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def index_post(post):
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {POST_TABLE} WHERE rowid = %s',
+                       [post.pk])
+        cursor.execute(
+            f'INSERT INTO {POST_TABLE} (rowid, text) VALUES (%s, %s)',
+            [post.pk, post.text])
+
+
+def index_comment(comment):
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {COMMENT_TABLE} WHERE rowid = %s',
+                       [comment.pk])
+        cursor.execute(
+            f'INSERT INTO {COMMENT_TABLE} (rowid, text, post_id)'
+            ' VALUES (%s, %s, %s)',
+            [comment.pk, comment.text, comment.post_id])
+
+
+def index_posts(ids):
+    """Индексирует посты ids, загруженные в обход сигналов."""
+    _index_rows(POST_TABLE, 'text', Post, ids)
+
+
+def index_comments(ids):
+    """Индексирует комментарии ids, загруженные в обход сигналов."""
+    _index_rows(COMMENT_TABLE, 'text, post_id', Comment, ids)
+
+
+def _index_rows(table, columns, model, ids):
+    ids = list(ids)
+    if not ids:
+        return
+    placeholders = ', '.join(['%s'] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {table} WHERE rowid IN ({placeholders})', ids)
+        cursor.execute(
+            f'INSERT INTO {table} (rowid, {columns})'
+            f' SELECT id, {columns} FROM {model._meta.db_table}'
+            f' WHERE id IN ({placeholders})', ids)
+
+
+def unindex(table, pk):
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table} WHERE rowid = %s', [pk])
+
+
+def rebuild():
+    """Заново строит индекс по всем постам и комментариям."""
+    create_tables()
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {POST_TABLE}')
+        cursor.execute(f'DELETE FROM {COMMENT_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {POST_TABLE} (rowid, text)'
+            f' SELECT id, text FROM {Post._meta.db_table}')
+        cursor.execute(
+            f'INSERT INTO {COMMENT_TABLE} (rowid, text, post_id)'
+            f' SELECT id, text, post_id FROM {Comment._meta.db_table}')
+        cursor.execute(f"INSERT INTO {POST_TABLE} ({POST_TABLE})"
+                       " VALUES ('optimize')")
+        cursor.execute(f"INSERT INTO {COMMENT_TABLE} ({COMMENT_TABLE})"
+                       " VALUES ('optimize')")
+
+
+def _matches(tables, expression, limit):
+    """Число совпадений в каждой из tables, но не больше limit."""
+    columns = ', '.join(
+        f'(SELECT COUNT(*) FROM (SELECT 1 FROM {table}'
+        f' WHERE {table} MATCH %s LIMIT %s))' for table in tables)
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT {columns}', [expression, limit] * len(tables))
+        return cursor.fetchone()
+
+
+def _restrict(queryset, table, query, with_comments=False):
+    # План выбирается по числу совпадений. Редкие слова: строки берутся
+    # по первичному ключу из найденных id и сортируются, их немного.
+    # Остальные: унарный плюс запрещает ключ, план идёт по индексу даты
+    # и останавливается на первой странице. Частые слова при этом
+    # проверяются в индексе для каждой строки (EXISTS), а не собираются
+    # целиком в список — для них это сотни тысяч id.
+    # Подзапросы подключаются через extra(): RawSQL в pk__in Django 2.2
+    # оборачивает во вторые скобки, и SQLite читает его как скалярный
+    # подзапрос, то есть берёт только первую найденную строку.
+    qn = connection.ops.quote_name
+    opts = queryset.model._meta
+    pk = f'{qn(opts.db_table)}.{qn(opts.pk.column)}'
+    expression = match_expression(query)
+    sides = [(
+        table,
+        f'SELECT rowid FROM {table} WHERE {table} MATCH %s',
+        f'EXISTS (SELECT 1 FROM {table}'
+        f' WHERE {table} MATCH %s AND rowid = {pk})',
+    )]
+    if with_comments:
+        comments = qn(Comment._meta.db_table)
+        sides.append((
+            COMMENT_TABLE,
+            f'SELECT post_id FROM {COMMENT_TABLE}'
+            f' WHERE {COMMENT_TABLE} MATCH %s',
+            f'EXISTS (SELECT 1 FROM {comments}, {COMMENT_TABLE}'
+            f' WHERE {comments}.post_id = {pk}'
+            f' AND {COMMENT_TABLE} MATCH %s'
+            f' AND {COMMENT_TABLE}.rowid = {comments}.id)',
+        ))
+    found = _matches([side[0] for side in sides], expression,
+                     my_set.SEARCH_DENSE_MATCHES)
+    if max(found) < my_set.SEARCH_SPARSE_MATCHES:
+        conditions = [f'{pk} IN ({ids})' for _, ids, _ in sides]
+    else:
+        conditions = [
+            probe if count >= my_set.SEARCH_DENSE_MATCHES
+            else f'+{pk} IN ({ids})'
+            for (_, ids, probe), count in zip(sides, found)
+        ]
+    return queryset.extra(
+        where=[' OR '.join(conditions)],
+        params=[expression] * len(conditions))
+
+
+def filter_posts(post_list, query, with_comments=True):
+    """Оставляет в post_list посты, найденные по query.
+
+    Порядок не меняется: выдача листается тем же пагинатором, что и лента.
+    На других СУБД поиск сводится к icontains.
+    """
+    if not match_expression(query):
+        return post_list.none()
+    if not is_supported():
+        condition = Q(text__icontains=query)
+        if with_comments:
+            condition |= Q(comments__text__icontains=query)
+        return post_list.filter(condition).distinct()
+    return _restrict(post_list, POST_TABLE, query, with_comments)
+
+
+def filter_comments(comment_list, query):
+    if not match_expression(query):
+        return comment_list.none()
+    if not is_supported():
+        return comment_list.filter(text__icontains=query)
+    return _restrict(comment_list, COMMENT_TABLE, query)
@@ -0,0 +1,174 @@
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+
+from . import cards, counters, counts, feed, search
+from .cache import bump_generation
+from .models import AuthorStats, Comment, Follow, Group, Post, User
+
+
+def invalidate_pages(sender, **kwargs):
+    bump_generation()
+
+
+for model in (Post, Group, Comment, Follow):
+    post_save.connect(invalidate_pages, sender=model,
+                      dispatch_uid=f'invalidate_pages_{model.__name__}')
+    post_delete.connect(invalidate_pages, sender=model,
+                        dispatch_uid=f'invalidate_pages_{model.__name__}')
+
+
+def create_stats(sender, instance, created, **kwargs):
+    if created:
+        AuthorStats.objects.get_or_create(user=instance)
+
+
+def _delta(signal, created):
+    if signal is post_delete:
+        return -1
+    return 1 if created else 0
+
+
+def count_post(sender, instance, signal, created=False, **kwargs):
+    delta = _delta(signal, created)
+    if delta:
+        counters.change_user(instance.author_id, 'posts_count', delta)
+
+
+def count_comment(sender, instance, signal, created=False, **kwargs):
+    delta = _delta(signal, created)
+    if delta:
+        counters.change_post(instance.post_id, delta)
+
+
+def count_follow(sender, instance, signal, created=False, **kwargs):
+    delta = _delta(signal, created)
+    if delta:
+        counters.change_user(instance.author_id, 'followers_count', delta)
+        counters.change_user(instance.user_id, 'following_count', delta)
+
+
+def count_feed_post(sender, instance, signal, created=False, **kwargs):
+    delta = _delta(signal, created)
+    if delta:
+        counts.post_added(instance, delta)
+
+
+def forget_group_counts(sender, instance, update_fields=None, **kwargs):
+    if instance.pk is None:
+        return
+    if update_fields is not None and 'group' not in update_fields:
+        return
+    old = Post.objects.filter(pk=instance.pk).values_list(
+        'group_id', flat=True).first()
+    if old != instance.group_id:
+        counts.forget(f'group.{old}', f'group.{instance.group_id}')
+
+
+def forget_follower_count(sender, instance, **kwargs):
+    counts.forget(f'follower.{instance.user_id}')
+
+
+post_save.connect(count_feed_post, sender=Post,
+                  dispatch_uid='feed_count_post')
+post_delete.connect(count_feed_post, sender=Post,
+                    dispatch_uid='feed_count_post')
+pre_save.connect(forget_group_counts, sender=Post,
+                 dispatch_uid='feed_count_group')
+post_save.connect(forget_follower_count, sender=Follow,
+                  dispatch_uid='feed_count_follower')
+post_delete.connect(forget_follower_count, sender=Follow,
+                    dispatch_uid='feed_count_follower')
+post_save.connect(create_stats, sender=User, dispatch_uid='create_stats')
+for model, handler in ((Post, count_post), (Comment, count_comment),
+                       (Follow, count_follow)):
+    post_save.connect(handler, sender=model,
+                      dispatch_uid=f'count_{model.__name__}')
+    post_delete.connect(handler, sender=model,
+                        dispatch_uid=f'count_{model.__name__}')
+
+
+def fan_out_post(sender, instance, created, **kwargs):
+    # Пост из любого места (форма, админка, shell) попадает в ленты.
+    if created:
+        feed.fan_out_post(instance)
+
+
+def refill_former_celebrity(sender, instance, **kwargs):
+    # Подключено после count_follow: followers_count уже уменьшен.
+    feed.refill_former_celebrity(instance.author_id)
+
+
+post_save.connect(fan_out_post, sender=Post, dispatch_uid='feed_fan_out')
+post_delete.connect(refill_former_celebrity, sender=Follow,
+                    dispatch_uid='feed_refill_celebrity')
+
+
+def index_post(sender, instance, signal, **kwargs):
+    if not search.is_supported():
+        return
+    if signal is post_delete:
+        search.unindex(search.POST_TABLE, instance.pk)
+    else:
+        search.index_post(instance)
+
+
+def index_comment(sender, instance, signal, **kwargs):
+    if not search.is_supported():
+        return
+    if signal is post_delete:
+        search.unindex(search.COMMENT_TABLE, instance.pk)
+    else:
+        search.index_comment(instance)
+
+
+for model, handler in ((Post, index_post), (Comment, index_comment)):
+    post_save.connect(handler, sender=model,
+                      dispatch_uid=f'search_{model.__name__}')
+    post_delete.connect(handler, sender=model,
+                        dispatch_uid=f'search_{model.__name__}')
+
+
+# Поля автора, которые выводит карточка поста.
+CARD_AUTHOR_FIELDS = ('username', 'first_name', 'last_name')
+
+
+def bump_post_version(sender, instance, **kwargs):
+    # Версия растёт в базе, как у остальных сдвигов через F('version'):
+    # экземпляр, загруженный до них, иначе записал бы уже занятую версию.
+    if not instance._state.adding:
+        instance.version = F('version') + 1
+
+
+def refresh_post_version(sender, instance, created, **kwargs):
+    if not created:
+        instance.version = Post.objects.values_list(
+            'version', flat=True).get(pk=instance.pk)
+
+
+def bump_author_cards(sender, instance, update_fields=None, **kwargs):
+    if instance.pk is None:
+        return
+    # Вход пользователя сохраняет только last_login.
+    if update_fields is not None and not set(update_fields) & set(
+            CARD_AUTHOR_FIELDS):
+        return
+    old = User.objects.filter(pk=instance.pk).values_list(
+        *CARD_AUTHOR_FIELDS).first()
+    new = tuple(getattr(instance, field) for field in CARD_AUTHOR_FIELDS)
+    if old is not None and old != new:
+        cards.bump(author_id=instance.pk)
+
+
+def bump_group_cards(sender, instance, created, **kwargs):
+    if not created:
+        cards.bump(group_id=instance.pk)
+
+
+pre_save.connect(bump_post_version, sender=Post,
+                 dispatch_uid='card_version_post')
+post_save.connect(refresh_post_version, sender=Post,
+                  dispatch_uid='card_version_post_refresh')
+pre_save.connect(bump_author_cards, sender=User,
+                 dispatch_uid='card_version_author')
+post_save.connect(bump_group_cards, sender=Group,
+                  dispatch_uid='card_version_group')
@@ -0,0 +1,174 @@
+import io
+import itertools
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import reset_queries, transaction
+from django.utils import timezone
+from PIL import Image
+
+from .models import Comment, Follow, Group, Post, User
+from .transfer import keep_dates
+
+WORDS = 20000
+LETTERS = 'абвгдежзиклмнопрстуфхцчшэюя'
+
+
+def make_word(rank):
+    # Своё псевдослово для каждого ранга частоты.
+    word = ''
+    rank += len(LETTERS)
+    while rank:
+        rank, rest = divmod(rank, len(LETTERS))
+        word += LETTERS[rest]
+    return word
+
+
+def zipf_weights(count, exponent=1.0):
+    """Накопленные веса для random.choices: k-й элемент встречается
+    в k**exponent раз реже первого."""
+    return list(itertools.accumulate(
+        1 / rank ** exponent for rank in range(1, count + 1)))
+
+
+class Generator:
+    """Заполняет базу данными с перекосом, как у живого сервиса.
+
+    Число постов и подписчиков у авторов и постов в группах распределено
+    по степенному закону: немного популярных, длинный хвост остальных.
+    Все вставки идут через bulk_create, сигналы не вызываются.
+    """
+
+    def __init__(self, prefix='synth', seed=0, batch_size=5000, days=365):
+        self.prefix = prefix
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.now = timezone.now()
+        self.days = days
+        self.words = [make_word(rank) for rank in range(WORDS)]
+        self.word_weights = zipf_weights(WORDS)
+
+    def text(self, low=5, high=60):
+        return ' '.join(self.rng.choices(
+            self.words, cum_weights=self.word_weights,
+            k=self.rng.randint(low, high)))
+
+    def date(self):
+        return self.now - timedelta(
+            seconds=self.rng.uniform(0, self.days * 24 * 3600))
+
+    def _batches(self, count, make):
+        for offset in range(0, count, self.batch_size):
+            yield [make() for _ in range(min(self.batch_size,
+                                             count - offset))]
+
+    def _insert(self, model, objects):
+        with transaction.atomic():
+            model.objects.bulk_create(objects, ignore_conflicts=True)
+        reset_queries()
+
+    def users(self, count):
+        password = make_password(None)
+        start = User.objects.filter(
+            username__startswith=f'{self.prefix}_user_').count()
+        names = (f'{self.prefix}_user_{number}'
+                 for number in itertools.count(start))
+        for batch in self._batches(count, lambda: User(
+                username=next(names), password=password)):
+            self._insert(User, batch)
+        return list(User.objects.filter(
+            username__startswith=f'{self.prefix}_user_',
+        ).order_by('pk').values_list('pk', flat=True))
+
+    def groups(self, count):
+        Group.objects.bulk_create([
+            Group(title=f'Группа {number}', slug=f'{self.prefix}-{number}',
+                  description=self.text())
+            for number in range(count)
+        ], ignore_conflicts=True)
+        return list(Group.objects.filter(
+            slug__startswith=f'{self.prefix}-',
+        ).order_by('pk').values_list('pk', flat=True))
+
+    def images(self, count):
+        names = []
+        for number in range(count):
+            name = f'posts/{self.prefix}_{number}.jpg'
+            if not default_storage.exists(name):
+                buffer = io.BytesIO()
+                color = tuple(self.rng.randrange(256) for _ in range(3))
+                Image.new('RGB', (1280, 720), color).save(buffer, 'JPEG')
+                name = default_storage.save(
+                    name, ContentFile(buffer.getvalue()))
+            names.append(name)
+        return names
+
+    def posts(self, count, authors, groups, images, image_share=0.1,
+              group_share=0.7):
+        author_weights = zipf_weights(len(authors))
+        group_weights = zipf_weights(len(groups)) if groups else None
+
+        def make():
+            group_id = None
+            if groups and self.rng.random() < group_share:
+                group_id = self.rng.choices(
+                    groups, cum_weights=group_weights)[0]
+            image = ''
+            if images and self.rng.random() < image_share:
+                image = self.rng.choice(images)
+            return Post(
+                author_id=self.rng.choices(
+                    authors, cum_weights=author_weights)[0],
+                group_id=group_id,
+                text=self.text(),
+                pub_date=self.date(),
+                image=image,
+            )
+
+        with keep_dates(Post):
+            for batch in self._batches(count, make):
+                self._insert(Post, batch)
+
+    def comments(self, count, authors):
+        # Комментарии собираются под свежими постами, как в живой ленте.
+        posts = list(Post.objects.order_by('-pub_date').values_list(
+            'pk', flat=True)[:max(count // 5, 1)])
+        if not posts:
+            return
+        post_weights = zipf_weights(len(posts))
+
+        def make():
+            return Comment(
+                author_id=self.rng.choice(authors),
+                post_id=self.rng.choices(
+                    posts, cum_weights=post_weights)[0],
+                text=self.text(1, 20),
+                created=self.date(),
+            )
+
+        with keep_dates(Comment):
+            for batch in self._batches(count, make):
+                self._insert(Comment, batch)
+
+    def follows(self, count, users):
+        """Подписки: подписчик выбирается равномерно, автор по Ципфу.
+
+        Повторные пары и подписки на себя отбрасываются, поэтому
+        подписок может получиться чуть меньше count.
+        """
+        weights = zipf_weights(len(users))
+
+        def make():
+            return Follow(
+                user_id=self.rng.choice(users),
+                author_id=self.rng.choices(users, cum_weights=weights)[0],
+            )
+
+        for batch in self._batches(count, make):
+            self._insert(Follow, [
+                follow for follow in batch
+                if follow.user_id != follow.author_id
+            ])
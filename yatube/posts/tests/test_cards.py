@@ -0,0 +1,66 @@
+from django.core.cache import cache
+from django.test import TestCase, Client
+from django.urls import reverse
+from .. import cards
+from ..models import Group, Post, User
+
+
+class PostCardCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='card_author')
+        cls.group = Group.objects.create(
+            title='Группа', slug='cards', description='Описание')
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            author=self.author, group=self.group, text='Текст карточки')
+
+    def version(self):
+        return Post.objects.get(pk=self.post.pk).version
+
+    def test_page_renders_cached_card(self):
+        """Страница берёт карточку из кэша, не рисуя её заново."""
+        cards.prefetch([self.post])
+        key = cards.card_key(self.post)
+        self.assertIn('Текст карточки', cache.get(key))
+        cache.set(key, '<p>карточка из кэша</p>')
+        response = Client().get(reverse('posts:index'))
+        self.assertContains(response, '<p>карточка из кэша</p>', html=True)
+        self.assertNotContains(response, 'Текст карточки')
+
+    def test_edit_renders_new_card(self):
+        Client().get(reverse('posts:index'))
+        self.post.text = 'Новый текст'
+        self.post.save()
+        response = Client().get(reverse('posts:index'))
+        self.assertContains(response, 'Новый текст')
+
+    def test_version_bumps(self):
+        """Версия растёт при правке поста, автора и группы."""
+        version = self.version()
+        self.post.save()
+        self.assertEqual(self.version(), version + 1)
+        author = User.objects.get(pk=self.author.pk)
+        author.last_login = self.post.pub_date
+        author.save(update_fields=['last_login'])
+        self.assertEqual(self.version(), version + 1)
+        author.first_name = 'Лев'
+        author.save()
+        self.assertEqual(self.version(), version + 2)
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'Другая группа'
+        group.save()
+        self.assertEqual(self.version(), version + 3)
+
+    def test_stale_instance_gets_new_version(self):
+        """Сохранение устаревшего экземпляра не повторяет версию."""
+        stale = Post.objects.get(pk=self.post.pk)
+        cards.bump(author_id=self.author.pk)
+        bumped = self.version()
+        stale.text = 'Правка'
+        stale.save()
+        self.assertEqual(self.version(), bumped + 1)
+        self.assertEqual(stale.version, bumped + 1)
@@ -0,0 +1,62 @@
+from io import StringIO
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from ..models import AuthorStats, Comment, Follow, Post, User
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_user')
+        cls.author = User.objects.create_user(username='test_author')
+
+    def stats(self, user):
+        return AuthorStats.objects.get(user=user)
+
+    def test_post_and_comment_counters(self):
+        post = Post.objects.create(author=self.author, text='Пост')
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        comment = Comment.objects.create(
+            author=self.user, post=post, text='Коммент')
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        post.delete()
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+
+    def test_follow_counters(self):
+        follow = Follow.objects.create(user=self.user, author=self.author)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.user).following_count, 1)
+        follow.delete()
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.user).following_count, 0)
+
+    def test_reconcile_fixes_drift(self):
+        Post.objects.bulk_create(
+            [Post(author=self.author, text='Без сигналов') for _ in range(3)])
+        AuthorStats.objects.filter(user=self.user).delete()
+        call_command('reconcile_counters', stdout=StringIO())
+        self.assertEqual(self.stats(self.author).posts_count, 3)
+        self.assertEqual(self.stats(self.user).posts_count, 0)
+
+    def test_pages_run_no_aggregate_queries(self):
+        post = Post.objects.create(author=self.author, text='Пост')
+        client = Client()
+        pages = [
+            reverse('posts:profile', kwargs={'username': 'test_author'}),
+            reverse('posts:post_detail', kwargs={'post_id': post.id}),
+        ]
+        for address in pages:
+            with self.subTest(address=address):
+                with CaptureQueriesContext(connection) as queries:
+                    response = client.get(address)
+                self.assertContains(response, 'Пост')
+                for query in queries:
+                    self.assertNotIn('COUNT(', query['sql'])
@@ -0,0 +1,158 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from .. import counters, counts, feed
+from ..models import AuthorStats, Follow, Group, Post, User
+
+
+class CountsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='count_author')
+        cls.reader = User.objects.create_user(username='count_reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='count_group', description='Описание')
+        cls.other_group = Group.objects.create(
+            title='Другая', slug='count_other', description='Описание')
+        Post.objects.bulk_create(
+            Post(author=cls.author, text=f'Пост {number}', group=cls.group)
+            for number in range(20))
+        counters.recount_user(cls.author.pk)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_counts_are_cached(self):
+        """Повторный подсчёт не ходит в базу."""
+        providers = (
+            counts.total,
+            lambda: counts.for_group(self.group),
+            lambda: counts.for_author(self.author),
+        )
+        for provider in providers:
+            with self.subTest(provider=provider):
+                self.assertEqual(provider(), 20)
+                with CaptureQueriesContext(connection) as queries:
+                    self.assertEqual(provider(), 20)
+                self.assertEqual(len(queries), 0)
+
+    def test_counts_follow_new_and_deleted_posts(self):
+        counts.total()
+        counts.for_group(self.group)
+        counts.for_author(self.author)
+        post = Post.objects.create(
+            author=self.author, text='Новый', group=self.group)
+        self.assertEqual(counts.total(), 21)
+        self.assertEqual(counts.for_group(self.group), 21)
+        self.assertEqual(counts.for_author(self.author), 21)
+        post.delete()
+        self.assertEqual(counts.total(), 20)
+        self.assertEqual(counts.for_group(self.group), 20)
+
+    def test_group_change_resets_both_groups(self):
+        counts.for_group(self.group)
+        counts.for_group(self.other_group)
+        post = Post.objects.filter(group=self.group).first()
+        post.group = self.other_group
+        post.save()
+        self.assertEqual(counts.for_group(self.group), 19)
+        self.assertEqual(counts.for_group(self.other_group), 1)
+
+    def test_follower_count(self):
+        self.assertEqual(counts.for_follower(self.reader), 0)
+        Follow.objects.create(user=self.reader, author=self.author)
+        Post.objects.create(author=self.author, text='Для подписчиков')
+        self.assertEqual(counts.for_follower(self.reader), 21)
+
+    @override_settings(FOLLOW_FEED_MATERIALIZED=True)
+    def test_materialized_follower_count_reset_on_follow(self):
+        self.assertEqual(counts.for_follower(self.reader), 0)
+        Follow.objects.create(user=self.reader, author=self.author)
+        feed.backfill(self.reader, self.author)
+        self.assertEqual(counts.for_follower(self.reader), 20)
+
+    @override_settings(POST_COUNT_EXACT_LIMIT=5, POST_COUNT_SAMPLE=10)
+    def test_large_sets_are_estimated(self):
+        """Больше POST_COUNT_EXACT_LIMIT — оценка по последним id."""
+        Post.objects.bulk_create(
+            Post(author=self.reader, text=f'Чужой {number}')
+            for number in range(20))
+        self.assertEqual(counts.total(), 40)
+        # Последние 10 id — посты reader: его доля переносится на все id,
+        # а для автора остаётся нижняя граница POST_COUNT_EXACT_LIMIT + 1.
+        self.assertEqual(counts.for_author(self.reader), 40)
+        self.assertEqual(counts.for_author(self.author), 6)
+        self.assertEqual(counts.for_group(self.other_group), 0)
+
+    @override_settings(POST_COUNT_EXACT_LIMIT=5, POST_COUNT_SAMPLE=10,
+                       POSTS_PAGINATION='offset')
+    def test_estimate_does_not_hide_old_pages(self):
+        """Старые посты автора доступны, хотя оценка их почти не видит."""
+        Post.objects.bulk_create(
+            Post(author=self.reader, text=f'Свежий {number}')
+            for number in range(20))
+        self.assertEqual(counts.for_author(self.author), 6)
+        address = reverse('posts:profile', kwargs={'username': 'count_author'})
+        response = self.client.get(address)
+        self.assertEqual(len(response.context['page_obj']), 10)
+        self.assertTrue(response.context['page_obj'].has_next())
+        response = self.client.get(address, {'page': 2})
+        page = response.context['page_obj']
+        self.assertEqual(page.number, 2)
+        self.assertEqual(len(page), 10)
+        self.assertFalse(page.has_next())
+        # За настоящим концом — настоящая последняя страница.
+        response = self.client.get(address, {'page': 3})
+        self.assertEqual(response.context['page_obj'].number, 2)
+        self.assertEqual(counts.for_author(self.author), 20)
+
+    @override_settings(POSTS_PAGINATION='offset')
+    def test_too_high_count_is_corrected(self):
+        """Число в кэше больше настоящего: пустые страницы ведут на
+        последнюю непустую, а число исправляется."""
+        client = Client()
+        client.force_login(self.reader)
+        Follow.objects.create(user=self.reader, author=self.author)
+        AuthorStats.objects.filter(user=self.author).update(posts_count=45)
+        pages = {
+            reverse('posts:index'): counts.total,
+            reverse('posts:profile', kwargs={'username': 'count_author'}):
+                lambda: counts.for_author(self.author),
+            reverse('posts:follow_index'):
+                lambda: counts.for_follower(self.reader),
+        }
+        for address, provider in pages.items():
+            for page in (3, 5):
+                with self.subTest(address=address, page=page):
+                    cache.clear()
+                    cache.set('post_count.all', 45)
+                    cache.set(f'post_count.author.{self.author.pk}', 45)
+                    AuthorStats.objects.filter(
+                        user=self.author).update(posts_count=45)
+                    response = client.get(address, {'page': page})
+                    page_obj = response.context['page_obj']
+                    self.assertEqual(page_obj.number, 2)
+                    self.assertEqual(len(page_obj), 10)
+                    self.assertEqual(page_obj.paginator.num_pages, 2)
+                    self.assertEqual(provider(), 20)
+
+    @override_settings(POSTS_PAGINATION='offset')
+    def test_pages_use_cached_counts(self):
+        client = Client()
+        client.force_login(self.reader)
+        Follow.objects.create(user=self.reader, author=self.author)
+        pages = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'count_group'}),
+            reverse('posts:profile', kwargs={'username': 'count_author'}),
+            reverse('posts:follow_index'),
+        ]
+        for address in pages:
+            with self.subTest(address=address):
+                response = client.get(address, {'page': 2})
+                self.assertEqual(
+                    response.context['page_obj'].paginator.num_pages, 2)
+                self.assertEqual(len(response.context['page_obj']), 10)
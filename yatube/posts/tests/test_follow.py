@@ -1,7 +1,12 @@
-from django.test import TestCase, Client
+from io import StringIO
+from django.core.management import call_command
+from django.db import connection
+from django.conf import settings as my_set
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from http import HTTPStatus
-from ..models import Follow, Post, User
+from .. import feed
+from ..models import AuthorStats, FeedItem, Follow, Post, User
 
 
 class FollowTests(TestCase):
@@ -64,3 +69,133 @@ class FollowTests(TestCase):
         response = self.authorized_client.get(reverse('posts:follow_index'))
         if hasattr(response.context, 'page_obj'):
             self.assertNotIn(self.post1, response.context['page_obj'])
+
+
+@override_settings(FOLLOW_FEED_MATERIALIZED=True)
+class FeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_user')
+        cls.author = User.objects.create_user(username='test_author')
+        cls.post = Post.objects.create(
+            author=cls.author,
+            text='Старый пост',
+        )
+
+    def setUp(self):
+        self.follower_client = Client()
+        self.follower_client.force_login(self.user)
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def feed_posts(self):
+        response = self.follower_client.get(reverse('posts:follow_index'))
+        return list(response.context['page_obj'])
+
+    def test_follow_backfills_and_unfollow_trims(self):
+        self.follower_client.get(reverse(
+            'posts:profile_follow', kwargs={'username': 'test_author'}))
+        self.assertTrue(FeedItem.objects.filter(
+            user=self.user, post=self.post).exists())
+        self.assertIn(self.post, self.feed_posts())
+        self.follower_client.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': 'test_author'}))
+        self.assertFalse(FeedItem.objects.filter(user=self.user).exists())
+        self.assertNotIn(self.post, self.feed_posts())
+
+    def test_concurrent_follow(self):
+        """Подписка, созданная параллельным запросом между проверкой и
+        вставкой, не роняет представление и не заполняет ленту повторно."""
+        inserted = []
+
+        def follow_after_read(execute, sql, params, many, context):
+            result = execute(sql, params, many, context)
+            if (not inserted and sql.startswith('SELECT')
+                    and '"posts_follow"' in sql):
+                inserted.append(True)
+                Follow.objects.bulk_create(
+                    [Follow(user=self.user, author=self.author)])
+            return result
+
+        with connection.execute_wrapper(follow_after_read):
+            response = self.follower_client.get(reverse(
+                'posts:profile_follow', kwargs={'username': 'test_author'}))
+        self.assertTrue(inserted)
+        self.assertRedirects(response, reverse(
+            'posts:profile', kwargs={'username': 'test_author'}))
+        self.assertEqual(
+            Follow.objects.filter(user=self.user, author=self.author).count(),
+            1)
+        self.assertFalse(FeedItem.objects.filter(user=self.user).exists())
+
+    def test_new_post_fans_out(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        self.author_client.post(
+            reverse('posts:post_create'), data={'text': 'Новый пост'})
+        new_post = Post.objects.get(text='Новый пост')
+        self.assertTrue(FeedItem.objects.filter(
+            user=self.user, post=new_post).exists())
+        self.assertIn(new_post, self.feed_posts())
+
+    def test_orm_post_fans_out(self):
+        """Пост, созданный не через форму, тоже попадает в ленту."""
+        Follow.objects.create(user=self.user, author=self.author)
+        new_post = Post.objects.create(author=self.author, text='Из shell')
+        self.assertTrue(FeedItem.objects.filter(
+            user=self.user, post=new_post).exists())
+
+    @override_settings(FOLLOW_FEED_FANOUT_LIMIT=1)
+    def test_former_celebrity_posts_stay_in_feed(self):
+        """Посты, написанные автором-знаменитостью, не пропадают из ленты,
+        когда подписчиков становится меньше порога."""
+        other = User.objects.create_user(username='test_other')
+        Follow.objects.create(user=self.user, author=self.author)
+        Follow.objects.create(user=other, author=self.author)
+        post = Post.objects.create(author=self.author, text='while celebrity')
+        self.assertFalse(FeedItem.objects.filter(post=post).exists())
+        Follow.objects.filter(user=other).delete()
+        self.assertEqual(
+            [item.text for item in feed.timeline_page(self.user, None)],
+            ['while celebrity', 'Старый пост'])
+        self.assertFalse(FeedItem.objects.filter(user=other).exists())
+
+    @override_settings(FOLLOW_FEED_FANOUT_LIMIT=0)
+    def test_celebrity_read_on_demand(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        self.author_client.post(
+            reverse('posts:post_create'), data={'text': 'Новый пост'})
+        self.assertFalse(FeedItem.objects.exists())
+        posts = self.feed_posts()
+        self.assertIn(self.post, posts)
+        self.assertIn(Post.objects.get(text='Новый пост'), posts)
+
+    @override_settings(FOLLOW_FEED_FANOUT_LIMIT=1)
+    def test_timeline_pages_merge_celebrity_posts(self):
+        """Страницы по курсору идут по дате вперёд и назад без повторов."""
+        other = User.objects.create_user(username='test_other')
+        Follow.objects.create(user=self.user, author=self.author)
+        Follow.objects.create(user=self.user, author=other)
+        AuthorStats.objects.filter(user=self.author).update(followers_count=2)
+        for number in range(my_set.POSTS_AMOUNT + 5):
+            Post.objects.create(
+                author=other if number % 2 else self.author,
+                text=f'Пост {number}')
+        self.assertFalse(FeedItem.objects.filter(
+            post__author=self.author).exists())
+        expected = list(Post.objects.exclude(pk=self.post.pk).order_by(
+            '-pub_date', '-pk')) + [self.post]
+        first = feed.timeline_page(self.user, None)
+        second = feed.timeline_page(self.user, first.next_cursor)
+        back = feed.timeline_page(self.user, second.previous_cursor)
+        self.assertEqual(list(first) + list(second), expected)
+        self.assertFalse(second.has_next())
+        self.assertEqual(list(back), list(first))
+        self.assertFalse(back.has_previous())
+
+    def test_rebuild_feeds(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        call_command('rebuild_feeds', stdout=StringIO())
+        self.assertEqual(
+            list(FeedItem.objects.values_list('user', 'post')),
+            [(self.user.pk, self.post.pk)])
@@ -1,7 +1,10 @@
+import hashlib
 import shutil
 import tempfile
+from io import StringIO
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.conf import settings as my_set
+from django.core.management import call_command
 from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from ..forms import PostForm
@@ -31,6 +34,10 @@ class PostCreateFormTests(TestCase):
             b'\x02\x00\x01\x00\x00\x02\x02\x0C'
             b'\x0A\x00\x3B'
         )
+        cls.small_gif = small_gif
+        # Загрузки называются по sha256 содержимого.
+        cls.stored_name = (
+            f'posts/{hashlib.sha256(small_gif).hexdigest()}.gif')
         cls.uploaded = SimpleUploadedFile(
             name='small.gif',
             content=small_gif,
@@ -64,7 +71,7 @@ class PostCreateFormTests(TestCase):
                 author=self.user,
                 text='Тестовый текст new',
                 group=self.group,
-                image='posts/small.gif',
+                image=self.stored_name,
             ).exists()
         )
 
@@ -110,10 +117,44 @@ class PostCreateFormTests(TestCase):
                 author=self.user,
                 text='Тестовый текст edit',
                 group=self.group,
-                image='posts/small_new.gif'
+                image=self.stored_name
             ).exists()
         )
 
+    @override_settings(IMAGE_QUEUE_ASYNC=False)
+    def test_create_post_builds_thumbnails(self):
+        """Миниатюры строятся при загрузке и выводятся без sorl."""
+        uploaded = SimpleUploadedFile(
+            name='thumb.gif',
+            content=self.small_gif,
+            content_type='image/gif'
+        )
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост с картинкой', 'image': uploaded},
+        )
+        post = Post.objects.get(text='Пост с картинкой')
+        self.assertTrue(post.image_card)
+        self.assertTrue(post.image_detail)
+        response = self.authorized_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.id}))
+        self.assertContains(response, post.image_detail)
+
+    def test_backfill_thumbnails(self):
+        post = Post.objects.create(
+            author=self.user,
+            text='Старый пост',
+            image=SimpleUploadedFile(
+                name='old.gif',
+                content=self.small_gif,
+                content_type='image/gif'
+            ),
+        )
+        call_command('backfill_thumbnails', workers=1, stdout=StringIO())
+        post.refresh_from_db()
+        self.assertTrue(post.image_card)
+        self.assertTrue(post.image_detail)
+
 
 class ImaginFormTests(TestCase):
     @classmethod
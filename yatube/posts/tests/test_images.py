@@ -0,0 +1,153 @@
+import io
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from django.conf import settings as my_set
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from .. import images
+from ..models import ImageJob, Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=my_set.BASE_DIR)
+
+
+def make_jpeg(name, size=(64, 48)):
+    buffer = io.BytesIO()
+    exif = Image.Exif()
+    exif[0x010F] = 'Камера автора'
+    Image.new('RGB', size, (200, 30, 30)).save(buffer, 'JPEG', exif=exif)
+    return SimpleUploadedFile(name, buffer.getvalue(), 'image/jpeg')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageQueueTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='photographer')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def process(self):
+        call_command('process_images', once=True, stdout=StringIO())
+
+    def test_upload_is_processed_by_worker(self):
+        """Картинка ждёт воркера, до того на её месте заглушка."""
+        self.client.post(reverse('posts:post_create'), data={
+            'text': 'Пост с фото', 'image': make_jpeg('photo.jpg')})
+        post = Post.objects.get(text='Пост с фото')
+        self.assertEqual(post.image_status, Post.IMAGE_PENDING)
+        self.assertEqual(ImageJob.objects.filter(post=post).count(), 1)
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}))
+        self.assertContains(response, 'Картинка обрабатывается')
+        self.process()
+        post.refresh_from_db()
+        self.assertEqual(post.image_status, Post.IMAGE_READY)
+        self.assertTrue(post.image_card)
+        self.assertTrue(post.image_detail)
+        self.assertFalse(ImageJob.objects.exists())
+        with default_storage.open(post.image.name) as stored:
+            picture = Image.open(stored)
+            self.assertEqual(picture.format, 'JPEG')
+            self.assertFalse(picture.getexif())
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}))
+        self.assertNotContains(response, 'Картинка обрабатывается')
+        self.assertContains(response, post.image_detail)
+
+    @override_settings(IMAGE_MAX_SIZE=100)
+    def test_large_image_is_scaled_down(self):
+        post = Post.objects.create(
+            author=self.user, text='Панорама',
+            image=make_jpeg('wide.jpg', (400, 40)),
+            image_status=Post.IMAGE_PENDING)
+        images.enqueue(post)
+        self.process()
+        post.refresh_from_db()
+        self.assertEqual((post.image.width, post.image.height), (100, 10))
+
+    def test_broken_image_fails(self):
+        """Обрезанный файл отклоняется без повторов."""
+        data = make_jpeg('broken.jpg').read()
+        post = Post.objects.create(
+            author=self.user, text='Битый файл',
+            image=SimpleUploadedFile('broken.jpg', data[:200]),
+            image_status=Post.IMAGE_PENDING)
+        images.enqueue(post)
+        with self.assertLogs('posts.images', 'WARNING'):
+            self.process()
+        post.refresh_from_db()
+        self.assertEqual(post.image_status, Post.IMAGE_FAILED)
+        self.assertFalse(post.image)
+        self.assertFalse(ImageJob.objects.exists())
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}))
+        self.assertContains(response, 'не удалось обработать')
+
+    def test_replaced_image_job_is_dropped(self):
+        post = Post.objects.create(
+            author=self.user, text='Замена',
+            image=make_jpeg('first.jpg'), image_status=Post.IMAGE_PENDING)
+        images.enqueue(post)
+        post.image = make_jpeg('second.jpg')
+        post.save()
+        self.process()
+        post.refresh_from_db()
+        self.assertEqual(post.image.name, 'posts/second.jpg')
+        self.assertFalse(ImageJob.objects.exists())
+        self.assertFalse(default_storage.exists('posts/first.jpg'))
+
+    def test_missing_file_is_retried(self):
+        """Сбой хранилища — не битая картинка: задача повторяется."""
+        post = Post.objects.create(
+            author=self.user, text='Пропал файл',
+            image=make_jpeg('missing.jpg'), image_status=Post.IMAGE_PENDING)
+        job = images.enqueue(post)
+        default_storage.delete(post.image.name)
+        with self.assertLogs('posts.images', 'ERROR'):
+            self.process()
+        post.refresh_from_db()
+        self.assertEqual(post.image_status, Post.IMAGE_PENDING)
+        self.assertEqual(post.image.name, job.image)
+        self.assertIn('FileNotFoundError',
+                      ImageJob.objects.get(pk=job.pk).error)
+
+    @override_settings(IMAGE_QUEUE_ASYNC=False)
+    def test_sync_failure_is_final(self):
+        """Без воркера неудачная обработка не оставляет пост в ожидании."""
+        post = Post.objects.create(
+            author=self.user, text='Без воркера',
+            image=make_jpeg('sync.jpg'), image_status=Post.IMAGE_PENDING)
+        default_storage.delete(post.image.name)
+        with self.assertLogs('posts.images', 'ERROR'):
+            images.enqueue(post)
+        post.refresh_from_db()
+        self.assertEqual(post.image_status, Post.IMAGE_FAILED)
+        self.assertFalse(ImageJob.objects.exists())
+
+    def test_claim_respects_lease(self):
+        """Занятую задачу не берёт второй воркер, пока не истёк срок."""
+        post = Post.objects.create(
+            author=self.user, text='Очередь', image=make_jpeg('lease.jpg'))
+        job = images.enqueue(post)
+        self.assertEqual(images.claim().pk, job.pk)
+        self.assertIsNone(images.claim())
+        ImageJob.objects.filter(pk=job.pk).update(
+            locked_until=timezone.now() - timedelta(seconds=1))
+        claimed = images.claim()
+        self.assertEqual(claimed.pk, job.pk)
+        self.assertEqual(claimed.attempts, 2)
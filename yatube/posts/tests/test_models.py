@@ -1,5 +1,10 @@
+from django.db import IntegrityError, connection
+from django.db.models import Q
 from django.test import TestCase
-from ..models import Group, Post, User
+from django.utils import timezone
+from .. import feed
+from ..models import Comment, Follow, Group, Post, User
+from ..utils import feed_posts
 
 
 class PostModelTest(TestCase):
@@ -25,3 +30,71 @@ class PostModelTest(TestCase):
         self.assertEqual(expected_object_name, str(group))
         expected_object_name = post.text[:15]
         self.assertEqual(expected_object_name, str(post))
+
+
+def query_plan(queryset):
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        return ' '.join(str(row[-1]) for row in cursor.fetchall())
+
+
+class IndexTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Тестовый пост',
+            group=cls.group,
+        )
+
+    def test_feed_queries_use_composite_indexes(self):
+        """Запросы ленты идут по составным индексам без сортировки."""
+        queries = {
+            'post_group_pub_date_idx': feed_posts().filter(
+                group=self.group).order_by('-pub_date', '-pk')[:11],
+            'post_author_pub_date_idx': feed_posts().filter(
+                author=self.user).order_by('-pub_date', '-pk')[:11],
+            'comment_post_created_idx': Comment.objects.filter(
+                post=self.post).order_by('-created', '-pk')[:21],
+        }
+        for index, queryset in queries.items():
+            with self.subTest(index=index):
+                plan = query_plan(queryset)
+                self.assertIn(index, plan)
+                self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_timeline_page_uses_feed_index(self):
+        """Страница ленты подписок читается по индексу FeedItem."""
+        items = feed.timeline_items(self.reader).order_by(
+            '-pub_date', '-post_id')
+        now = timezone.now()
+        queries = {
+            'first': items[:11],
+            'next': items.filter(
+                Q(pub_date__lte=now),
+                Q(pub_date__lt=now) | Q(pub_date=now, post_id__lt=5))[:11],
+        }
+        for name, queryset in queries.items():
+            with self.subTest(page=name):
+                plan = query_plan(queryset)
+                self.assertIn('feed_user_pub_date_idx (user_id=?', plan)
+                self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_follow_lookup_uses_unique_index(self):
+        plan = query_plan(Follow.objects.filter(
+            user=self.reader, author=self.user))
+        self.assertIn('(user_id=? AND author_id=?)', plan)
+
+    def test_follow_is_unique(self):
+        Follow.objects.create(user=self.reader, author=self.user)
+        with self.assertRaises(IntegrityError):
+            Follow.objects.create(user=self.reader, author=self.user)
@@ -0,0 +1,88 @@
+from django.core.cache import cache
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+from core.testing import query_budget
+from ..models import Comment, Follow, Group, Post, User
+
+PAGE_SIZES = (1, 50)
+
+# Представление -> (kwargs, метод, данные, бюджет SQL-запросов).
+# Бюджет не зависит от размера страницы: лишний запрос на пост его сломает.
+BUDGETS = {
+    'posts:index': ({}, 'get', None, 3),
+    'posts:group_list': ({'slug': 'test_slug'}, 'get', None, 4),
+    'posts:profile': ({'username': 'author'}, 'get', None, 4),
+    'posts:post_detail': ({'post_id': 'post'}, 'get', None, 4),
+    'posts:comments': ({'post_id': 'post'}, 'get', None, 2),
+    'posts:search': ({}, 'get', {'q': 'пост'}, 4),
+    'posts:follow_index': ({}, 'get', None, 3),
+    'posts:post_create': ({}, 'get', None, 3),
+    'posts:post_edit': ({'post_id': 'post'}, 'get', None, 5),
+    'posts:add_comment': (
+        {'post_id': 'post'}, 'post', {'text': 'Комментарий'}, 7),
+    'posts:profile_follow': ({'username': 'other'}, 'get', None, 11),
+    'posts:profile_unfollow': ({'username': 'other'}, 'get', None, 9),
+}
+
+
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.other = User.objects.create_user(username='other')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        Post.objects.bulk_create([
+            Post(author=author, group=cls.group, text=f'Пост {number}',
+                 image='posts/small.gif', image_card='/media/card.gif',
+                 image_detail='/media/detail.gif')
+            for number in range(60)
+            for author in (cls.author, cls.other)
+        ])
+        cls.post = Post.objects.filter(author=cls.author).latest('pk')
+        Comment.objects.bulk_create([
+            Comment(author=cls.reader, post=cls.post, text=f'Ответ {number}')
+            for number in range(60)
+        ])
+        Follow.objects.create(user=cls.author, author=cls.reader)
+        Follow.objects.create(user=cls.author, author=cls.other)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.author)
+
+    def prepare(self, name):
+        # Подписка и отписка проверяются в состоянии, где они что-то меняют.
+        follow = Follow.objects.filter(user=self.author, author=self.other)
+        if name == 'posts:profile_follow':
+            follow.delete()
+        elif name == 'posts:profile_unfollow' and not follow.exists():
+            Follow.objects.create(user=self.author, author=self.other)
+        cache.clear()
+
+    def request(self, name):
+        kwargs, method, data, _ = BUDGETS[name]
+        kwargs = {key: self.post.pk if value == 'post' else value
+                  for key, value in kwargs.items()}
+        return getattr(self.client, method)(
+            reverse(name, kwargs=kwargs), data)
+
+    def test_views_fit_budget_for_any_page_size(self):
+        """Число запросов не растёт с размером страницы."""
+        for name, (*_, budget) in BUDGETS.items():
+            counts = []
+            for size in PAGE_SIZES:
+                with self.subTest(name=name, page_size=size), \
+                        override_settings(POSTS_AMOUNT=size,
+                                          COMMENTS_AMOUNT=size):
+                    self.prepare(name)
+                    with query_budget(budget, label=name) as queries:
+                        self.request(name)
+                    counts.append(len(queries))
+            with self.subTest(name=name):
+                self.assertEqual(counts[0], counts[-1])
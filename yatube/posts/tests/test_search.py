@@ -0,0 +1,121 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, Client
+from django.urls import reverse
+from .. import search
+from ..models import Comment, Post, User
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_user')
+        cls.apple = Post.objects.create(
+            author=cls.user, text='Яблоки созрели в саду')
+        cls.pear = Post.objects.create(
+            author=cls.user, text='Груши ещё зелёные')
+        Comment.objects.create(
+            author=cls.user, post=cls.pear, text='А яблоки уже собрали?')
+
+    def setUp(self):
+        cache.clear()
+
+    def found(self, query, **kwargs):
+        return set(search.filter_posts(Post.objects.all(), query, **kwargs))
+
+    def test_match_expression_quotes_user_input(self):
+        """Операторы FTS5 из запроса не разбираются."""
+        cases = {
+            'Яблоки': '"яблоки"*',
+            'груши OR "сад': '"груши" "or" "сад"*',
+            '*) NEAR(': '"near"*',
+            'сад я': '"сад" "я"',
+            '  ': '',
+        }
+        for query, expression in cases.items():
+            with self.subTest(query=query):
+                self.assertEqual(search.match_expression(query), expression)
+
+    def test_search_posts_and_comments(self):
+        """Находятся посты по тексту, префиксу и тексту комментариев."""
+        cases = {
+            'яблоки': {self.apple, self.pear},
+            'ЯБЛО': {self.apple, self.pear},
+            'груши зелёные': {self.pear},
+            'сад': {self.apple},
+            'сливы': set(),
+            '': set(),
+        }
+        for query, posts in cases.items():
+            with self.subTest(query=query):
+                self.assertEqual(self.found(query), posts)
+        self.assertEqual(
+            self.found('яблоки', with_comments=False), {self.apple})
+
+    def test_plans_find_same_posts(self):
+        """План зависит от числа совпадений, найденные посты — нет."""
+        plans = {
+            'по найденным id': (100, 200, 'MULTI-INDEX OR'),
+            'по дате со списком id': (1, 200, 'LIST SUBQUERY'),
+            'по дате с проверкой поста': (1, 1, 'CORRELATED'),
+        }
+        for name, (sparse, dense, step) in plans.items():
+            with self.subTest(plan=name), self.settings(
+                    SEARCH_SPARSE_MATCHES=sparse,
+                    SEARCH_DENSE_MATCHES=dense):
+                self.assertEqual(self.found('яблоки'), {self.apple, self.pear})
+                self.assertEqual(
+                    self.found('сад', with_comments=False), {self.apple})
+                post_list = search.filter_posts(
+                    Post.objects.order_by('-pub_date'), 'яблоки')
+                sql, params = post_list.query.sql_with_params()
+                with connection.cursor() as cursor:
+                    cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+                    plan = ' '.join(row[-1] for row in cursor.fetchall())
+                self.assertIn(step, plan)
+
+    def test_index_follows_changes(self):
+        """Индекс обновляется при правке и удалении постов и комментариев."""
+        apple = Post.objects.get(pk=self.apple.pk)
+        apple.text = 'Сливы созрели'
+        apple.save()
+        self.assertEqual(self.found('сливы'), {apple})
+        self.assertEqual(self.found('яблоки'), {self.pear})
+        Comment.objects.filter(post=self.pear).delete()
+        self.assertEqual(self.found('яблоки'), set())
+        apple.delete()
+        self.assertEqual(self.found('сливы'), set())
+
+    def test_rebuild(self):
+        Post.objects.filter(pk=self.pear.pk).update(text='Персики')
+        search.rebuild()
+        self.assertEqual(self.found('персики'), {self.pear})
+        self.assertEqual(self.found('груши'), set())
+
+    def test_search_page(self):
+        """Страница поиска выводит найденные посты и хранит q в ссылках."""
+        for number in range(11):
+            Post.objects.create(author=self.user, text=f'Сад номер {number}')
+        response = self.client.get(reverse('posts:search'), {'q': 'сад'})
+        page_obj = response.context['page_obj']
+        self.assertEqual(len(page_obj), 10)
+        self.assertEqual(response.context['query'], 'сад')
+        self.assertContains(response, '?q=%D1%81%D0%B0%D0%B4&amp;cursor=')
+        response = self.client.get(
+            reverse('posts:search'), {'q': 'сад', 'cursor':
+                                      page_obj.next_cursor})
+        self.assertEqual(len(response.context['page_obj']), 2)
+        response = self.client.get(reverse('posts:search'))
+        self.assertEqual(len(response.context['page_obj']), 0)
+
+    def test_admin_search(self):
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass')
+        client = Client()
+        client.force_login(admin)
+        response = client.get('/admin/posts/post/', {'q': 'яблоки'})
+        self.assertEqual(
+            list(response.context['cl'].result_list), [self.apple])
+        response = client.get('/admin/posts/comment/', {'q': 'яблоки'})
+        self.assertEqual(response.context['cl'].result_count, 1)
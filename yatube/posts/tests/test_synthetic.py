@@ -0,0 +1,68 @@
+import shutil
+import tempfile
+from io import StringIO
+from django.conf import settings as my_set
+from django.core.files.storage import default_storage
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db.models import F
+from django.test import TestCase, override_settings
+from ..models import AuthorStats, Comment, Follow, Group, Post, User
+from ..urls import urlpatterns
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=my_set.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, IMAGE_QUEUE_ASYNC=False)
+class GenerateDataTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        call_command(
+            'generate_data', users=50, groups=5, posts=300, comments=100,
+            follows=500, images=2, image_share=0.5, batch_size=64,
+            stdout=StringIO())
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_dataset_is_skewed(self):
+        """Подписчики и посты сосредоточены у первых авторов."""
+        self.assertEqual(User.objects.count(), 50)
+        self.assertEqual(Group.objects.count(), 5)
+        self.assertEqual(Post.objects.count(), 300)
+        self.assertEqual(Comment.objects.count(), 100)
+        self.assertFalse(Follow.objects.filter(user=F('author')).exists())
+        stats = list(AuthorStats.objects.order_by('pk'))
+        self.assertEqual(len(stats), 50)
+        head, tail = stats[:5], stats[-25:]
+        self.assertGreater(sum(item.followers_count for item in head),
+                           sum(item.followers_count for item in tail))
+        self.assertGreater(sum(item.posts_count for item in head),
+                           sum(item.posts_count for item in tail))
+
+    def test_images_and_dates(self):
+        images = set(Post.objects.exclude(image='').values_list(
+            'image', flat=True))
+        self.assertEqual(len(images), 2)
+        for name in images:
+            with self.subTest(name=name):
+                self.assertTrue(default_storage.exists(name))
+        self.assertGreater(
+            Post.objects.dates('pub_date', 'day').count(), 1)
+
+    def test_bench_urls_covers_posts_urls(self):
+        """Бенчмарк обходит каждый адрес posts.urls."""
+        out = StringIO()
+        call_command('bench_urls', requests=2, stdout=out)
+        for pattern in urlpatterns:
+            with self.subTest(name=pattern.name):
+                self.assertIn(pattern.name, out.getvalue())
+
+    def test_cold_bench_keeps_server_cache(self):
+        """--cold чистит временный кэш, а не кэш сервера."""
+        cache.set('bench_marker', 'на месте')
+        call_command('bench_urls', requests=2, cold=True, stdout=StringIO())
+        self.assertEqual(cache.get('bench_marker'), 'на месте')
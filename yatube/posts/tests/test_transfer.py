@@ -0,0 +1,193 @@
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from .. import search, transfer
+from ..models import (
+    AuthorStats, Comment, FeedItem, Follow, Group, Post, User)
+
+
+class TransferTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.mkdtemp()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(cls.directory, ignore_errors=True)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def make_content(self):
+        old = timezone.now() - timedelta(days=30)
+        post = Post.objects.create(
+            author=self.author, text='Старый пост', group=self.group)
+        Post.objects.filter(pk=post.pk).update(pub_date=old)
+        Post.objects.create(author=self.author, text='Без группы')
+        Comment.objects.create(author=self.reader, post=post, text='Ответ')
+        Follow.objects.create(user=self.reader, author=self.author)
+        return old
+
+    def export(self, kind, name):
+        call_command('export_content', kind, self.path(name),
+                     stderr=StringIO())
+
+    def load(self, kind, name, **options):
+        out = StringIO()
+        call_command('import_content', kind, self.path(name),
+                     stdout=out, stderr=StringIO(), **options)
+        return out.getvalue()
+
+    def test_round_trip(self):
+        """Выгрузка и загрузка сохраняют записи, даты и связи."""
+        old = self.make_content()
+        for fmt in transfer.FORMATS:
+            with self.subTest(fmt=fmt):
+                for kind in ('posts', 'comments', 'follows'):
+                    self.export(kind, f'{kind}.{fmt}')
+                expected = list(Post.objects.order_by('pk').values_list(
+                    'pk', 'text', 'pub_date', 'author', 'group'))
+                Post.objects.all().delete()
+                Follow.objects.all().delete()
+                for kind in ('posts', 'comments', 'follows'):
+                    self.load(kind, f'{kind}.{fmt}')
+                self.assertEqual(list(Post.objects.order_by('pk').values_list(
+                    'pk', 'text', 'pub_date', 'author', 'group')), expected)
+                self.assertEqual(expected[0][2], old)
+                self.assertTrue(Comment.objects.filter(
+                    post_id=expected[0][0], author=self.reader).exists())
+                self.assertTrue(Follow.objects.filter(
+                    user=self.reader, author=self.author).exists())
+
+    def test_import_updates_derived_data(self):
+        """После загрузки пересчитаны счётчики и поисковый индекс."""
+        self.make_content()
+        self.export('posts', 'posts.jsonl')
+        self.export('comments', 'comments.jsonl')
+        Post.objects.all().delete()
+        self.load('posts', 'posts.jsonl')
+        self.load('comments', 'comments.jsonl')
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.author).posts_count, 2)
+        self.assertEqual(
+            Post.objects.get(text='Старый пост').comments_count, 1)
+        self.assertEqual(search.filter_posts(
+            Post.objects.all(), 'старый').count(), 1)
+
+    def write(self, name, records):
+        with open(self.path(name), 'w') as stream:
+            for record in records:
+                stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def test_follows_report_inserted(self):
+        """Повторные и уже существующие подписки не считаются загруженными."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.write('follows.jsonl', [
+            {'user': 'reader', 'author': 'author'},
+            {'user': 'other', 'author': 'author'},
+            {'user': 'other', 'author': 'author'},
+        ])
+        out = self.load('follows', 'follows.jsonl', create_users=True)
+        self.assertIn('Загружено: 1, уже были: 2', out)
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.author).followers_count, 2)
+
+    @override_settings(FOLLOW_FEED_MATERIALIZED=True)
+    def test_import_updates_only_loaded_rows(self):
+        """Загрузка подписок заполняет их ленты и не перестраивает
+        поисковый индекс и чужие ленты."""
+        post = Post.objects.create(author=self.author, text='Пост автора')
+        Post.objects.bulk_create(
+            [Post(author=self.reader, text='Вне индекса')])
+        stranger = User.objects.create_user(username='stranger')
+        FeedItem.objects.create(
+            user=stranger, post=post, pub_date=post.pub_date)
+        self.write('follows.jsonl', [{'user': 'reader', 'author': 'author'}])
+        self.load('follows', 'follows.jsonl')
+        self.assertEqual(
+            list(FeedItem.objects.filter(user=self.reader).values_list(
+                'post', flat=True)), [post.pk])
+        self.assertTrue(FeedItem.objects.filter(user=stranger).exists())
+        if search.is_supported():
+            self.assertFalse(search.filter_posts(
+                Post.objects.all(), 'индекса').exists())
+
+    def test_lookups_are_batched(self):
+        """Число запросов на пачку не зависит от числа записей в ней."""
+        def queries(count):
+            records = [
+                {'id': '', 'text': f'Пост {number}', 'pub_date': '',
+                 'author': f'user{number % 3}', 'group': 'group',
+                 'image': ''}
+                for number in range(count)
+            ]
+            with CaptureQueriesContext(connection) as context:
+                transfer.import_records(
+                    'posts', iter(records), batch_size=100,
+                    create_users=True)
+            return len(context)
+
+        queries(5)
+        self.assertEqual(queries(5), queries(50))
+
+    def test_resume_and_skip_unresolved(self):
+        """Повторный запуск продолжает с сохранённой пачки."""
+        lines = [
+            {'id': 100, 'text': 'Первый', 'pub_date': '', 'author': 'author',
+             'group': '', 'image': ''},
+            {'id': 101, 'text': 'Второй', 'pub_date': '', 'author': 'author',
+             'group': '', 'image': ''},
+            {'id': 102, 'text': 'Чужой', 'pub_date': '', 'author': 'nobody',
+             'group': '', 'image': ''},
+            {'id': 103, 'text': 'Без группы', 'pub_date': '',
+             'author': 'author', 'group': 'missing', 'image': ''},
+        ]
+        with open(self.path('posts.jsonl'), 'w') as stream:
+            for line in lines:
+                stream.write(json.dumps(line, ensure_ascii=False) + '\n')
+        with open(self.path('posts.jsonl.progress'), 'w') as stream:
+            json.dump({'kind': 'posts', 'done': 1}, stream)
+        self.load('posts', 'posts.jsonl', batch_size=2)
+        self.assertEqual(
+            list(Post.objects.values_list('pk', flat=True)), [101])
+        self.assertFalse(os.path.exists(self.path('posts.jsonl.progress')))
+        self.load('posts', 'posts.jsonl', create_users=True)
+        self.assertEqual(sorted(Post.objects.values_list('pk', flat=True)),
+                         [100, 101, 102])
+
+    def test_id_taken_by_other_post(self):
+        """Занятый чужим постом id не теряет пост и его комментарии."""
+        self.make_content()
+        post = Post.objects.get(text='Старый пост')
+        self.export('posts', 'posts.jsonl')
+        self.export('comments', 'comments.jsonl')
+        Post.objects.all().delete()
+        stranger = Post.objects.create(
+            id=post.pk, author=self.reader, text='Пост целевой базы')
+        out = self.load('posts', 'posts.jsonl')
+        self.assertIn('Загружено: 2, уже были: 0', out)
+        self.load('comments', 'comments.jsonl')
+        stranger.refresh_from_db()
+        self.assertEqual(stranger.text, 'Пост целевой базы')
+        self.assertFalse(stranger.comments.exists())
+        moved = Post.objects.get(text='Старый пост')
+        self.assertNotEqual(moved.pk, post.pk)
+        self.assertEqual(moved.pub_date, post.pub_date)
+        self.assertEqual(
+            list(moved.comments.values_list('text', flat=True)), ['Ответ'])
+        out = self.load('posts', 'posts.jsonl')
+        self.assertIn('Загружено: 0, уже были: 2', out)
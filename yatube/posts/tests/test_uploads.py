@@ -0,0 +1,117 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+from django.conf import settings as my_set
+from django.core.management import call_command
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+from .. import uploads
+from ..models import Post, User
+from .test_images import make_jpeg
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=my_set.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageUploadTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='uploader')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def upload(self, text, image):
+        return self.client.post(reverse('posts:post_create'),
+                                data={'text': text, 'image': image})
+
+    def stored_files(self):
+        return sorted(os.listdir(os.path.join(TEMP_MEDIA_ROOT, 'posts')))
+
+    def test_sniff(self):
+        headers = {
+            b'\xff\xd8\xff\xe0\x00\x10JFIF\x00\x01': '.jpg',
+            b'\x89PNG\r\n\x1a\n\x00\x00\x00\r': '.png',
+            b'GIF89a\x02\x00\x01\x00\x80\x00': '.gif',
+            b'RIFF\x10\x00\x00\x00WEBP': '.webp',
+            b'<html><body>': None,
+        }
+        for header, extension in headers.items():
+            with self.subTest(header=header):
+                self.assertEqual(uploads.sniff(header), extension)
+
+    def test_not_image_is_rejected(self):
+        """Файл не картинка: загрузка обрывается, пост не создаётся."""
+        image = make_jpeg('fake.jpg')
+        image.file.seek(0)
+        image.file.write(b'<?php system($_GET[1]); ?>')
+        image.file.seek(0)
+        response = self.upload('Не картинка', image)
+        self.assertEqual(response.status_code, 200)
+        self.assertFormError(response, 'form', 'image', uploads.NOT_IMAGE)
+        self.assertFalse(Post.objects.filter(text='Не картинка').exists())
+
+    @override_settings(IMAGE_UPLOAD_MAX_SIZE=1024)
+    def test_large_file_is_rejected(self):
+        """Файл больше лимита обрывается на первом лишнем куске."""
+        response = self.upload('Большой файл',
+                               make_jpeg('big.jpg', (400, 400)))
+        self.assertFormError(
+            response, 'form', 'image', 'Картинка больше 1,0\xa0КБ.')
+        self.assertFalse(Post.objects.filter(text='Большой файл').exists())
+
+    @override_settings(IMAGE_UPLOAD_MAX_SIZE=1024,
+                       DATA_UPLOAD_MAX_MEMORY_SIZE=1024)
+    def test_large_body_is_not_read(self):
+        """Запрос с большим Content-Length обрывается до чтения файла."""
+        response = self.upload('Большой запрос',
+                               make_jpeg('big.jpg', (400, 400)))
+        self.assertFormError(
+            response, 'form', 'image', 'Картинка больше 1,0\xa0КБ.')
+
+    def test_same_image_is_stored_once(self):
+        """Одинаковые загрузки ссылаются на один файл и до, и после
+        обработки."""
+        self.upload('Первый', make_jpeg('one.jpg'))
+        self.upload('Второй', make_jpeg('two.jpg'))
+        first = Post.objects.get(text='Первый')
+        second = Post.objects.get(text='Второй')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(len(self.stored_files()), 1)
+        call_command('process_images', once=True, stdout=StringIO())
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(self.stored_files(),
+                         [os.path.basename(first.image.name)])
+        self.assertEqual(first.image_status, Post.IMAGE_READY)
+        self.assertEqual(second.image_status, Post.IMAGE_READY)
+
+    def test_csrf_is_checked(self):
+        """Без CSRF-токена пост с картинкой не создаётся, с токеном —
+        создаётся."""
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        url = reverse('posts:post_create')
+        response = client.post(
+            url, data={'text': 'Без токена', 'image': make_jpeg('one.jpg')})
+        self.assertTemplateUsed(response, 'core/403csrf.html')
+        self.assertFalse(Post.objects.filter(text='Без токена').exists())
+        client.get(url)
+        token = client.cookies[my_set.CSRF_COOKIE_NAME].value
+        response = client.post(url, data={
+            'text': 'С токеном',
+            'image': make_jpeg('two.jpg'),
+            'csrfmiddlewaretoken': token,
+        })
+        self.assertRedirects(
+            response, reverse('posts:profile', args=[self.user.username]))
+        self.assertTrue(Post.objects.filter(text='С токеном').exists())
@@ -58,6 +58,7 @@ class PostURLTests(TestCase):
             '/': 'posts/index.html',
             '/group/test_slug/': 'posts/group_list.html',
             '/posts/1/': 'posts/post_detail.html',
+            '/posts/1/comments/': 'posts/includes/comments.html',
             '/profile/test_user/': 'posts/profile.html',
         }
         cache.clear()
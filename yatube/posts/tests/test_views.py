@@ -1,14 +1,34 @@
 import shutil
 import tempfile
+import threading
+import time
+from django.contrib.auth.models import AnonymousUser
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.conf import settings as my_set
 from django.core.cache import cache
-from django.test import TestCase, Client, override_settings
+from django.db import connection
+from django.http import HttpResponse
+from django.test import TestCase, Client, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django import forms
-from ..models import Group, Post, User
+from core import routers
+from core.routers import ReplicaRouter
+from .. import counts, thumbnails
+from .. import cache as page_cache
+from ..cache import cache_page_versioned, cache_stats, reset_cache_stats
+from ..models import Comment, Follow, Group, Post, User
+from ..utils import WindowPaginator
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=my_set.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
 
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
@@ -179,6 +199,154 @@ class PostViewsTests(TestCase):
         self.assertNotIn(post_ng, response.context['page_obj'])
 
 
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailPrefetchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_user')
+        cls.posts = [
+            Post.objects.create(
+                author=cls.user,
+                text=f'Пост {i}',
+                image=SimpleUploadedFile(
+                    name=f'prefetch{i}.gif',
+                    content=SMALL_GIF,
+                    content_type='image/gif'
+                ),
+            )
+            for i in range(3)
+        ]
+        for post in cls.posts:
+            thumbnails.generate(post.pk)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def page_posts(self):
+        posts = list(Post.objects.filter(pk__in=[p.pk for p in self.posts]))
+        for post in posts:
+            post.image_card = ''
+        return posts
+
+    def test_prefetch_fills_urls_with_one_lookup(self):
+        expected = dict(Post.objects.values_list('pk', 'image_card'))
+        posts = self.page_posts()
+        with self.assertNumQueries(0):
+            thumbnails.prefetch(posts)
+        self.assertEqual({post.pk: post.image_card for post in posts},
+                         expected)
+
+    def test_prefetch_cold_cache_uses_one_query(self):
+        posts = self.page_posts()
+        cache.clear()
+        with self.assertNumQueries(1):
+            thumbnails.prefetch(posts)
+        self.assertTrue(all(post.image_card for post in posts))
+
+    def test_index_uses_prefetched_urls(self):
+        Post.objects.update(image_card='')
+        cache.clear()
+        response = Client().get(reverse('posts:index'))
+        for post in response.context['page_obj']:
+            with self.subTest(post=post.text):
+                self.assertTrue(post.image_card)
+
+
+class FeedQueriesTests(TestCase):
+    """Число запросов ленты не зависит от числа постов на странице."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_user')
+        cls.authorized_client = Client()
+        cls.authorized_client.force_login(cls.user)
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        cls.author = User.objects.create_user(username='test_author')
+        Follow.objects.create(user=cls.user, author=cls.author)
+        Post.objects.create(author=cls.author, text='Пост', group=cls.group)
+
+    def add_posts(self, amount):
+        for i in range(amount):
+            author = User.objects.create_user(username=f'author{i}')
+            group = Group.objects.create(
+                title=f'Группа {i}', slug=f'group{i}', description='-')
+            Follow.objects.create(user=self.user, author=author)
+            Post.objects.create(author=author, text='Пост', group=group)
+            Post.objects.create(
+                author=self.author, text='Пост', group=group)
+
+    def count_queries(self, address):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.authorized_client.get(address)
+        return len(queries)
+
+    def test_feed_queries_do_not_grow(self):
+        pages = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': 'test_author'}),
+            reverse('posts:follow_index'),
+        ]
+        expected = {address: self.count_queries(address)
+                    for address in pages}
+        self.add_posts(my_set.POSTS_AMOUNT)
+        Post.objects.filter(author=self.author).update(group=self.group)
+        for address in pages:
+            with self.subTest(address=address):
+                cache.clear()
+                with self.assertNumQueries(expected[address]):
+                    response = self.authorized_client.get(address)
+                self.assertGreater(len(response.context['page_obj']), 1)
+
+
+@override_settings(COMMENTS_AMOUNT=3)
+class CommentWindowTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.post = Post.objects.create(
+            author=User.objects.create_user(username='test_author'),
+            text='Тестовый пост',
+        )
+        for i in range(5):
+            Comment.objects.create(
+                author=User.objects.create_user(username=f'reader{i}'),
+                post=cls.post,
+                text=f'Комментарий {i}',
+            )
+
+    def test_detail_shows_first_window(self):
+        response = self.client.get(reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.id}))
+        comments = response.context['comments']
+        self.assertEqual([c.text for c in comments],
+                         ['Комментарий 4', 'Комментарий 3', 'Комментарий 2'])
+        self.assertContains(response, comments.next_cursor)
+
+    def test_load_more_returns_next_batch(self):
+        response = self.client.get(reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.id}))
+        cursor = response.context['comments'].next_cursor
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                reverse('posts:comments', kwargs={'post_id': self.post.id}),
+                {'cursor': cursor})
+        comments = response.context['comments']
+        self.assertEqual([c.text for c in comments],
+                         ['Комментарий 1', 'Комментарий 0'])
+        self.assertFalse(comments.has_next())
+        self.assertNotContains(response, 'Показать ещё')
+
+
 class PaginatorViewsTest(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -234,6 +402,7 @@ class PaginatorViewsTest(TestCase):
                                  my_set.POSTS_AMOUNT)
                 self.page_test_context(response)
 
+    @override_settings(POSTS_PAGINATION='offset')
     def test_second_page_contains_last_records(self):
         pages_names = [
             reverse('posts:index'),
@@ -250,6 +419,96 @@ class PaginatorViewsTest(TestCase):
                                  self.page_len - my_set.POSTS_AMOUNT)
                 self.page_test_context(response)
 
+    def test_second_page_by_cursor(self):
+        pages_names = [
+            reverse('posts:index'),
+            reverse('posts:group_list',
+                    kwargs={'slug': self.group.slug}),
+            reverse('posts:profile',
+                    kwargs={'username': self.user.username}),
+        ]
+        cache.clear()
+        for reverse_name in pages_names:
+            with self.subTest(reverse_name=reverse_name):
+                response = self.authorized_client.get(reverse_name)
+                first_page = response.context['page_obj']
+                self.assertTrue(first_page.has_next())
+                self.assertFalse(first_page.has_previous())
+                response = self.authorized_client.get(
+                    reverse_name, {'cursor': first_page.next_cursor})
+                second_page = response.context['page_obj']
+                self.assertEqual(len(second_page),
+                                 self.page_len - my_set.POSTS_AMOUNT)
+                self.assertFalse(second_page.has_next())
+                self.assertTrue(second_page.has_previous())
+                self.assertFalse(
+                    set(first_page) & set(second_page))
+                response = self.authorized_client.get(
+                    reverse_name, {'cursor': second_page.previous_cursor})
+                self.assertEqual(list(response.context['page_obj']),
+                                 list(first_page))
+
+    def test_broken_cursor_shows_first_page(self):
+        cache.clear()
+        response = self.authorized_client.get(
+            reverse('posts:index'), {'cursor': 'broken'})
+        self.assertEqual(len(response.context['page_obj']),
+                         my_set.POSTS_AMOUNT)
+        self.assertFalse(response.context['page_obj'].has_previous())
+
+
+class PageWindowTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='window_user')
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'Пост {number}')
+            for number in range(my_set.POSTS_AMOUNT * 30))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_elided_page_range(self):
+        paginator = WindowPaginator(range(1000), 10)
+        cases = {
+            1: [1, 2, 3, '…', 100],
+            50: [1, '…', 48, 49, 50, 51, 52, '…', 100],
+            100: [1, '…', 98, 99, 100],
+        }
+        for number, expected in cases.items():
+            with self.subTest(number=number):
+                self.assertEqual(
+                    list(paginator.get_elided_page_range(number)), expected)
+        self.assertEqual(
+            list(WindowPaginator(range(70), 10).get_elided_page_range(4)),
+            list(range(1, 8)))
+
+    @override_settings(POSTS_PAGINATION='offset')
+    def test_template_renders_only_window(self):
+        """Навигация выводит окно страниц, а не все 30."""
+        response = self.client.get(reverse('posts:index'), {'page': 15})
+        content = response.content.decode()
+        self.assertEqual(response.context['page_obj'].page_window,
+                         [1, '…', 13, 14, 15, 16, 17, '…', 30])
+        self.assertIn('page=30', content)
+        self.assertNotIn('page=20"', content)
+        self.assertEqual(content.count('class="page-item disabled"'), 2)
+
+    def test_count_is_cached_until_posts_change(self):
+        posts = Post.objects.filter(author=self.user)
+        self.assertEqual(WindowPaginator(posts, 10).count, 300)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(WindowPaginator(posts, 10).count, 300)
+        self.assertEqual(len(queries), 0)
+        Post.objects.create(author=self.user, text='Ещё один пост')
+        self.assertEqual(WindowPaginator(posts, 10).count, 301)
+
+    def test_empty_queryset(self):
+        paginator = WindowPaginator(Post.objects.none(), 10)
+        self.assertEqual(paginator.count, 0)
+        self.assertEqual(paginator.get_page(1).page_window, [1])
+
 
 class CacheTests(TestCase):
     @classmethod
@@ -276,3 +535,163 @@ class CacheTests(TestCase):
         response = self.authorized_client.get(reverse('posts:index'))
         content = response.content.decode()
         self.assertNotIn(self.post.text, content)
+
+    def test_index_cache_invalidated_on_write(self):
+        """Кэш index сбрасывается сразу после записи."""
+        cache.clear()
+        self.authorized_client.get(reverse('posts:index'))
+        self.authorized_client.post(
+            reverse('posts:post_create'), data={'text': 'Свежий пост'})
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertIn('Свежий пост', response.content.decode())
+        self.post.text = 'Изменённый пост'
+        self.post.save()
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertIn('Изменённый пост', response.content.decode())
+
+    def test_index_cache_counters(self):
+        cache.clear()
+        reset_cache_stats()
+        for _ in range(3):
+            self.authorized_client.get(reverse('posts:index'))
+        self.authorized_client.get(reverse('posts:index'), {'page': 2})
+        self.assertEqual(cache_stats(),
+                         {'hits': 2, 'misses': 2, 'stale': 0})
+
+    def test_cache_counters_are_shared(self):
+        """Счётчики складываются со счётчиками других процессов в общем
+        кэше и видны на /stats/requests/."""
+        cache.clear()
+        reset_cache_stats()
+        # Другой процесс уже прислал свои счётчики.
+        cache.set(page_cache.STATS_KEY.format('hits'), 5, None)
+        self.authorized_client.get(reverse('posts:index'))
+        self.authorized_client.get(reverse('posts:index'))
+        staff = User.objects.create_user(username='staff', is_staff=True)
+        client = Client()
+        client.force_login(staff)
+        stats = client.get('/stats/requests/').json()
+        self.assertEqual(stats['page_cache'],
+                         {'hits': 6, 'misses': 1, 'stale': 0})
+
+
+class RecordingRouter(ReplicaRouter):
+    """Запоминает чтения, которые ушли бы на реплику, и делает их в default.
+
+    В тестах реплика — зеркало default, отстать она не может.
+    """
+
+    replica_reads = []
+
+    def db_for_read(self, model, **hints):
+        alias = super().db_for_read(model, **hints)
+        if alias != 'default':
+            self.replica_reads.append(model)
+        return 'default'
+
+
+@override_settings(
+    DATABASE_REPLICAS=['replica'], POSTS_PAGINATION='offset',
+    DATABASE_ROUTERS=['posts.tests.test_views.RecordingRouter'])
+class ReplicaCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_user')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+
+    def replica_reads(self, address):
+        RecordingRouter.replica_reads.clear()
+        response = self.client.get(address)
+        self.assertEqual(response.status_code, 200)
+        return len(RecordingRouter.replica_reads)
+
+    def test_cache_is_filled_from_primary(self):
+        """Отстающая реплика не попадает в кэш страниц и чисел."""
+        self.assertGreater(self.replica_reads(reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.pk})), 0)
+        for address in (reverse('posts:index'),
+                        reverse('posts:profile',
+                                kwargs={'username': 'test_user'})):
+            with self.subTest(address=address):
+                self.assertEqual(self.replica_reads(address), 0)
+
+    def test_counts_are_filled_from_primary(self):
+        RecordingRouter.replica_reads.clear()
+        state, token = routers.start_request(True)
+        try:
+            counts.for_author(self.user)
+            WindowPaginator(Post.objects.filter(text='Пост'), 10).count
+            Post.objects.first()
+        finally:
+            routers.end_request(token)
+        self.assertEqual(RecordingRouter.replica_reads, [Post])
+
+
+@override_settings(PAGE_CACHE={
+    'test_page': {'TIMEOUT': 60, 'STALE': 60, 'WAIT': 2.0},
+})
+class SingleFlightCacheTests(TestCase):
+    clients = 10
+
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+        self.calls_lock = threading.Lock()
+
+        @cache_page_versioned('test_page')
+        def slow_view(request):
+            with self.calls_lock:
+                self.calls += 1
+            time.sleep(0.2)
+            return HttpResponse(str(self.calls))
+
+        self.view = slow_view
+        self.request = RequestFactory().get('/test/')
+        self.request.user = AnonymousUser()
+
+    def hit_concurrently(self):
+        barrier = threading.Barrier(self.clients)
+
+        def worker():
+            barrier.wait()
+            responses.append(self.view(self.request))
+
+        responses = []
+        threads = [threading.Thread(target=worker)
+                   for _ in range(self.clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return responses
+
+    def test_only_one_request_recomputes_on_miss(self):
+        responses = self.hit_concurrently()
+        self.assertEqual(self.calls, 1)
+        self.assertEqual({r.content for r in responses}, {b'1'})
+
+    def test_timed_out_request_keeps_foreign_lock(self):
+        """Запрос, не дождавшийся пересчёта, не снимает чужую
+        блокировку."""
+        lock_key = page_cache._page_key(self.request, 'test_page') + '.lock'
+        cache.set(lock_key, 'другой запрос', 60)
+        with override_settings(PAGE_CACHE={
+            'test_page': {'TIMEOUT': 60, 'STALE': 60, 'WAIT': 0.1},
+        }):
+            self.view(self.request)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(cache.get(lock_key), 'другой запрос')
+
+    def test_stale_page_served_while_revalidating(self):
+        with override_settings(PAGE_CACHE={
+            'test_page': {'TIMEOUT': 0, 'STALE': 60, 'WAIT': 2.0},
+        }):
+            self.view(self.request)
+            responses = self.hit_concurrently()
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(sorted(r.content for r in responses),
+                         [b'1'] * (self.clients - 1) + [b'2'])
@@ -0,0 +1,80 @@
+from django.db import close_old_connections
+from django.db.models import F
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from .models import Post
+
+# Поле Post -> параметры миниатюры, как в шаблонах.
+RENDITIONS = {
+    'image_card': ('960x339', {'crop': 'center', 'upscale': True}),
+    'image_detail': ('960x339', {'upscale': True}),
+}
+
+
+def generate(post_id):
+    """Строит миниатюры поста и сохраняет их адреса в Post."""
+    post = Post.objects.filter(pk=post_id).only('image').first()
+    if post is None:
+        return
+    urls = dict.fromkeys(RENDITIONS, '')
+    if post.image:
+        for field, (geometry, options) in RENDITIONS.items():
+            urls[field] = get_thumbnail(post.image, geometry, **options).url
+    Post.objects.filter(pk=post_id).update(
+        version=F('version') + 1, **urls)
+
+
+def generate_in_worker(post_id):
+    close_old_connections()
+    try:
+        generate(post_id)
+    finally:
+        close_old_connections()
+
+
+def _thumbnail_key(image, geometry, options):
+    # Повторяет разбор параметров из ThumbnailBackend.get_thumbnail,
+    # чтобы получить тот же ключ, что и тег {% thumbnail %}.
+    backend = default.backend
+    source = ImageFile(image)
+    options = dict(options)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    name = backend._get_thumbnail_filename(source, geometry, options)
+    return add_prefix(ImageFile(name, default.storage).key)
+
+
+def prefetch(posts, field='image_card'):
+    """Находит готовые миниатюры страницы одним get_many.
+
+    Постам без сохранённого адреса миниатюры адрес подставляется из
+    хранилища sorl (промахи кэша добираются одним SQL-запросом);
+    для ненайденных шаблон построит миниатюру сам.
+    """
+    kv_cache = getattr(default.kvstore, 'cache', None)
+    if kv_cache is None:
+        return
+    geometry, options = RENDITIONS[field]
+    keys = {}
+    for post in posts:
+        if post.image and not getattr(post, field):
+            keys[_thumbnail_key(post.image, geometry, options)] = post
+    if not keys:
+        return
+    found = kv_cache.get_many(list(keys))
+    missing = [key for key in keys if key not in found]
+    if missing:
+        # Холодный кэш: один запрос к таблице sorl вместо запроса на пост.
+        stored = dict(KVStoreModel.objects.filter(
+            key__in=missing).values_list('key', 'value'))
+        kv_cache.set_many(stored, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+        found.update(stored)
+    for key, value in found.items():
+        if isinstance(value, str):
+            setattr(keys[key], field, deserialize_image_file(value).url)
@@ -0,0 +1,365 @@
+import csv
+import datetime
+import json
+import sys
+from collections import Counter
+from contextlib import contextmanager
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.db import reset_queries, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import counters, feed, search
+from .cache import bump_generation
+from .models import Comment, Follow, Group, Post, User
+
+FORMATS = ('jsonl', 'csv')
+
+# Поля выгрузки: внешние ключи пишутся именами пользователей и slug групп,
+# чтобы файл можно было загрузить в базу с другими id пользователей.
+# Пост комментария узнаётся по автору и дате: в целевой базе у поста
+# может оказаться другой id.
+FIELDS = {
+    'posts': ('id', 'text', 'pub_date', 'author', 'group', 'image'),
+    'comments': ('id', 'text', 'created', 'author', 'post',
+                 'post_author', 'post_pub_date'),
+    'follows': ('user', 'author'),
+}
+
+_EXPORT = {
+    'posts': (Post, ('id', 'text', 'pub_date', 'author__username',
+                     'group__slug', 'image')),
+    'comments': (Comment, ('id', 'text', 'created', 'author__username',
+                           'post_id', 'post__author__username',
+                           'post__pub_date')),
+    'follows': (Follow, ('user__username', 'author__username')),
+}
+
+MODELS = {kind: model for kind, (model, _) in _EXPORT.items()}
+
+# Поля, по которым запись из файла совпадает с записью в базе. Даты поста
+# нет: в файле её может не быть, и тогда пост получает текущую.
+POST_KEY = ('author_id', 'text')
+COMMENT_KEY = ('author_id', 'post_id', 'text')
+
+
+def guess_format(path):
+    return 'csv' if path.endswith('.csv') else 'jsonl'
+
+
+def export_records(kind, batch_size=1000):
+    """Записи модели по одной; в памяти не больше batch_size строк."""
+    model, values = _EXPORT[kind]
+    rows = model.objects.order_by('pk').values_list(*values).iterator(
+        chunk_size=batch_size)
+    for row in rows:
+        record = {}
+        for field, value in zip(FIELDS[kind], row):
+            if isinstance(value, datetime.datetime):
+                value = value.isoformat()
+            record[field] = '' if value is None else value
+        yield record
+
+
+def write_records(records, stream, fmt, fields):
+    written = 0
+    if fmt == 'csv':
+        writer = csv.DictWriter(stream, fieldnames=fields)
+        writer.writeheader()
+        for record in records:
+            writer.writerow(record)
+            written += 1
+        return written
+    for record in records:
+        stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+        written += 1
+    return written
+
+
+def read_records(stream, fmt):
+    if fmt == 'csv':
+        csv.field_size_limit(sys.maxsize)
+        yield from csv.DictReader(stream)
+        return
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def _users(names, create):
+    names = {name for name in names if name}
+    found = User.objects.in_bulk(names, field_name='username')
+    missing = names - set(found)
+    if missing and create:
+        # Пароль непригоден для входа: его задаёт сброс пароля.
+        User.objects.bulk_create(
+            [User(username=name, password=make_password(None))
+             for name in missing],
+            ignore_conflicts=True,
+        )
+        found.update(User.objects.in_bulk(missing, field_name='username'))
+    return found
+
+
+def _date(value):
+    return parse_datetime(value) if value else timezone.now()
+
+
+def _pk(value):
+    return int(value) if value not in (None, '') else None
+
+
+def _resolve_ids(model, objects, fields, stats):
+    """Сверяет явные id с записями, которые уже есть в базе.
+
+    Запись с тем же id и теми же fields уже загружена и пропускается.
+    Если id занят другой записью, объект получает новый id (связи
+    комментариев ищут пост по автору и дате, а не по id) — если только
+    такая запись не загружена с новым id раньше.
+    """
+    taken = model.objects.in_bulk(
+        [obj.pk for obj in objects if obj.pk is not None])
+    fresh = []
+    for obj in objects:
+        existing = taken.get(obj.pk)
+        values = {field: getattr(obj, field) for field in fields}
+        if existing is None:
+            fresh.append(obj)
+        elif values == {field: getattr(existing, field) for field in fields}:
+            stats['existing'] += 1
+        elif model.objects.filter(**values).exists():
+            # Занятые id редки, поэтому запрос на каждый.
+            stats['existing'] += 1
+        else:
+            obj.pk = None
+            stats['remapped'] += 1
+            fresh.append(obj)
+    return fresh
+
+
+def _build_posts(batch, create_users, stats):
+    users = _users((record['author'] for record in batch), create_users)
+    groups = Group.objects.in_bulk(
+        {record['group'] for record in batch if record['group']},
+        field_name='slug')
+    posts = []
+    for record in batch:
+        author = users.get(record['author'])
+        group = groups.get(record['group']) if record['group'] else None
+        if author is None or (record['group'] and group is None):
+            continue
+        posts.append(Post(
+            id=_pk(record.get('id')),
+            text=record['text'],
+            pub_date=_date(record.get('pub_date')),
+            author=author,
+            group=group,
+            image=record.get('image') or '',
+        ))
+    return _resolve_ids(Post, posts, POST_KEY, stats)
+
+
+def _post_ids(batch):
+    """id постов комментариев в этой базе: по автору и дате поста.
+
+    В старых выгрузках нет автора и даты поста — там берётся id из
+    файла, если такой пост есть.
+    """
+    authors = _users(
+        (record.get('post_author') for record in batch), create=False)
+    keys = {}
+    for number, record in enumerate(batch):
+        author = authors.get(record.get('post_author'))
+        if record.get('post_pub_date') and author is not None:
+            keys[number] = (author.pk, _date(record['post_pub_date']))
+    found = {}
+    if keys:
+        rows = Post.objects.filter(
+            author_id__in={author for author, _ in keys.values()},
+            pub_date__in={date for _, date in keys.values()},
+        ).values_list('author_id', 'pub_date', 'pk')
+        found = {(author, date): pk for author, date, pk in rows}
+    plain = set(Post.objects.filter(
+        pk__in={_pk(record['post']) for record in batch
+                if not record.get('post_pub_date')},
+    ).values_list('pk', flat=True))
+    ids = []
+    for number, record in enumerate(batch):
+        if record.get('post_pub_date'):
+            ids.append(found.get(keys.get(number)))
+        else:
+            post_id = _pk(record['post'])
+            ids.append(post_id if post_id in plain else None)
+    return ids
+
+
+def _build_comments(batch, create_users, stats):
+    users = _users((record['author'] for record in batch), create_users)
+    comments = []
+    for record, post_id in zip(batch, _post_ids(batch)):
+        author = users.get(record['author'])
+        if author is None or post_id is None:
+            continue
+        comments.append(Comment(
+            id=_pk(record.get('id')),
+            text=record['text'],
+            created=_date(record.get('created')),
+            author=author,
+            post_id=post_id,
+        ))
+    return _resolve_ids(Comment, comments, COMMENT_KEY, stats)
+
+
+def _build_follows(batch, create_users, stats):
+    """Новые подписки пачки.
+
+    Подписки, которые уже есть в базе или повторяются в пачке, считаются
+    в existing: иначе bulk_create(ignore_conflicts=True) молча их
+    отбросит, а loaded посчитает загруженными.
+    """
+    users = _users(
+        [record[field] for record in batch for field in ('user', 'author')],
+        create_users)
+    pairs = []
+    for record in batch:
+        user = users.get(record['user'])
+        author = users.get(record['author'])
+        if user is None or author is None or user == author:
+            continue
+        pairs.append((user.pk, author.pk))
+    seen = set(Follow.objects.filter(
+        user_id__in={user for user, _ in pairs},
+        author_id__in={author for _, author in pairs},
+    ).values_list('user_id', 'author_id'))
+    follows = []
+    for pair in pairs:
+        if pair in seen:
+            stats['existing'] += 1
+            continue
+        seen.add(pair)
+        follows.append(Follow(user_id=pair[0], author_id=pair[1]))
+    return follows
+
+
+def _inserted_ids(model, objects, last_pk):
+    """id объектов, вставленных bulk_create после строки last_pk.
+
+    SQLite не возвращает id из bulk_create: новые id берутся из базы.
+    """
+    ids = {obj.pk for obj in objects if obj.pk is not None}
+    ids.update(model.objects.filter(
+        pk__gt=last_pk).values_list('pk', flat=True))
+    return ids
+
+
+def _after_posts(posts, last_pk):
+    ids = _inserted_ids(Post, posts, last_pk)
+    counters.recount_users({post.author_id for post in posts})
+    if search.is_supported():
+        search.index_posts(ids)
+    feed.fan_out_posts(ids)
+
+
+def _after_comments(comments, last_pk):
+    ids = _inserted_ids(Comment, comments, last_pk)
+    counters.recount_posts({comment.post_id for comment in comments})
+    if search.is_supported():
+        search.index_comments(ids)
+
+
+def _after_follows(follows, last_pk):
+    pairs = [(follow.user_id, follow.author_id) for follow in follows]
+    counters.recount_users({pk for pair in pairs for pk in pair})
+    feed.backfill_pairs(pairs)
+
+
+_BUILDERS = {
+    'posts': _build_posts,
+    'comments': _build_comments,
+    'follows': _build_follows,
+}
+
+# Что bulk_create обходит (сигналы не вызываются), обновляется только
+# для записей пачки и в её транзакции.
+_AFTER = {
+    'posts': _after_posts,
+    'comments': _after_comments,
+    'follows': _after_follows,
+}
+
+
+@contextmanager
+def keep_dates(model):
+    # Иначе auto_now_add заменит даты из файла текущим временем.
+    fields = [field for field in model._meta.concrete_fields
+              if getattr(field, 'auto_now_add', False)]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def import_records(kind, records, batch_size=1000, skip=0,
+                   create_users=False, on_batch=None):
+    """Загружает записи пачками по batch_size, каждая в своей транзакции.
+
+    Первые skip записей пропускаются: так загрузка продолжается с места
+    сбоя. Уже загруженные записи и повторные подписки пропускаются,
+    поэтому пачку можно загрузить дважды; запись, чей id занят другой
+    записью, получает новый id. Счётчики, поисковый индекс и ленты
+    обновляются для записей каждой пачки в её транзакции, поэтому и
+    после сбоя они сходятся с загруженными строками. После каждой пачки
+    вызывается on_batch(обработано, stats).
+    Возвращает пару (обработано, stats); в stats — loaded, existing,
+    remapped и skipped (нет автора, группы или поста).
+    """
+    model = MODELS[kind]
+    build, after = _BUILDERS[kind], _AFTER[kind]
+    records = islice(records, skip, None)
+    done, stats = skip, Counter()
+    with keep_dates(model):
+        while True:
+            batch = list(islice(records, batch_size))
+            if not batch:
+                break
+            existing = stats['existing']
+            with transaction.atomic():
+                objects = build(batch, create_users, stats)
+                last_pk = model.objects.order_by('-pk').values_list(
+                    'pk', flat=True).first() or 0
+                # Размер одного INSERT выбирает бэкенд: у SQLite свой
+                # предел числа параметров в запросе.
+                model.objects.bulk_create(objects, ignore_conflicts=True)
+                if objects:
+                    after(objects, last_pk)
+            # При DEBUG Django копит текст всех запросов: память росла бы
+            # с размером файла.
+            reset_queries()
+            done += len(batch)
+            stats['loaded'] += len(objects)
+            stats['skipped'] += (len(batch) - len(objects)
+                                 - (stats['existing'] - existing))
+            if on_batch is not None:
+                on_batch(done, stats)
+    if stats['loaded']:
+        bump_generation()
+    return done, stats
+
+
+def finish_import():
+    """Пересчитывает с нуля всё, что bulk_create обходит.
+
+    Нужна, когда база заполнена bulk_create целиком (generate_data);
+    import_records обновляет то же только для загруженных записей.
+    """
+    counters.reconcile()
+    if search.is_supported():
+        search.rebuild()
+    if feed.is_materialized():
+        feed.rebuild_timelines()
+    bump_generation()
@@ -0,0 +1,132 @@
+import hashlib
+from functools import wraps
+
+from django.conf import settings as my_set
+from django.core.files.base import ContentFile
+from django.core.files.uploadhandler import (
+    StopUpload, TemporaryFileUploadHandler)
+from django.template.defaultfilters import filesizeformat
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+
+# Первые байты форматов, которые принимает лента.
+SIGNATURES = (
+    (b'\xff\xd8\xff', '.jpg'),
+    (b'\x89PNG\r\n\x1a\n', '.png'),
+    (b'GIF87a', '.gif'),
+    (b'GIF89a', '.gif'),
+)
+HEADER_SIZE = 12
+NOT_IMAGE = 'Загрузите картинку в формате JPEG, PNG, GIF или WEBP.'
+
+
+def sniff(header):
+    """Расширение по первым байтам файла или None, если это не картинка."""
+    for signature, extension in SIGNATURES:
+        if header.startswith(signature):
+            return extension
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return '.webp'
+    return None
+
+
+def store(storage, data, extension):
+    """Сохраняет байты под именем из их sha256; копию не пишет."""
+    name = f'posts/{hashlib.sha256(data).hexdigest()}{extension}'
+    if not storage.exists(name):
+        name = storage.save(name, ContentFile(data))
+    return name
+
+
+class ImageUploadHandler(TemporaryFileUploadHandler):
+    """Пишет картинку поста на диск по частям, не держа её в памяти.
+
+    Тело запроса больше лимита и файл, который по первым байтам не
+    картинка, обрываются без дочитывания запроса; текст ошибки для формы
+    остаётся в request.upload_error. Пока файл читается, считается его
+    sha256: файл получает имя по содержимому.
+    """
+
+    too_big = False
+
+    def handle_raw_input(self, input_data, META, content_length, boundary,
+                         encoding=None):
+        # Content-Length известен заранее: большой запрос не читаем вовсе.
+        # Поля формы укладываются в DATA_UPLOAD_MAX_MEMORY_SIZE.
+        self.too_big = content_length > (
+            my_set.IMAGE_UPLOAD_MAX_SIZE + my_set.DATA_UPLOAD_MAX_MEMORY_SIZE)
+
+    def abort(self, message):
+        self.request.upload_error = message
+        raise StopUpload(connection_reset=True)
+
+    def too_big_message(self):
+        limit = filesizeformat(my_set.IMAGE_UPLOAD_MAX_SIZE)
+        return f'Картинка больше {limit}.'
+
+    def new_file(self, *args, **kwargs):
+        if self.too_big:
+            self.abort(self.too_big_message())
+        super().new_file(*args, **kwargs)
+        self.header = b''
+        self.extension = None
+        self.hash = hashlib.sha256()
+
+    def check_header(self):
+        self.extension = sniff(self.header)
+        if self.extension is None:
+            self.abort(NOT_IMAGE)
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > my_set.IMAGE_UPLOAD_MAX_SIZE:
+            self.abort(self.too_big_message())
+        if self.extension is None:
+            self.header = (self.header + raw_data)[:HEADER_SIZE]
+            if len(self.header) == HEADER_SIZE:
+                self.check_header()
+        self.hash.update(raw_data)
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        if self.extension is None:
+            self.extension = sniff(self.header)
+            if self.extension is None:
+                self.file.close()
+                self.request.upload_error = NOT_IMAGE
+                return None
+        upload = super().file_complete(file_size)
+        upload.content_hash = self.hash.hexdigest()
+        upload.name = f'{upload.content_hash}{self.extension}'
+        return upload
+
+
+def stream_images(view):
+    """Подключает ImageUploadHandler к представлению.
+
+    Обработчики загрузки нельзя менять после чтения request.POST, а его
+    читает CsrfViewMiddleware, поэтому CSRF проверяется внутри.
+    """
+    protected = csrf_protect(view)
+
+    @csrf_exempt
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.upload_handlers = [ImageUploadHandler(request)]
+        return protected(request, *args, **kwargs)
+
+    return wrapper
+
+
+def report(request, form):
+    """Переносит ошибку оборванной загрузки в поле image формы."""
+    error = getattr(request, 'upload_error', None)
+    if error is not None and form.is_bound:
+        form.add_error('image', error)
+
+
+def deduplicate(post, upload):
+    """Та же картинка уже сохранена: пост ссылается на готовый файл."""
+    if getattr(upload, 'content_hash', None) is None:
+        return
+    name = post.image.field.generate_filename(post, upload.name)
+    if post.image.storage.exists(name):
+        post.image = name
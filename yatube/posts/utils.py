@@ -1,9 +1,294 @@
-from django.conf import settings as my_set
-from django.core.paginator import Paginator
-
-
-def mypaginator(request, post_list):
-    paginator = Paginator(post_list, my_set.POSTS_AMOUNT)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    return page_obj
+import base64
+import binascii
+import hashlib
+
+from django.conf import settings as my_set
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import (
+    EmptyPage, Page, PageNotAnInteger, Paginator)
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+from core import routers
+
+from .cache import get_generation
+from .models import Comment, Post
+
+CURSOR_NEXT = 'n'
+CURSOR_PREV = 'p'
+
+# Поля, которые карточка поста в ленте не читает.
+FEED_DEFERRED_FIELDS = (
+    'image_detail',
+    'author__password',
+    'author__last_login',
+    'author__email',
+    'author__date_joined',
+)
+
+
+def feed_posts(post_list=None):
+    """Queryset ленты с тем, что читают шаблоны ленты: автор и группа.
+
+    Текст не откладывается: карточка выводит его целиком.
+    """
+    if post_list is None:
+        post_list = Post.objects.all()
+    return post_list.select_related('author', 'group').defer(
+        *FEED_DEFERRED_FIELDS)
+
+
+def encode_cursor(obj, direction, date_field='pub_date', key_field='pk'):
+    raw = (f'{direction}|{getattr(obj, date_field).isoformat()}'
+           f'|{getattr(obj, key_field)}')
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Разбирает курсор. Для битого токена возвращает None."""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        direction, date, pk = raw.split('|')
+        date = parse_datetime(date)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if direction not in (CURSOR_NEXT, CURSOR_PREV) or date is None:
+        return None
+    return direction, date, pk
+
+
+class CursorPaginator(Paginator):
+    """Keyset-пагинация по (date_field, key_field) без COUNT и OFFSET.
+
+    Возвращает обычный Page: номер страницы и num_pages подбираются так,
+    чтобы has_next/has_previous отражали наличие соседних страниц,
+    а курсоры соседних страниц лежат в page.next_cursor/previous_cursor.
+    """
+
+    by_cursor = True
+
+    def __init__(self, object_list, per_page, date_field='pub_date',
+                 key_field='pk'):
+        super().__init__(
+            object_list.order_by(f'-{date_field}', f'-{key_field}'),
+            per_page)
+        self.date_field = date_field
+        self.key_field = key_field
+        self._num_pages = 1
+
+    @property
+    def num_pages(self):
+        return self._num_pages
+
+    def sort_key(self, obj):
+        return getattr(obj, self.date_field), getattr(obj, self.key_field)
+
+    def fetch(self, cursor):
+        """До per_page + 1 строк от курсора, ближайшие к нему первыми.
+
+        Для курсора назад строки идут по возрастанию, иначе по убыванию.
+        """
+        if cursor is None:
+            return list(self.object_list[:self.per_page + 1])
+        direction, date, key = cursor
+        field, key_field = self.date_field, self.key_field
+        # Условие по одной дате даёт SQLite начать чтение индекса
+        # с курсора, а не с начала ленты.
+        if direction == CURSOR_NEXT:
+            return list(self.object_list.filter(
+                Q(**{f'{field}__lte': date}),
+                Q(**{f'{field}__lt': date})
+                | Q(**{field: date, f'{key_field}__lt': key})
+            )[:self.per_page + 1])
+        return list(self.object_list.filter(
+            Q(**{f'{field}__gte': date}),
+            Q(**{f'{field}__gt': date})
+            | Q(**{field: date, f'{key_field}__gt': key})
+        ).order_by(field, key_field)[:self.per_page + 1])
+
+    def page_from_rows(self, rows, cursor):
+        """Страница из строк fetch (или слитых строк нескольких fetch)."""
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if cursor is None:
+            has_next, has_previous = more, False
+        elif cursor[0] == CURSOR_NEXT:
+            has_next, has_previous = more, True
+        else:
+            rows = rows[::-1]
+            has_next, has_previous = True, more
+        if not rows:
+            has_next = has_previous = False
+        number = 2 if has_previous else 1
+        self._num_pages = number + 1 if has_next else number
+        page = Page(rows, number, self)
+        page.next_cursor = (
+            encode_cursor(rows[-1], CURSOR_NEXT, self.date_field,
+                          self.key_field)
+            if has_next else None)
+        page.previous_cursor = (
+            encode_cursor(rows[0], CURSOR_PREV, self.date_field,
+                          self.key_field)
+            if has_previous else None)
+        return page
+
+    def get_cursor_page(self, token):
+        cursor = decode_cursor(token)
+        return self.page_from_rows(self.fetch(cursor), cursor)
+
+
+class WindowPage(Page):
+    @cached_property
+    def page_window(self):
+        """Номера страниц для paginator.html, пропуски — ELLIPSIS."""
+        return list(self.paginator.get_elided_page_range(self.number))
+
+
+class WindowPaginator(Paginator):
+    """Paginator с сокращённым списком страниц и числом объектов из кэша.
+
+    Вместо всех номеров страниц выводятся первые и последние on_ends
+    и по on_each_side вокруг текущей. Число объектов даёт count_provider
+    (функции posts.counts); без него COUNT запроса хранится в кэше
+    до изменения постов (того же поколения, что и кэш страниц).
+    Настоящее число, если оно разошлось с кэшем, передаётся
+    в count_provider(actual=...).
+    """
+
+    ELLIPSIS = '…'
+
+    def __init__(self, *args, count_provider=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.count_provider = count_provider
+        self.count_key = None
+
+    def _get_page(self, *args, **kwargs):
+        return WindowPage(*args, **kwargs)
+
+    @cached_property
+    def count(self):
+        if self.count_provider is not None:
+            return self.count_provider()
+        try:
+            sql = str(self.object_list.query)
+        except (AttributeError, EmptyResultSet):
+            return super().count
+        digest = hashlib.md5(sql.encode()).hexdigest()
+        self.count_key = key = f'paginator_count.{get_generation()}.{digest}'
+        count = cache.get(key)
+        if count is None:
+            with routers.primary():
+                count = super().count
+            cache.set(key, count, my_set.PAGINATOR_COUNT_TIMEOUT)
+        return count
+
+    def correct_count(self, actual):
+        """Число объектов разошлось с настоящим: запоминает actual."""
+        if self.count_provider is not None:
+            self.count_provider(actual=actual)
+        elif self.count_key is not None:
+            cache.set(self.count_key, actual,
+                      my_set.PAGINATOR_COUNT_TIMEOUT)
+        self.__dict__['count'] = actual
+        self.__dict__.pop('num_pages', None)
+
+    def page(self, number):
+        """Страница number; после num_pages — пока на ней есть посты.
+
+        Число постов большой ленты — оценка (posts.counts) и может быть
+        меньше настоящего. Поэтому с последней по счёту страницы берётся
+        на пост больше: если он есть, num_pages растёт, и дальние
+        страницы остаются доступны. Если число больше настоящего и
+        страница пуста (или число — оценка), посты до неё пересчитываются
+        (не дальше её начала), число исправляется, а EmptyPage
+        отправляет get_page на настоящую последнюю страницу.
+        """
+        try:
+            number = self.validate_number(number)
+        except EmptyPage:
+            number = int(number)
+            if number < 1:
+                raise
+        bottom = (number - 1) * self.per_page
+        if number < self.num_pages:
+            rows = list(self.object_list[bottom:bottom + self.per_page])
+            if rows:
+                return self._get_page(rows, number, self)
+        else:
+            rows = list(
+                self.object_list[bottom:bottom + self.per_page + 1])
+            if len(rows) > self.per_page:
+                self.num_pages = number + 1
+            elif rows or number == 1:
+                self.num_pages = max(self.num_pages, number)
+            if rows or number == 1:
+                return self._get_page(rows[:self.per_page], number, self)
+        # Пересчёт не дороже уже сделанной выборки со сдвигом bottom.
+        if (bottom < self.count
+                or self.count > my_set.POST_COUNT_EXACT_LIMIT):
+            with routers.primary():
+                self.correct_count(
+                    self.object_list.order_by()[:bottom].count())
+        raise EmptyPage('That page contains no results')
+
+    def get_page(self, number):
+        try:
+            return self.page(number)
+        except PageNotAnInteger:
+            return self.page(1)
+        except EmptyPage:
+            pass
+        try:
+            return self.page(self.num_pages)
+        except EmptyPage:
+            # Посты удалили, пока число пересчитывалось.
+            return self.page(1)
+
+    def get_elided_page_range(self, number=1, on_each_side=2, on_ends=1):
+        number = self.validate_number(number)
+        last = self.num_pages
+        if last <= (on_each_side + on_ends) * 2 + 1:
+            yield from self.page_range
+            return
+        if number > on_each_side + on_ends + 2:
+            yield from range(1, on_ends + 1)
+            yield self.ELLIPSIS
+            start = number - on_each_side
+        else:
+            start = 1
+        if number < last - on_each_side - on_ends - 1:
+            yield from range(start, number + on_each_side + 1)
+            yield self.ELLIPSIS
+            yield from range(last - on_ends + 1, last + 1)
+        else:
+            yield from range(start, last + 1)
+
+
+def mypaginator(request, post_list, by_cursor=None, count=None):
+    """Страница постов; count — функция, возвращающая их число."""
+    if by_cursor is None:
+        by_cursor = my_set.POSTS_PAGINATION == 'cursor'
+    if by_cursor:
+        paginator = CursorPaginator(post_list, my_set.POSTS_AMOUNT)
+        return paginator.get_cursor_page(request.GET.get('cursor'))
+    paginator = WindowPaginator(post_list, my_set.POSTS_AMOUNT,
+                                count_provider=count)
+    page_number = request.GET.get('page')
+    page_obj = paginator.get_page(page_number)
+    return page_obj
+
+
+def comments_page(request, post):
+    """Очередная порция комментариев поста по курсору."""
+    paginator = CursorPaginator(
+        Comment.objects.select_related('author').filter(post=post),
+        my_set.COMMENTS_AMOUNT,
+        date_field='created',
+    )
+    return paginator.get_cursor_page(request.GET.get('cursor'))
@@ -1,25 +1,32 @@
+from functools import partial
+
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, redirect, get_object_or_404
-from django.views.decorators.cache import cache_page
+from . import cards, counters, counts, feed, images, search, uploads
+from .cache import cache_page_versioned
 from .forms import PostForm, CommentForm
-from .models import Comment, Follow, Group, Post, User
-from .utils import mypaginator
+from .models import Follow, Group, Post, User
+from .utils import comments_page, feed_posts, mypaginator
 
 
-@cache_page(20, key_prefix='index_page')
+@cache_page_versioned('index_page')
 def index(request):
-    post_list = Post.objects.select_related('group')
-    page_obj = mypaginator(request, post_list)
+    post_list = feed_posts()
+    page_obj = mypaginator(request, post_list, count=counts.total)
+    cards.prefetch(page_obj)
     context = {
         'page_obj': page_obj,
     }
     return render(request, 'posts/index.html', context)
 
 
+@cache_page_versioned('group_page')
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    post_list = Post.objects.select_related('group').filter(group=group)
-    page_obj = mypaginator(request, post_list)
+    post_list = feed_posts().filter(group=group)
+    page_obj = mypaginator(
+        request, post_list, count=partial(counts.for_group, group))
+    cards.prefetch(page_obj)
     context = {
         'page_obj': page_obj,
         'group': group,
@@ -27,12 +34,15 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@cache_page_versioned('profile_page')
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    post_list = Post.objects.select_related(
-        'group').filter(author=author)
-    post_count = post_list.count()
-    page_obj = mypaginator(request, post_list)
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username)
+    post_list = feed_posts().filter(author=author)
+    stats = counters.stats_for(author)
+    page_obj = mypaginator(
+        request, post_list, count=partial(counts.for_author, author))
+    cards.prefetch(page_obj)
     following = None
     if request.user.is_authenticated:
         following = Follow.objects.select_related(
@@ -40,46 +50,86 @@ def profile(request, username):
     context = {
         'page_obj': page_obj,
         'author': author,
-        'post_count': post_count,
+        'post_count': stats.posts_count,
+        'stats': stats,
         'following': following,
     }
     return render(request, 'posts/profile.html', context)
 
 
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), id=post_id)
     form = CommentForm(request.POST or None)
-    comment_list = Comment.objects.select_related('post').filter(post=post)
     context = {
-        'comments': comment_list,
+        'comments': comments_page(request, post),
         'post': post,
         'form': form,
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+def comment_list(request, post_id):
+    post = get_object_or_404(Post.objects.only('pk'), id=post_id)
+    context = {
+        'comments': comments_page(request, post),
+        'post': post,
+        'more_url_name': 'posts:comments',
+    }
+    return render(request, 'posts/includes/comments.html', context)
+
+
+def search_posts(request):
+    query = request.GET.get('q', '').strip()
+    post_list = search.filter_posts(feed_posts(), query)
+    page_obj = mypaginator(request, post_list)
+    cards.prefetch(page_obj)
+    context = {
+        'page_obj': page_obj,
+        'query': query,
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
+@uploads.stream_images
 def post_create(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
+    uploads.report(request, form)
     if form.is_valid():
         post = form.save(commit=False)
+        uploads.deduplicate(post, form.cleaned_data['image'])
         post.author = request.user
+        if post.image:
+            post.image_status = Post.IMAGE_PENDING
         post.save()
+        if post.image:
+            images.enqueue(post)
         return redirect('posts:profile', request.user)
     return render(request, 'posts/create_post.html', {'form': form})
 
 
 @login_required
+@uploads.stream_images
 def post_edit(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     if post.author != request.user:
         return redirect('posts:post_detail', post_id)
     form = PostForm(request.POST or None, files=request.FILES or None,
                     instance=post)
+    uploads.report(request, form)
     if form.is_valid():
         post = form.save(commit=False)
+        uploads.deduplicate(post, form.cleaned_data['image'])
         post.author = request.user
+        image_changed = 'image' in form.changed_data
+        if image_changed:
+            post.image_card = post.image_detail = ''
+            post.image_status = (Post.IMAGE_PENDING if post.image
+                                 else Post.IMAGE_READY)
         post.save()
+        if image_changed and post.image:
+            images.enqueue(post)
         return redirect('posts:post_detail', post_id)
     return render(request, 'posts/create_post.html',
                   {'form': form, 'post_id': post_id, 'is_edit': True})
@@ -99,9 +149,15 @@ def add_comment(request, post_id):
 
 @login_required
 def follow_index(request):
-    post_list = Post.objects.select_related(
-        'author').filter(author__following__user=request.user)
-    page_obj = mypaginator(request, post_list)
+    if feed.is_materialized():
+        page_obj = feed.timeline_page(
+            request.user, request.GET.get('cursor'))
+    else:
+        post_list = feed_posts(feed.follow_posts(request.user))
+        page_obj = mypaginator(
+            request, post_list,
+            count=partial(counts.for_follower, request.user))
+    cards.prefetch(page_obj)
     context = {
         'page_obj': page_obj,
     }
@@ -111,13 +167,15 @@ def follow_index(request):
 @login_required
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
-    follows = Follow.objects.select_related(
-        'user', 'author').filter(user=request.user, author=author)
-    if request.user != author and follows.exists() is False:
-        Follow.objects.create(
+    if request.user != author:
+        # Повторный запрос может создать подписку между проверкой и
+        # вставкой; get_or_create тогда читает уже созданную строку.
+        _, created = Follow.objects.get_or_create(
             user=request.user,
             author=author,
         )
+        if created:
+            feed.backfill(request.user, author)
     return redirect('posts:profile', author)
 
 
@@ -128,4 +186,5 @@ def profile_unfollow(request, username):
         'user', 'author').filter(user=request.user, author=author)
     if request.user != author and follow.exists():
         follow.delete()
+        feed.trim(request.user, author)
     return redirect('posts:profile', author)
@@ -1,6 +1,7 @@
 from django.test import TestCase, Client
 from django.urls import reverse
 from django import forms
+from core.testing import max_queries
 from ..forms import User
 
 
@@ -46,3 +47,20 @@ class UsersViewsTests(TestCase):
             with self.subTest(value=value):
                 form_field = response.context.get('form').fields.get(value)
                 self.assertIsInstance(form_field, expected)
+
+
+class SignUpQueryBudgetTests(TestCase):
+    @max_queries(0)
+    def test_signup_page(self):
+        self.client.get(reverse('users:signup'))
+
+    @max_queries(6)
+    def test_signup(self):
+        """Регистрация: проверка имени, пользователь и его счётчики."""
+        response = self.client.post(reverse('users:signup'), {
+            'username': 'new_user',
+            'password1': 'Sup3r-secret!',
+            'password2': 'Sup3r-secret!',
+        })
+        self.assertRedirects(response, reverse('posts:index'),
+                             fetch_redirect_response=False)
@@ -1,4 +1,8 @@
+import atexit
 import os
+import shutil
+import sys
+import tempfile
 
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
@@ -38,6 +42,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.RequestMetricsMiddleware',
+    'core.middleware.ReplicaPinMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -50,12 +56,23 @@ MIDDLEWARE = [
 ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+# Боевой режим шаблонов: каждый шаблон компилируется один раз на процесс,
+# а wsgi.py при старте воркера заранее компилирует всё из TEMPLATES_DIR.
+# При DEBUG шаблоны перечитываются с диска, чтобы правки были видны сразу.
+TEMPLATES_CACHED: bool = not DEBUG
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.template_backend.DjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'loaders': (
+                [('django.template.loaders.cached.Loader', TEMPLATE_LOADERS)]
+                if TEMPLATES_CACHED else TEMPLATE_LOADERS
+            ),
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -67,6 +84,9 @@ TEMPLATES = [
     },
 ]
 
+# Сколько адресов помнит тег {% url %} из core.templatetags.cached_urls
+URL_CACHE_SIZE: int = 2048
+
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
 
@@ -77,7 +97,36 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+        # Соединение живёт между запросами, а не открывается на каждый.
+        'CONN_MAX_AGE': 600,
+    },
+    # Реплика только для чтения; локально её наполняет команда replicate.
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db_replica.sqlite3'),
+        'CONN_MAX_AGE': 600,
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+# Базы, из которых читают GET-запросы; пусто — всё читается из default.
+DATABASE_REPLICAS: list = []
+# Сколько секунд после записи браузер читает из default
+REPLICA_PIN_SECONDS: int = 10
+
+# PRAGMA для каждого нового соединения SQLite (core.db.configure_sqlite).
+# WAL: читатели не ждут писателя; synchronous=NORMAL в WAL не теряет
+# целостность, только последние транзакции при отключении питания.
+# busy_timeout — сколько миллисекунд ждать блокировку до "database is
+# locked"; стоит первым, потому что переключение в WAL тоже её берёт.
+SQLITE_PRAGMAS = {
+    'busy_timeout': 20000,
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -64000,
+    'temp_store': 'MEMORY',
+    'mmap_size': 256 * 1024 * 1024,
 }
 
 
@@ -127,14 +176,113 @@ EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 POSTS_AMOUNT: int = 10
+COMMENTS_AMOUNT: int = 20
+# 'cursor' — keyset-пагинация по ?cursor=, 'offset' — по номеру ?page=
+POSTS_PAGINATION: str = 'cursor'
+# Сколько секунд хранить число постов для постраничной навигации по ?page=;
+# при изменении постов оно сбрасывается раньше.
+PAGINATOR_COUNT_TIMEOUT: int = 60 * 60
+# Числа постов ленты, группы и ленты подписок в кэше. Создание и удаление
+# постов сдвигают их сразу; лента подписок при FOLLOW_FEED_MATERIALIZED
+# досчитывает новые посты не позже чем через POST_COUNT_TIMEOUT.
+POST_COUNT_TIMEOUT: int = 60 * 60 * 24
+# Больше стольких постов точно не считаем: число оценивается по доле
+# подходящих среди последних POST_COUNT_SAMPLE id.
+POST_COUNT_EXACT_LIMIT: int = 10000
+POST_COUNT_SAMPLE: int = 10000
+# План поиска по числу совпадений: меньше SEARCH_SPARSE_MATCHES — посты
+# берутся по найденным id, от SEARCH_DENSE_MATCHES — каждый пост ленты
+# проверяется в индексе, между ними — по списку найденных id.
+SEARCH_SPARSE_MATCHES: int = 1000
+SEARCH_DENSE_MATCHES: int = 20000
+
+# Материализованная лента подписок (fan-out-on-write)
+FOLLOW_FEED_MATERIALIZED: bool = False
+# Посты авторов с большим числом подписчиков собираются при чтении
+FOLLOW_FEED_FANOUT_LIMIT: int = 1000
+# Сколько последних постов автора добавлять в ленту при подписке
+FOLLOW_FEED_BACKFILL: int = 200
+FOLLOW_FEED_BATCH_SIZE: int = 500
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Пул потоков команды backfill_thumbnails
+THUMBNAIL_WORKERS: int = 2
+
+# Наибольший размер загружаемой картинки поста, байт. Больший запрос
+# обрывается, не дочитав тело; одинаковые файлы хранятся один раз.
+IMAGE_UPLOAD_MAX_SIZE: int = 10 * 2 ** 20
+
+# Загруженные картинки перекодирует и режет на миниатюры воркер
+# process_images по очереди в базе; False — обработка прямо в запросе.
+IMAGE_QUEUE_ASYNC: bool = True
+# Наибольшая сторона картинки после перекодирования, px
+IMAGE_MAX_SIZE: int = 2048
+IMAGE_JPEG_QUALITY: int = 85
+# На сколько секунд воркер занимает задачу и сколько раз её пробовать
+IMAGE_JOB_LEASE: int = 300
+IMAGE_JOB_ATTEMPTS: int = 3
+
+# Карточки постов в кэше: ключ меняется с версией поста, срок только
+# освобождает место от старых версий.
+POST_CARD_TIMEOUT: int = 60 * 60 * 24
+
+# Кэш страниц ленты. Страницы сбрасываются при изменении постов, групп,
+# комментариев и подписок, поэтому TIMEOUT может быть большим.
+# STALE — сколько секунд после TIMEOUT отдавать устаревшую страницу, пока
+# её пересчитывает один запрос; WAIT — сколько ждать пересчёта, если
+# устаревшей копии нет.
+PAGE_CACHE = {
+    'index_page': {'TIMEOUT': 60 * 60 * 3, 'STALE': 60, 'WAIT': 2.0},
+    'group_page': {'TIMEOUT': 60 * 60, 'STALE': 60, 'WAIT': 2.0},
+    'profile_page': {'TIMEOUT': 60 * 60, 'STALE': 60, 'WAIT': 2.0},
+}
+# Как часто процесс досылает счётчики кэша страниц в общий кэш
+# (видны на /stats/requests/), секунд.
+PAGE_CACHE_STATS_FLUSH: int = 10
+
+# Тесты (manage.py test и pytest) чистят кэш: им отдельный файл
+# во временном каталоге, а не кэш работающего сервера.
+TESTING: bool = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+CACHE_DIR = BASE_DIR
+if TESTING:
+    CACHE_DIR = tempfile.mkdtemp(prefix='yatube-cache-')
+    atexit.register(shutil.rmtree, CACHE_DIR, ignore_errors=True)
+
+# Общий для всех процессов кэш в файле SQLite
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(CACHE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+            'MAX_BYTES': 256 * 1024 * 1024,
+        },
     }
 }
+
+# Метрики запросов: Server-Timing, гистограммы на /stats/requests/ и строка
+# лога core.requests на каждый запрос (уровень INFO включает её).
+REQUEST_METRICS: bool = True
+REQUEST_METRICS_LOG_LEVEL: str = 'WARNING'
+# Server-Timing раскрывает число SQL-запросов и их время: заголовок
+# получают сотрудники и режим DEBUG, всем остальным — только так.
+SERVER_TIMING_PUBLIC: bool = False
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core.requests': {
+            'handlers': ['console'],
+            'level': REQUEST_METRICS_LOG_LEVEL,
+            'propagate': False,
+        },
+    },
+}
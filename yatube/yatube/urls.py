@@ -2,6 +2,7 @@ from django.contrib import admin
 from django.urls import include, path
 from django.conf import settings
 from django.conf.urls.static import static
+from core.views import request_stats
 from posts import views
 
 
@@ -11,6 +12,7 @@ urlpatterns = [
     path('auth/', include('users.urls')),
     path('auth/', include('django.contrib.auth.urls')),
     path('admin/', admin.site.urls),
+    path('stats/requests/', request_stats, name='request_stats'),
     path('about/', include('about.urls', namespace='about')),
 ]
 